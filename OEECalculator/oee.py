@@ -1,29 +1,59 @@
 import streamlit as st 
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import base64
 import zipfile
+import os
+import sys
+import uuid
 from io import BytesIO
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.parse_cache import read_uploads, format_cache_stats
+from core.oee import OEECube, TimePyramid, calculate_oee, partials_to_means, summarize_partials
+from core.readers import TABLE_TYPES, parse_ids
+from core.batch import input_options
+from core.normalize import format_normalize_report
+from core.oee_store import OEEStore
+from core.jobs import JOBS
+from core.figures import average_metrics_bar, cached_figure, gauge, oee_over_time
+from core.ui import CalculatorPage, job_result, paged_table
+
+OEE_STORE_PATH = os.environ.get('CALC_OEE_STORE', 'oee_history.sqlite')
+
+RESULT_COLUMNS = ['Date', 'EquipmentId', 'Availability', 'Performance', 'Quality', 'OEE']
+RESULT_COLUMN_CONFIG = {
+    'Date': st.column_config.DateColumn(format='YYYY-MM-DD'),
+    'Availability': st.column_config.NumberColumn(format='percent'),
+    'Performance': st.column_config.NumberColumn(format='percent'),
+    'Quality': st.column_config.NumberColumn(format='percent'),
+    'OEE': st.column_config.NumberColumn(format='%.2f'),
+}
+
 # Set page configuration 
 st.set_page_config(layout="wide")
 st.markdown('<style>div.block-container { padding-top: 3rem; background-color: #E3F4F4; }</style>', unsafe_allow_html=True)
 
 
-# Define session state keys
-if 'upload_mode' not in st.session_state:
-    st.session_state.upload_mode = False
-if 'visuals_generated' not in st.session_state:
-    st.session_state.visuals_generated = False
+# Define session state keys, prefixed because the launcher (app.py) hosts every calculator in one session
+if 'oee_upload_mode' not in st.session_state:
+    st.session_state.oee_upload_mode = False
+if 'oee_visuals_generated' not in st.session_state:
+    st.session_state.oee_visuals_generated = False
+
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
-if 'uploaded_files' not in st.session_state:
-    st.session_state.uploaded_files = {
+# Timings of this rerun (page.metrics) and the dashboard stages kept between reruns
+page = CalculatorPage('oee', 'oee_stage_graph')
+
+if 'oee_uploaded_files' not in st.session_state:
+    st.session_state.oee_uploaded_files = {
         'production_hours_data': None,
         'downtime_hours_data': None
     }
 
+@st.cache_data(show_spinner=False)
 def download_sample_data():
+    # Builds sample_data_oee.zip, only runs when the download button is clicked and is cached after that
     # Sample Production Hours Data
     sample_production_hours_data = pd.DataFrame({
         'Date': ['2024-06-15', '2024-06-15', '2024-06-15', '2024-06-16', '2024-06-16', '2024-06-16'],
@@ -50,25 +80,143 @@ def download_sample_data():
             data.to_excel(excel_data, index=False)
             zipf.writestr(name, excel_data.getvalue())
 
-    zip_data.seek(0)
-    b64 = base64.b64encode(zip_data.read()).decode()
-    href = f'<a href="data:application/zip;base64,{b64}" download="sample_data_oee.zip">Click here</a>'
-    return href
-
-def calculate_oee(production_hours_data, downtime_hours_data):
-    # Merge production and downtime data
-    merged_data = pd.merge(production_hours_data, downtime_hours_data, on=['Date', 'EquipmentId'])
-
-    # Calculate OEE Components
-    merged_data['Availability'] = (merged_data['ProductionHrs'] - merged_data['DownTimeHrs']) / merged_data['ProductionHrs']
-    merged_data['Performance'] = (merged_data['ProducedGoods'] * merged_data['IdealCycle']) / ((merged_data['ProductionHrs'] - merged_data['DownTimeHrs']) * 60)
-    merged_data['Quality'] = (merged_data['ProducedGoods'] - merged_data['DefectGoods']) / merged_data['ProducedGoods']
-    merged_data['OEE'] = merged_data['Availability'] * merged_data['Performance'] * merged_data['Quality'] * 100
-    return merged_data
+    return zip_data.getvalue()
+
+# Summary and per-equipment averages of the dashboard, in sample and upload mode alike
+def equipment_averages(cube, equipment_id):
+    equipment_partials = cube.by_equipment(equipment_id)
+    avg_equipment_data = partials_to_means(equipment_partials).reset_index()
+
+     # Calculate average OEE for each equipment ID
+    avg_oee_data = avg_equipment_data[['EquipmentId', 'OEE']].copy()
+    avg_oee_data.columns = ['EquipmentId', 'Average OEE']
+    avg_oee_data['Average OEE'] = avg_oee_data['Average OEE'].apply(lambda x: f"{x :.2f}%")
+    return summarize_partials(equipment_partials), avg_equipment_data, avg_oee_data
+
+def oee_figures(summary, avg_equipment_data):
+    return (cached_figure(gauge, summary['Average Availability'] * 100, "Average Availability", "#2779B7"),
+            cached_figure(gauge, summary['Average Performance'] * 100, "Average Performance", "#83C9FF"),
+            cached_figure(gauge, summary['Average Quality'] * 100, "Average Quality", "#FF2B2B"),
+            cached_figure(gauge, summary['Average OEE'], "Average OEE", "#FFABAB"),
+            cached_figure(average_metrics_bar, avg_equipment_data))
+
+def oee_trend_chart(pyramid):
+    # The OEE trend comes from the time rollup built once per selection (core.oee.TimePyramid): 'Auto' shows
+    # the finest grain that fits the zoom window, and a zoom or pan only slices one of its levels
+    grain_col, zoom_col = st.columns([1, 3])
+    with grain_col:
+        grain = st.selectbox('Trend grain', ['Auto'] + pyramid.grains)
+    window = None
+    span = pyramid.span()
+    if span is not None and span[0] < span[1]:
+        start, end = span[0].to_pydatetime(), span[1].to_pydatetime()
+        with zoom_col:
+            selected = st.slider('Zoom', min_value=start, max_value=end, value=(start, end),
+                                 step=max((end - start) / 1000, pd.Timedelta(hours=1).to_pytimedelta()),
+                                 key=f'oee_trend_zoom_{start:%Y%m%d%H}_{end:%Y%m%d%H}')
+        if selected != (start, end):
+            window = selected
+    shown_grain, trend, window_summary = page.run_stage(
+        'aggregate', 'OEE trend', lambda: pyramid.query(*(window or (None, None)), grain=None if grain == 'Auto' else grain),
+        params=(window, grain), after=('Time rollup',))
+    fig = page.run_stage('figures', 'OEE trend chart', lambda: cached_figure(oee_over_time, trend, shown_grain),
+                         after=('OEE trend',))
+    if window is not None and window_summary['Records']:
+        st.caption(f"Average OEE {window_summary['Average OEE']/100:.2%} over "
+                   f"{window_summary['Records']:,} records in the window, shown per {shown_grain.lower()}")
+    page.metrics.lap('render')
+    st.plotly_chart(fig,use_container_width=True)
+
+@page.fragment
+def dashboard(cube, data_key, paged_results=False):
+    # Filter -> aggregate -> figures over a cube. The Equipment ID selectbox reruns only this fragment, and
+    # `data_key` identifies the cube's data, so stages it did not change are reused
+    col1,col2,col3=st.columns(3)
+    with col1:
+      available_ids = page.run_stage('filter', 'Equipment IDs', cube.equipment_ids, params=(data_key,))
+      selected_id = st.selectbox('**Filter Results by Equipment ID**', ['All'] + available_ids)
+
+    equipment_id = None if selected_id == 'All' else selected_id
+    # Display results for each record in a table
+    # Percentages are formatted by the table (RESULT_COLUMN_CONFIG), the results are not copied for rounding
+    filtered_data_display = page.run_stage('filter', 'Equipment filter', lambda: cube.results(equipment_id)[RESULT_COLUMNS],
+                                           params=(data_key, equipment_id))
+
+    # Calculate averages
+    summary, avg_equipment_data, avg_oee_data = page.run_stage(
+        'aggregate', 'Averages', lambda: equipment_averages(cube, equipment_id), params=(data_key, equipment_id))
+    average_availability = summary['Average Availability']
+    average_performance = summary['Average Performance']
+    average_quality = summary['Average Quality']
+    average_oee = summary['Average OEE']
+    oee_spread = page.run_stage('aggregate', 'OEE percentiles', lambda: cube.quantiles(equipment_id),
+                                params=(data_key, equipment_id))
+    pyramid = page.run_stage('aggregate', 'Time rollup',
+                             lambda: TimePyramid(cube.by_date(equipment_id), cube.sketch_by_date(equipment_id)),
+                             params=(data_key, equipment_id))
+
+    fig_availability, fig_performance, fig_quality, fig_oee, fig_avg_metrics = page.run_stage(
+        'figures', 'Charts', lambda: oee_figures(summary, avg_equipment_data), after=('Averages',))
+
+    page.metrics.lap('render')
+
+    if selected_id == 'All':
+
+                st.markdown("**Summary**")
+                st.markdown(
+                 f"""
+                 <div style="color: blue;">
+                For Equipment IDs   <strong>{selected_id}</strong> ,
+                the Average Availability is  <strong>{average_availability:.2%}</strong> ,
+                the Average Performance is  <strong>{average_performance:.2%}</strong> ,
+                the Average Quality is  <strong>{average_quality:.2%}</strong> ,
+                and the Average OEE is  <strong>{average_oee/100:.2%}</strong>.</div>""", unsafe_allow_html=True)
+    else:
+
+                st.markdown("**Summary**")
+                st.markdown(f""" <div style="color: blue;">
+                For Equipment ID   <strong>{selected_id}</strong> ,
+                the Average Availability is  <strong>{average_availability:.2%}</strong> ,
+                the Average Performance is  <strong>{average_performance:.2%}</strong> ,
+                the Average Quality is  <strong>{average_quality :.2%}</strong> ,
+                and the Average OEE is  <strong>{average_oee/100:.2%}</strong>.
+               </div>
+           """, unsafe_allow_html=True)
+    if pd.notna(oee_spread['OEE P50']):
+        # Sketch percentiles are within 1% of the exact ones
+        st.caption(f"OEE of individual records: P10 {oee_spread['OEE P10']/100:.2%}, "
+                   f"median {oee_spread['OEE P50']/100:.2%}, P90 {oee_spread['OEE P90']/100:.2%}")
+
+        # Display gauge charts for average metrics
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+            st.plotly_chart(fig_availability)
+    with col2:
+            st.plotly_chart(fig_performance)
+    with col3:
+            st.plotly_chart(fig_quality)
+    with col4:
+            st.plotly_chart(fig_oee)
+
+    col5,col6=st.columns(2)
+    with col5:
+            oee_trend_chart(pyramid)
+    with col6:
+            st.plotly_chart(fig_avg_metrics,use_container_width=True)
+
+    col7,col8=st.columns(2)
+    with col7:
+            st.write("**Equipment Metric Percentage Details**")
+            if paged_results:
+                paged_table(filtered_data_display, 'results_table', height=280, column_config=RESULT_COLUMN_CONFIG)
+            else:
+                st.dataframe(filtered_data_display,height=280,use_container_width=True, hide_index=True, column_config=RESULT_COLUMN_CONFIG)
+    with col8:
+            st.write("**Average OEE of Each Equipment**")
+            st.dataframe(avg_oee_data,height=280,use_container_width=True, hide_index=True)
 
-# Function for sample mode
 def sample_mode():
-    download_link = download_sample_data()
+    page.metrics.lap('render')
     st.title('🔢:blue[Overall Equipment Effectiveness (OEE) Calculator]')
     st.markdown(f"""
         The **Overall Equipment Effectiveness (OEE)** calculator measures the efficiency and productivity of equipment. The input datasets and output visuals are as explained below:\n
@@ -104,345 +252,105 @@ def sample_mode():
         st.dataframe(sample_downtime_hours_data, height=250, use_container_width=True, hide_index=True)
 
     if st.button("Generate Visuals using Sample Data"):
-        st.session_state.visuals_generated = True
-        st.session_state.upload_mode = False
-
-    if st.session_state.visuals_generated:
-        merged_data = pd.merge(sample_production_hours_data, sample_downtime_hours_data, on=['Date', 'EquipmentId'])
+        st.session_state.oee_visuals_generated = True
+        st.session_state.oee_upload_mode = False
 
-        merged_data['Availability'] = (merged_data['ProductionHrs'] - merged_data['DownTimeHrs']) / merged_data['ProductionHrs']
-        merged_data['Performance'] = (merged_data['ProducedGoods'] * merged_data['IdealCycle']) / ((merged_data['ProductionHrs'] - merged_data['DownTimeHrs']) * 60)
-        merged_data['Quality'] = (merged_data['ProducedGoods'] - merged_data['DefectGoods']) / merged_data['ProducedGoods']
-        merged_data['OEE'] = merged_data['Availability'] * merged_data['Performance'] * merged_data['Quality'] * 100
+    if st.session_state.oee_visuals_generated:
+        # Computed once, filter changes only slice the cube
+        cube = page.run_stage('compute', 'Sample calculations',
+                              lambda: OEECube(calculate_oee(sample_production_hours_data, sample_downtime_hours_data)),
+                              params=('sample',))
 
         # Filter results by ID
         st.markdown("<h2 style='text-align: center; color: #0768C9;'>Visuals Generated from Sample Data </h2>", unsafe_allow_html=True)
-        col1,col2,col3=st.columns(3)
-        with col1:
-          available_ids = merged_data['EquipmentId'].unique().tolist()
-          selected_id = st.selectbox('**Filter Results by Equipment ID**', ['All'] + available_ids)
+        dashboard(cube, 'sample')
 
-        if selected_id != 'All':
-            filtered_data = merged_data[merged_data['EquipmentId'] == selected_id]
-        else:
-            filtered_data = merged_data
-
-        # Calculate averages
-        average_availability = filtered_data['Availability'].mean()
-        average_performance = filtered_data['Performance'].mean()
-        average_quality = filtered_data['Quality'].mean()
-        average_oee = (average_availability * average_performance * average_quality) * 100
-
-        avg_oee_date_data = filtered_data.groupby('Date')['OEE'].mean().reset_index()
-        fig_oee_over_time = px.line(avg_oee_date_data, x='Date', y='OEE', title='Average OEE of Equipment on Each Date', height=350)
-
-        avg_metrics_data = filtered_data.groupby('EquipmentId')[['Availability', 'Performance', 'Quality']].mean().reset_index()
-        avg_metrics_data = avg_metrics_data.melt(id_vars=['EquipmentId'], value_vars=['Availability', 'Performance', 'Quality'],
-                                                 var_name='Metric', value_name='Average')
-
-        fig_avg_metrics = px.bar(avg_metrics_data, x='EquipmentId', y='Average', color='Metric', barmode='group',
-                                 title='Average Availability, Performance, and Quality of Each Equipment',
-                                 labels={'EquipmentId': 'Equipment ID', 'Average': 'Average Value'},
-                                 hover_data={'Average': True},
-                                 height=350)
-        fig_avg_metrics.update_traces(texttemplate='%{y:.2%}')
-
-        fig_availability = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_availability * 100,
-            title={'text': "Average Availability"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#2779B7"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_availability.update_layout(width=500, height=330)
-
-        fig_performance = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_performance * 100,
-            title={'text': "Average Performance"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#83C9FF"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_performance.update_layout(width=500, height=330)
-
-        fig_quality = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_quality * 100,
-            title={'text': "Average Quality"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#FF2B2B"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_quality.update_layout(width=500, height=330)
-
-        fig_oee = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_oee,
-            title={'text': "Average OEE"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#FFABAB"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_oee.update_layout(width=500, height=330)
-
-         # Calculate average OEE for each equipment ID
-        avg_oee_data = filtered_data.groupby('EquipmentId')['OEE'].mean().reset_index()
-        avg_oee_data.columns = ['EquipmentId', 'Average OEE']
-        avg_oee_data['Average OEE'] = avg_oee_data['Average OEE'].apply(lambda x: f"{x :.2f}%")
-             
-        # Display results for each record in a table
-        filtered_data_display = filtered_data[['Date', 'EquipmentId', 'Availability', 'Performance', 'Quality', 'OEE']]
-        filtered_data_display.loc[:, 'Availability'] = filtered_data_display['Availability'].round(4)*100
-        filtered_data_display.loc[:, 'Performance'] = filtered_data_display['Performance'].round(4)*100
-        filtered_data_display.loc[:,'Quality'] = filtered_data_display['Quality'].round(4)*100  
-        filtered_data_display.loc[:,'OEE'] = filtered_data_display['OEE'].round(2)
-
-        if selected_id == 'All':
-                  
-                   # Display summary of metrics as text
-                    st.markdown("**Summary**")
-                    st.markdown(
-                     f"""
-                     <div style="color: blue;">
-                    For Equipment IDs   <strong>{selected_id}</strong> ,
-                    the Average Availability is  <strong>{average_availability:.2%}</strong> ,
-                    the Average Performance is  <strong>{average_performance:.2%}</strong> ,
-                    the Average Quality is  <strong>{average_quality:.2%}</strong> ,
-                    and the Average OEE is  <strong>{average_oee/100:.2%}</strong>.</div>""", unsafe_allow_html=True)
-        else:
-                   
-                   # Display summary of metrics as text
-                    st.markdown("**Summary**")
-                    st.markdown(f""" <div style="color: blue;">
-                    For Equipment ID   <strong>{selected_id}</strong> ,
-                    the Average Availability is  <strong>{average_availability:.2%}</strong> ,
-                    the Average Performance is  <strong>{average_performance:.2%}</strong> ,
-                    the Average Quality is  <strong>{average_quality :.2%}</strong> ,
-                    and the Average OEE is  <strong>{average_oee/100:.2%}</strong>.
-                   </div>
-               """, unsafe_allow_html=True)
-
-            # Display gauge charts for average metrics
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-                st.plotly_chart(fig_availability)
-        with col2:
-                st.plotly_chart(fig_performance)
-        with col3:
-                st.plotly_chart(fig_quality)
-        with col4:
-                st.plotly_chart(fig_oee)
-
-        col5,col6=st.columns(2)
-        with col5:
-                st.plotly_chart(fig_oee_over_time,use_container_width=True)
-        with col6:
-                st.plotly_chart(fig_avg_metrics,use_container_width=True)
-
-        col7,col8=st.columns(2)
-        with col7:
-                st.write("**Equipment Metric Percentage Details**")
-                
-                st.dataframe(filtered_data_display,height=280,use_container_width=True, hide_index=True)
-        with col8:
-                st.write("**Average OEE of Each Equipment**")
-                st.dataframe(avg_oee_data,height=280,use_container_width=True, hide_index=True)
-
-        st.markdown(f"""<h4>Want to try with custom data</h4>
-            [({download_link}) to download excel templates with sample data. You may add/modify data into each of the excel template, save and upload to view the visuals as per the uploaded custom data]""", unsafe_allow_html=True) 
-
-    if st.session_state.visuals_generated:
+        st.markdown("<h4>Want to try with custom data</h4>", unsafe_allow_html=True)
+        st.download_button("Download Excel templates", data=download_sample_data, file_name="sample_data_oee.zip",
+                           mime="application/zip", on_click="ignore")
+        st.caption("Download the excel templates with sample data. You may add/modify data into each of the excel template, save and upload to view the visuals as per the uploaded custom data")
+
+    if st.session_state.oee_visuals_generated:
        if st.button("Upload Custom data files"):
-           st.session_state.upload_mode = True
-           st.session_state.visuals_generated = False
+           st.session_state.oee_upload_mode = True
+           st.session_state.oee_visuals_generated = False
            st.rerun()
 
+@st.cache_resource
+def get_oee_store(path):
+    # One store connection per process, shared by every session
+    return OEEStore(path)
+
+def oee_stages(production_file, downtime_file, load_options, use_history):
+    # Parse -> calculate stages of the background job, the cube it returns is only sliced by the page
+    def parse(_):
+        # Columns are pruned, IDs made categorical and dates parsed once here, at ingest; both files in parallel
+        return tuple(read_uploads([(production_file, input_options('production', *load_options)),
+                                   (downtime_file, input_options('downtime', *load_options))]))
+
+    def calculate(frames):
+        production_data, downtime_data = frames
+        if use_history:
+            # Only the uploaded days are recomputed, the rest of the history is served from rollups
+            cube = get_oee_store(OEE_STORE_PATH)
+            cube.upsert(production_data, downtime_data)
+        else:
+            cube = OEECube(calculate_oee(production_data, downtime_data))
+        return production_data, downtime_data, cube
+
+    return [("Parsing uploads", parse), ("Calculating OEE", calculate)]
+
 # Function for upload mode
 def upload_mode():
+    page.metrics.lap('render')
     st.title('🔢:blue[Overall Equipment Effectiveness (OEE) Calculator]')
 
     with st.sidebar.expander("Upload Custom data Files"):
-      production_file = st.file_uploader("Upload Production Data", type=["csv", "xlsx"])
-      downtime_file = st.file_uploader("Upload Downtime Data", type=["csv", "xlsx"])
+      production_file = st.file_uploader("Upload Production Data", type=TABLE_TYPES)
+      downtime_file = st.file_uploader("Upload Downtime Data", type=TABLE_TYPES)
+      # Pushed into Parquet/Arrow reads, so only the selected partitions and row groups are loaded
+      load_ids = parse_ids(st.text_input("Load only Equipment IDs", placeholder="e.g. 11, 12"))
+      load_start = st.date_input("Load from date", value=None)
+      load_end = st.date_input("Load to date", value=None)
+      use_history = st.checkbox("Append uploads to OEE history", help=f"Keeps every uploaded day in {OEE_STORE_PATH}")
 
     if production_file is not None and downtime_file is not None:
-        if production_file.name.endswith('.csv'):
-            production_data = pd.read_csv(production_file)
-            
-        else:
-            production_data = pd.read_excel(production_file)
-            
-
-        if downtime_file.name.endswith('.csv'):
-            downtime_data = pd.read_csv(downtime_file)
-           
-        else:
-            downtime_data = pd.read_excel(downtime_file)
-                    
+        # Parsing and the OEE calculation run on a worker thread once per pair of uploads and load filters,
+        # filter changes only slice the cube; changing the uploads or load filters cancels a running job
+        page.metrics.lap('job')
+        load_options = (load_ids, load_start, load_end)
+        upload_key = (production_file.file_id, downtime_file.file_id, tuple(load_ids), load_start, load_end, use_history)
+        st.session_state.oee_job = JOBS.submit(upload_key, oee_stages(production_file, downtime_file, load_options, use_history),
+                                               previous=st.session_state.get('oee_job'))
+        production_data, downtime_data, cube = job_result(st.session_state.oee_job, 'oee_job', page.metrics)
+        st.sidebar.caption(format_cache_stats())
+        st.sidebar.caption(format_normalize_report('Production', production_data) + '  \n' +
+                           format_normalize_report('Downtime', downtime_data))
+
+        page.metrics.lap('render')
         col1,col2=st.columns(2)
         with col1:
             st.write("**Uploaded Production Hours Data**")
-            st.dataframe(production_data, height=250, use_container_width=True,hide_index=True)
+            paged_table(production_data, 'production_table', height=250, preview=True)
         with col2:
             st.write("**Uploaded Downtime Hours Data**")
-            st.dataframe(downtime_data, height=250, use_container_width=True,hide_index=True)
+            paged_table(downtime_data, 'downtime_table', height=250, preview=True)
 
  
-        merged_data = calculate_oee(production_data, downtime_data)
-
         # Filter results by ID
         st.markdown("<h2 style='text-align: center; color: #0768C9;'>Visuals Generated from Custom Data </h2>", unsafe_allow_html=True)
-        col1,col2,col3=st.columns(3)
-        with col1:
-          #st.write('Filter Results by ID')
-          available_ids = merged_data['EquipmentId'].unique().tolist()
-          selected_id = st.selectbox('**Filter Results by Equipment ID**', ['All'] + available_ids)
-
-        if selected_id != 'All':
-            filtered_data = merged_data[merged_data['EquipmentId'] == selected_id]
-        else:
-            filtered_data = merged_data
-
-        # Calculate averages
-        average_availability = filtered_data['Availability'].mean()
-        average_performance = filtered_data['Performance'].mean()
-        average_quality = filtered_data['Quality'].mean()
-        average_oee = (average_availability * average_performance * average_quality) * 100
-
-        avg_oee_date_data = filtered_data.groupby('Date')['OEE'].mean().reset_index()
-        fig_oee_over_time = px.line(avg_oee_date_data, x='Date', y='OEE', title='Average OEE of Equipment on Each Date', height=350)
-
-        avg_metrics_data = filtered_data.groupby('EquipmentId')[['Availability', 'Performance', 'Quality']].mean().reset_index()
-        avg_metrics_data = avg_metrics_data.melt(id_vars=['EquipmentId'], value_vars=['Availability', 'Performance', 'Quality'],
-                                                 var_name='Metric', value_name='Average')
-
-        fig_avg_metrics = px.bar(avg_metrics_data, x='EquipmentId', y='Average', color='Metric', barmode='group',
-                                 title='Average Availability, Performance, and Quality of Each Equipment',
-                                 labels={'EquipmentId': 'Equipment ID', 'Average': 'Average Value'},
-                                 hover_data={'Average': True},
-                                 height=350)
-        fig_avg_metrics.update_traces(texttemplate='%{y:.2%}')
-
-        fig_availability = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_availability * 100,
-            title={'text': "Average Availability"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#2779B7"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_availability.update_layout(width=500, height=330)
-
-        fig_performance = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_performance * 100,
-            title={'text': "Average Performance"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#83C9FF"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_performance.update_layout(width=500, height=330)
-
-        fig_quality = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_quality * 100,
-            title={'text': "Average Quality"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#FF2B2B"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_quality.update_layout(width=500, height=330)
-
-        fig_oee = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=average_oee,
-            title={'text': "Average OEE"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "#FFABAB"},
-                   'steps': [
-                       {'range': [0, 50], 'color': "lightgray"},
-                       {'range': [50, 100], 'color': "lightgray"}]},
-            number={'suffix': '%', 'valueformat': '.2f'}))
-        fig_oee.update_layout(width=500, height=330)
-
-        avg_oee_data = filtered_data.groupby('EquipmentId')['OEE'].mean().reset_index()
-        avg_oee_data.columns = ['EquipmentId', 'Average OEE']
-        avg_oee_data['Average OEE'] = avg_oee_data['Average OEE'].apply(lambda x: f"{x :.2f}%")
-             
-        # Display results for each record in a table
-        filtered_data_display = filtered_data[['Date', 'EquipmentId', 'Availability', 'Performance', 'Quality', 'OEE']]
-        filtered_data_display.loc[:, 'Availability'] = filtered_data_display['Availability'].round(4)*100 
-        filtered_data_display.loc[:,'Performance'] = filtered_data_display['Performance'].round(4)*100 
-        filtered_data_display.loc[:,'Quality'] = filtered_data_display['Quality'].round(4)*100 
-        filtered_data_display.loc[:,'OEE'] = filtered_data_display['OEE'].round(2)
-       
-        if selected_id == 'All':
-               
-                    st.markdown("**Summary**")
-                    st.markdown(
-                     f"""
-                     <div style="color: blue;">
-                    For Equipment IDs   <strong>{selected_id}</strong> ,
-                    the Average Availability is  <strong>{average_availability:.2%}</strong> ,
-                    the Average Performance is  <strong>{average_performance:.2%}</strong> ,
-                    the Average Quality is  <strong>{average_quality:.2%}</strong> ,
-                    and the Average OEE is  <strong>{average_oee/100:.2%}</strong>.</div>""", unsafe_allow_html=True)
-        else:
-                   
-                    st.markdown("**Summary**")
-                    st.markdown(f""" <div style="color: blue;">
-                    For Equipment ID   <strong>{selected_id}</strong> ,
-                    the Average Availability is  <strong>{average_availability:.2%}</strong> ,
-                    the Average Performance is  <strong>{average_performance:.2%}</strong> ,
-                    the Average Quality is  <strong>{average_quality :.2%}</strong> ,
-                    and the Average OEE is  <strong>{average_oee/100:.2%}</strong>.
-                   </div>
-               """, unsafe_allow_html=True)
-
-            # Display gauge charts for average metrics
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-                st.plotly_chart(fig_availability)
-        with col2:
-                st.plotly_chart(fig_performance)
-        with col3:
-                st.plotly_chart(fig_quality)
-        with col4:
-                st.plotly_chart(fig_oee)
-
-        col5,col6=st.columns(2)
-        with col5:
-                st.plotly_chart(fig_oee_over_time,use_container_width=True)
-        with col6:
-                st.plotly_chart(fig_avg_metrics,use_container_width=True)
-
-        col7,col8=st.columns(2)
-        with col7:
-                st.write("**Equipment Metric Percentage Details**")
-                st.dataframe(filtered_data_display,height=280,use_container_width=True,hide_index=True)
-        with col8:
-                st.write("**Average OEE of Each Equipment**")
-                st.dataframe(avg_oee_data,height=280,use_container_width=True, hide_index=True)
+        # The history store changes under the same uploads when any session appends to it
+        dashboard(cube, (st.session_state.oee_job.key, cube.version if use_history else 0), paged_results=True)
 
 
 # Main logic to switch between modes
-if st.session_state.upload_mode:
-    upload_mode()
-else:
-    sample_mode()
\ No newline at end of file
+try:
+    if st.session_state.oee_upload_mode:
+        upload_mode()
+    else:
+        sample_mode()
+finally:
+    stage_breakdown = page.metrics.finish()
+
+with st.sidebar.expander("Performance of this rerun"):
+    st.dataframe(stage_breakdown, hide_index=True)
\ No newline at end of file
@@ -2,33 +2,54 @@ import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px  # Ensure plotly.express is imported
-import base64
 import zipfile
 from io import BytesIO
-import numpy as np
+import os
+import sys
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.parse_cache import read_uploads, format_cache_stats
+from core.pump import (align_vibration, calculate_mtbf, calculate_rul, fleet_reliability, latest_vibration_features,
+                       pre_failure_profile, pre_failure_windows, reliability, vibration_features, weibull_rul)
+from core.readers import TABLE_TYPES, parse_ids
+from core.batch import input_options
+from core.normalize import format_normalize_report
+from core.downsample import WEBGL_THRESHOLD, downsample_trend
+from core.jobs import JOBS
+from core.figures import cached_figure, gauge, pre_failure_line, trend_line
+from core.ui import CalculatorPage, job_result, paged_table
+
+# Age: calendar age against ExpireDate; Weibull: survival fits on failure intervals, age where a pump has too few
+RUL_MODELS = ['Age', 'Weibull']
 
 # Set page configuration (call this only once at the beginning)
 st.set_page_config(layout="wide")
 st.markdown('<style>div.block-container { padding-top: 3rem; background-color: #E1FAF4; }</style>', unsafe_allow_html=True)
 
-# Define session state keys
-if 'upload_mode' not in st.session_state:
-    st.session_state.upload_mode = False
+# Define session state keys, prefixed because the launcher (app.py) hosts every calculator in one session
+if 'pump_upload_mode' not in st.session_state:
+    st.session_state.pump_upload_mode = False
 if 'show_visuals' not in st.session_state:
     st.session_state.show_visuals = False
 
-if 'uploaded_files' not in st.session_state:
-    st.session_state.uploaded_files = {
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Timings of this rerun (page.metrics) and the dashboard stages kept between reruns
+page = CalculatorPage('pump', 'pump_stage_graph')
+
+if 'pump_uploaded_files' not in st.session_state:
+    st.session_state.pump_uploaded_files = {
         'operating_data': None,
         'vibration_data': None,
         'maintenance_data': None,
         'equipment_data': None
     }
 
+@st.cache_data(show_spinner=False)
 def download_sample_data():
-    # Function to download sample_data_formats.zip
+    # Function to build sample_data.zip, only runs when the download button is clicked and is cached after that
     sample_operating_data = pd.DataFrame({
         'PumpID': [1, 1, 2, 2],
         'Date': ['01-06-2024', '02-06-2024', '03-06-2024', '04-06-2024'],
@@ -62,66 +83,276 @@ def download_sample_data():
             data.to_excel(excel_data, index=False)
             zipf.writestr(name, excel_data.getvalue())
 
-    zip_data.seek(0)
-    b64 = base64.b64encode(zip_data.read()).decode()
-    href = f'<a href="data:application/zip;base64,{b64}" download="sample_data.zip">Click Here</a>'
-    return href
-
-def calculate_mtbf(operating_data, maintenance_data):
-    # Function to calculate MTBF
-    total_operating_time = operating_data.groupby('PumpID')['Operating Hours'].sum().reset_index()
-    num_failures = maintenance_data.groupby('PumpID').size().reset_index(name='Number of Failures')
-    mtbf_data = pd.merge(total_operating_time, num_failures, on='PumpID', how='outer')
-    mtbf_data['MTBF (Hours)'] = mtbf_data['Operating Hours'] // mtbf_data['Number of Failures']
-    return mtbf_data
-
-def calculate_rul(mtbf_data, equipment_data):
-    # Function to calculate RUL
-    current_date = pd.Timestamp.now()
-    equipment_data['ManufactureDate'] = pd.to_datetime(equipment_data['ManufactureDate'])
-    equipment_data['ExpireDate'] = pd.to_datetime(equipment_data['ExpireDate'])
-    equipment_data['Pump Age (Days)'] = (current_date - equipment_data['ManufactureDate']).dt.days
-
-    if 'ExpireDate' in equipment_data.columns:
-        equipment_data['Expected Lifespan (Days)'] = (equipment_data['ExpireDate'] - equipment_data['ManufactureDate']).dt.days
-        mtbf_data = pd.merge(mtbf_data, equipment_data[['PumpID', 'Pump Age (Days)', 'Expected Lifespan (Days)']], on='PumpID', how='left')
-        mtbf_data['RUL (%)'] = ((mtbf_data['Expected Lifespan (Days)'] - mtbf_data['Pump Age (Days)']) / mtbf_data['Expected Lifespan (Days)']) * 100
-        mtbf_data['RUL (%)'] = mtbf_data['RUL (%)'].clip(lower=0)
-        mtbf_data['RUL (%)'] = np.array(mtbf_data['RUL (%)']).round(2)
-    else:
-        st.error("Error: 'ExpireDate' column is missing in Equipment Data.")
-
-    return mtbf_data
+    return zip_data.getvalue()
+
+@page.fragment
+def trend_chart(data, x, y, key, after):
+    # Long trends are LTTB-downsampled to the point budget with a min/max band behind the line,
+    # and the zoom slider re-queries the chosen window at full budget; `after` is the stage that built `data`
+    reduced, envelope, total = page.run_stage('aggregate', f'Downsample {y}', lambda: downsample_trend(data, x, y),
+                                              after=(after,))
+    zoom = None
+    if envelope is not None and pd.api.types.is_datetime64_any_dtype(reduced[x]):
+        start, end = reduced[x].iloc[0].to_pydatetime(), reduced[x].iloc[-1].to_pydatetime()
+        window = st.slider('Zoom', min_value=start, max_value=end, value=(start, end),
+                           step=max((end - start) / 1000, pd.Timedelta(seconds=1).to_pytimedelta()), key=key)
+        if window != (start, end):
+            zoom = window
+            reduced, envelope, total = page.run_stage('aggregate', f'Zoom {y}',
+                                                      lambda: downsample_trend(data, x, y, x_range=window),
+                                                      params=(window,), after=(after,))
+
+    # Rebuilt only when the downsampled points change
+    fig = page.run_stage('figures', f'{y} chart',
+                         lambda: cached_figure(trend_line, reduced, envelope, x, y, webgl=len(reduced) > WEBGL_THRESHOLD),
+                         params=(zoom,), after=(after,))
+    if envelope is not None:
+        st.caption(f'Showing {len(reduced):,} of {total:,} points')
+    page.metrics.lap('render')
+    st.plotly_chart(fig)
+
+def reliability_section(pump_stats, intervals, pump_ids):
+    # True time between failures of the selected pumps, from failure dates and the operating hours between them
+    st.subheader('Time Between Failures')
+    def aggregate():
+        selected_stats = pump_stats[pump_stats['PumpID'].isin(pump_ids)]
+        return selected_stats, fleet_reliability(selected_stats, intervals[intervals['PumpID'].isin(pump_ids)])
+    pump_stats, fleet = page.run_stage('aggregate', 'Reliability', aggregate, after=('Pump filter',))
+
+    page.metrics.lap('render')
+    st.markdown(f"""
+    Across **{fleet['Pumps']:,}** pumps the MTBF is **{fleet['MTBF (Hours)']:.1f} hours** of operation
+    (median interval {fleet['TBF Median (Hours)']:.1f}, P10 {fleet['TBF P10 (Hours)']:.1f}, P90 {fleet['TBF P90 (Hours)']:.1f} hours),
+    with **{fleet['Failures per 1000 Hours']:.2f}** failures per 1000 operating hours.
+    """)
+    paged_table(pump_stats.round(2), 'reliability_table')
+
+@page.fragment
+def pre_failure_section(aligned, pump_ids):
+    # Vibration over the last days before each failure, from the readings aligned to their pump's next failure
+    st.subheader('Vibration Before Failures')
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        days = st.slider('Days before failure', min_value=1, max_value=90, value=30, key='pre_failure_days')
+
+    def aggregate():
+        selected = aligned[aligned['PumpID'].isin(pump_ids)]
+        return (pre_failure_profile(selected, days),
+                pre_failure_windows(selected, days).round({'Mean': 3, 'RMS': 3, 'Peak': 3, 'Baseline Mean': 3, 'Change (%)': 1}))
+    profile, windows = page.run_stage('aggregate', 'Pre-failure windows', aggregate, params=(days,), after=('Pump filter',))
+
+    fig = page.run_stage('figures', 'Pre-failure chart', lambda: cached_figure(pre_failure_line, profile),
+                         after=('Pre-failure windows',))
+    page.metrics.lap('render')
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.plotly_chart(fig)
+    with col2:
+        st.write('**Readings before each Failure**')
+        paged_table(windows, 'pre_failure_table')
+
+@page.fragment
+def vibration_feature_section(vibration_data, pump_ids, data_key):
+    # Per-pump condition features over a trailing window, evaluated once per window period; computed once per
+    # vibration dataset and window
+    st.subheader('Vibration Condition Features')
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        window = st.selectbox('Feature Window', ['1h', '6h', '1D', '7D'], index=2)
+
+    features = page.run_stage('compute', 'Vibration features', lambda: vibration_features(vibration_data, window=window, step=window),
+                              params=(data_key, window))
+    def aggregate():
+        selected = features[features['PumpID'].isin(pump_ids)]
+        return (latest_vibration_features(selected).round({'Mean': 3, 'RMS': 3, 'Peak': 3, 'Crest Factor': 3, 'Kurtosis': 3, 'RMS Trend': 3}),
+                selected.groupby(selected['Window End'].dt.floor(window))['RMS Trend'].mean().reset_index())
+    latest_features, trend_data = page.run_stage('aggregate', 'Latest features', aggregate,
+                                                 after=('Vibration features', 'Pump filter'))
+
+    page.metrics.lap('render')
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.write('**Latest Window per Pump**')
+        st.dataframe(latest_features, hide_index=True)
+    with col2:
+        trend_chart(trend_data, 'Window End', 'RMS Trend', key='rms_trend_zoom', after='Latest features')
+
+def pump_stages(uploaded_files, load_range, previous_fits=None):
+    # Parse -> MTBF -> RUL -> time between failures -> Weibull RUL -> vibration alignment stages of the background job;
+    # `previous_fits` (the last upload's Weibull fits) warm-start the refit
+    def parse(_):
+        # Columns are pruned, PumpIDs made categorical and dates parsed once here, at ingest; the files in parallel
+        return tuple(read_uploads([(uploaded_files['operating_data'], input_options('operating', *load_range)),
+                                   (uploaded_files['vibration_data'], input_options('vibration', *load_range)),
+                                   (uploaded_files['maintenance_data'], input_options('maintenance', *load_range)),
+                                   (uploaded_files['equipment_data'], input_options('equipment', load_range[0]))]))
+
+    def mtbf(frames):
+        return frames, calculate_mtbf(frames[0], frames[2])
+
+    def rul(previous):
+        frames, mtbf_data = previous
+        return frames, calculate_rul(mtbf_data, frames[3])
+
+    def reliability_stats(previous):
+        frames, mtbf_data = previous
+        return frames, mtbf_data, reliability(frames[0], frames[2])
+
+    def weibull(previous):
+        frames, mtbf_data, failure_stats = previous
+        return frames, mtbf_data, failure_stats, weibull_rul(mtbf_data, frames[3], *failure_stats, previous=previous_fits)
+
+    def align(previous):
+        frames = previous[0]
+        return previous + (align_vibration(frames[1], frames[0], frames[2]),)
+
+    return [("Parsing uploads", parse), ("Calculating MTBF", mtbf), ("Estimating RUL", rul),
+            ("Time between failures", reliability_stats), ("Fitting Weibull RUL", weibull),
+            ("Aligning vibration", align)]
+
+def sample_calculations(operating_data, vibration_data, maintenance_data, equipment_data):
+    mtbf_data = calculate_rul(calculate_mtbf(operating_data, maintenance_data), equipment_data)
+    failure_stats = reliability(operating_data, maintenance_data)
+    weibull_rul_data, _ = weibull_rul(mtbf_data, equipment_data, *failure_stats)
+    return mtbf_data, weibull_rul_data, failure_stats, align_vibration(vibration_data, operating_data, maintenance_data)
+
+@page.fragment
+def dashboard(rul_data, operating_data, vibration_data, pump_stats, failure_intervals, aligned_vibration, data_key,
+              narrative=False):
+    # Filter -> aggregate -> figures over computed data. A widget here reruns only this fragment, and of its
+    # stages only those downstream of that widget; `rul_data` maps each RUL model to its table and `data_key`
+    # identifies the data they were computed from
+    sidebar_fraction = 0.3  # Adjust the fraction as needed, e.g., 0.3 means 30% of the total width
+
+    # Use st for the main content area
+    col1, col2 = st.columns([sidebar_fraction, 1 - sidebar_fraction])  # Adjust as needed
+    with col1:
+        rul_model = st.radio('RUL model', RUL_MODELS, horizontal=True, key='pump_rul_model')
+        rul_percentage = st.slider('Select RUL (%)', min_value=0, max_value=100, value=0)
+    mtbf_data = rul_data[rul_model]
+    rul_filtered = page.run_stage('filter', 'RUL filter', lambda: mtbf_data[mtbf_data['RUL (%)'] >= rul_percentage],
+                                  params=(data_key, rul_model, rul_percentage))
+
+    #st.header('Filter by Pump ID')
+
+    with col1:
+        pump_id_options = ['All'] + rul_filtered['PumpID'].unique().tolist()
+        selected_pump_id = st.selectbox('Select Pump ID', pump_id_options)
+
+    filtered_mtbf_data = page.run_stage('filter', 'Pump filter', lambda: rul_filtered if selected_pump_id == 'All' else
+                                        rul_filtered[rul_filtered['PumpID'] == selected_pump_id],
+                                        params=(selected_pump_id,), after=('RUL filter',))
+    pump_ids = filtered_mtbf_data['PumpID']
+
+    if narrative:
+        # Narrative section
+        average_hours = page.run_stage('aggregate', 'Average operating hours', lambda: (
+            operating_data['Operating Hours'].mean() if selected_pump_id == 'All' else
+            operating_data.loc[operating_data['PumpID'] == selected_pump_id, 'Operating Hours'].mean()),
+            params=(data_key, selected_pump_id))
+        page.metrics.lap('render')
+        if selected_pump_id == 'All':
+            st.markdown("""
+            ### Overall Pump Performance Overview:
+            - The average <span style='color: blue;'>Operating Hours</span> across all pumps is <span style='color: blue; font-weight: bold;'>{:.2f} hours</span>.
+            - The average <span style='color: blue;'>RUL (%)</span> across all pumps is <span style='color: blue; font-weight: bold;'>{:.2f}%</span>.
+            """.format(average_hours, filtered_mtbf_data['RUL (%)'].mean()), unsafe_allow_html=True)
+        else:
+            st.markdown("""
+            ### Performance Overview for Pump ID {}:
+            - For Pump ID <span style='color: blue;'>{}</span>, the average <span style='color: blue;'>Operating Hours</span> is <span style='color: blue; font-weight: bold;'>{:.2f} hours</span>.
+            - The average <span style='color: blue;'>RUL (%)</span> is <span style='color: blue; font-weight: bold;'>{:.2f}%</span>.
+            """.format(selected_pump_id, selected_pump_id, average_hours, filtered_mtbf_data['RUL (%)'].mean()), unsafe_allow_html=True)
+
+    col1, col2 = st.columns([1, 1])
+
+    with col1:
+        if 'Date' in operating_data.columns:
+            st.subheader('Average MTBF Over Time')
+            avg_operating_data = page.run_stage('aggregate', 'Operating trend', lambda: (
+                operating_data[operating_data['PumpID'].isin(pump_ids)]
+                .groupby('Date')['Operating Hours'].mean().reset_index()), after=('Pump filter',))
+            trend_chart(avg_operating_data, 'Date', 'Operating Hours', key='operating_zoom', after='Operating trend')
+
+    with col2:
+        if 'Date' in vibration_data.columns:
+            st.subheader('Average Vibration Levels Over Time')
+            avg_vibration_data = page.run_stage('aggregate', 'Vibration trend', lambda: (
+                vibration_data[vibration_data['PumpID'].isin(pump_ids)]
+                .groupby('Date')['Vibration Level (mm/s)'].mean().reset_index()), after=('Pump filter',))
+            trend_chart(avg_vibration_data, 'Date', 'Vibration Level (mm/s)', key='vibration_zoom', after='Vibration trend')
+
+    col3, col4 = st.columns([1, 1])
+
+    with col3:
+        st.subheader('Estimated RUL (%)')
+        fig = page.run_stage('figures', 'RUL gauge', lambda: cached_figure(
+            gauge, filtered_mtbf_data['RUL (%)'].mean(), "Average RUL (%)", "darkblue",
+            step_colors=('lightgray', 'gray'), width=350, height=350), after=('Pump filter',))
+        page.metrics.lap('render')
+        st.plotly_chart(fig)
+
+    with col4:
+        st.subheader('Estimated RUL Details')
+        st.dataframe(filtered_mtbf_data.drop(columns=['Operating Hours', 'Number of Failures', 'MTBF (Hours)']))
+
+    reliability_section(pump_stats, failure_intervals, pump_ids)
+
+    pre_failure_section(aligned_vibration, pump_ids)
+
+    vibration_feature_section(vibration_data, pump_ids, data_key)
 
 def main():
+    page.metrics.lap('render')
 
     st.markdown("<h2 style='text-align: center; color: green;'>Pump Maintenance and Performance Analyzer</h2>", unsafe_allow_html=True) 
 
-    if st.session_state.upload_mode:
+    if st.session_state.pump_upload_mode:
         # File upload mode
         with st.sidebar.expander("Please upload all required custom data files."): 
 
-            operating_file = st.file_uploader("Operating Data", type=["xlsx"])
-            vibration_file = st.file_uploader("Vibration Data", type=["xlsx"])
-            maintenance_file = st.file_uploader("Maintenance History", type=["xlsx"])
-            equipment_file = st.file_uploader("Equipment Data", type=["xlsx"])
+            operating_file = st.file_uploader("Operating Data", type=TABLE_TYPES)
+            vibration_file = st.file_uploader("Vibration Data", type=TABLE_TYPES)
+            maintenance_file = st.file_uploader("Maintenance History", type=TABLE_TYPES)
+            equipment_file = st.file_uploader("Equipment Data", type=TABLE_TYPES)
+            # Pushed into Parquet/Arrow reads, so only the selected partitions and row groups are loaded
+            load_ids = parse_ids(st.text_input("Load only Pump IDs", placeholder="e.g. 1, 2"))
+            load_start = st.date_input("Load from date", value=None)
+            load_end = st.date_input("Load to date", value=None)
 
             if operating_file:
-                st.session_state.uploaded_files['operating_data'] = operating_file
+                st.session_state.pump_uploaded_files['operating_data'] = operating_file
             if vibration_file:
-                st.session_state.uploaded_files['vibration_data'] = vibration_file
+                st.session_state.pump_uploaded_files['vibration_data'] = vibration_file
             if maintenance_file:
-                st.session_state.uploaded_files['maintenance_data'] = maintenance_file
+                st.session_state.pump_uploaded_files['maintenance_data'] = maintenance_file
             if equipment_file:
-                st.session_state.uploaded_files['equipment_data'] = equipment_file
+                st.session_state.pump_uploaded_files['equipment_data'] = equipment_file
 
-        uploaded_files = st.session_state.uploaded_files
+        uploaded_files = st.session_state.pump_uploaded_files
 
         if all(uploaded_files.values()):
-            operating_data = pd.read_excel(uploaded_files['operating_data'])
-            vibration_data = pd.read_excel(uploaded_files['vibration_data'])
-            maintenance_data = pd.read_excel(uploaded_files['maintenance_data'])
-            equipment_data = pd.read_excel(uploaded_files['equipment_data'])
+            # Parsing, MTBF and RUL run on a worker thread once per set of uploads and load filters, so
+            # slider/selectbox reruns skip them; changing the uploads or load filters cancels a running job
+            page.metrics.lap('job')
+            load_range = (load_ids, load_start, load_end)
+            upload_key = tuple(uploaded_files[name].file_id for name in uploaded_files) + (tuple(load_ids), load_start, load_end)
+            st.session_state.pump_job = JOBS.submit(
+                upload_key, pump_stages(dict(uploaded_files), load_range, st.session_state.get('weibull_fits')),
+                previous=st.session_state.get('pump_job'))
+            try:
+                (frames, age_rul_data, (pump_stats, failure_intervals), (weibull_rul_data, weibull_fits),
+                 aligned_vibration) = job_result(st.session_state.pump_job, 'pump_job', page.metrics)
+            except ValueError as e:
+                st.error(f"Error: {e}")
+                st.stop()
+            st.session_state.weibull_fits = weibull_fits
+            operating_data, vibration_data, maintenance_data, equipment_data = frames
+            st.sidebar.caption(format_cache_stats())
+            st.sidebar.caption('  \n'.join(format_normalize_report(name, data) for name, data in
+                                            [('Operating', operating_data), ('Vibration', vibration_data),
+                                             ('Maintenance', maintenance_data), ('Equipment', equipment_data)]))
+            page.metrics.lap('render')
 
             #st.header('Uploaded Data')
             st.markdown("<h4 style='text-align: center; color: blue;'>[[Custom Data]]</h4>", unsafe_allow_html=True) 
@@ -129,109 +360,30 @@ def main():
 
             with col1:
                 st.subheader('Operating Data')
-                st.dataframe(operating_data)
+                paged_table(operating_data, 'operating_table', preview=True)
 
                 st.subheader('Vibration Data')
-                st.dataframe(vibration_data)
+                paged_table(vibration_data, 'vibration_table', preview=True)
 
             with col2:
                 st.subheader('Maintenance History')
-                st.dataframe(maintenance_data)
+                paged_table(maintenance_data, 'maintenance_table', preview=True)
 
                 st.subheader('Equipment Data')
-                st.dataframe(equipment_data)
+                paged_table(equipment_data, 'equipment_table', preview=True)
 
             st.markdown("<h2 style='text-align: center; color: black;'>Visuals genetated with Custom data</h2>", unsafe_allow_html=True)
-            sidebar_fraction = 0.3  # Adjust the fraction as needed, e.g., 0.3 means 30% of the total width
 
             # Layout using st.sidebar and st
             st.subheader('Filter Data by RUL (%)and PumpID')
-
-            # Use st for the main content area
-            col1, col2 = st.columns([sidebar_fraction, 1 - sidebar_fraction])  # Adjust as needed
-            with col1:
-                rul_percentage = st.slider('Select RUL (%)', min_value=0, max_value=100, value=0)
-
-            # Calculate MTBF and RUL based on uploaded data
-            mtbf_data = calculate_mtbf(operating_data, maintenance_data)
-            mtbf_data = calculate_rul(mtbf_data, equipment_data)
-
-            filtered_mtbf_data = mtbf_data[mtbf_data['RUL (%)'] >= rul_percentage]
-
-            #st.header('Filter by Pump ID')
-
-            with col1:
-                pump_id_options = ['All'] + filtered_mtbf_data['PumpID'].unique().tolist()
-                selected_pump_id = st.selectbox('Select Pump ID', pump_id_options)
-
-            if selected_pump_id != 'All':
-                filtered_mtbf_data = filtered_mtbf_data[filtered_mtbf_data['PumpID'] == selected_pump_id]
-                filtered_operating_data = operating_data[operating_data['PumpID'] == selected_pump_id]
-
-            # Narrative section
-            if selected_pump_id == 'All':
-                st.markdown("""
-                ### Overall Pump Performance Overview:
-                - The average <span style='color: blue;'>Operating Hours</span> across all pumps is <span style='color: blue; font-weight: bold;'>{:.2f} hours</span>.
-                - The average <span style='color: blue;'>RUL (%)</span> across all pumps is <span style='color: blue; font-weight: bold;'>{:.2f}%</span>.
-                """.format(operating_data['Operating Hours'].mean(), filtered_mtbf_data['RUL (%)'].mean()), unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                ### Performance Overview for Pump ID {}:
-                - For Pump ID <span style='color: blue;'>{}</span>, the average <span style='color: blue;'>Operating Hours</span> is <span style='color: blue; font-weight: bold;'>{:.2f} hours</span>.
-                - The average <span style='color: blue;'>RUL (%)</span> is <span style='color: blue; font-weight: bold;'>{:.2f}%</span>.
-                """.format(selected_pump_id, selected_pump_id, filtered_operating_data['Operating Hours'].mean(), filtered_mtbf_data['RUL (%)'].mean()), unsafe_allow_html=True)
-
-            # Visualizations based on uploaded data
-            col1, col2 = st.columns([1, 1])
-
-            with col1:
-                if 'Date' in operating_data.columns:
-                    st.subheader('Average MTBF Over Time')
-                    filtered_operating_data = operating_data[operating_data['PumpID'].isin(filtered_mtbf_data['PumpID'])]
-                    avg_operating_data = filtered_operating_data.groupby('Date')['Operating Hours'].mean().reset_index()
-                    fig = px.line(avg_operating_data, x='Date', y='Operating Hours')
-                    fig.update_layout(title='', xaxis_title='Date', yaxis_title='Operating Hours')
-                    st.plotly_chart(fig)
-
-            with col2:
-                if 'Date' in vibration_data.columns:
-                    st.subheader('Average Vibration Levels Over Time')
-                    filtered_vibration_data = vibration_data[vibration_data['PumpID'].isin(filtered_mtbf_data['PumpID'])]
-                    avg_vibration_data = filtered_vibration_data.groupby('Date')['Vibration Level (mm/s)'].mean().reset_index()
-                    fig = px.line(avg_vibration_data, x='Date', y='Vibration Level (mm/s)')
-                    fig.update_layout(title='', xaxis_title='Date', yaxis_title='Vibration Level (mm/s)')
-                    st.plotly_chart(fig)
-
-            col3, col4 = st.columns([1, 1])
-
-            with col3:
-                st.subheader('Estimated RUL (%)')
-                average_rul = filtered_mtbf_data['RUL (%)'].mean()
-                fig = go.Figure(go.Indicator(
-                    mode="gauge+number",
-                    value=average_rul,
-                    title={'text': "Average RUL (%)"}, 
-                    gauge={'axis': {'range': [0, 100]},
-                           'bar': {'color': "darkblue"},
-                           'steps': [
-                               {'range': [0, 50], 'color': "lightgray"},
-                               {'range': [50, 100], 'color': "gray"}]},
-                    number={'suffix': '%', 'valueformat': '.2f'}))
-                fig.update_layout(width=350, height=350)
-                st.plotly_chart(fig)
-
-            with col4:
-                st.subheader('Estimated RUL Details')
-                st.dataframe(filtered_mtbf_data.drop(columns=['Operating Hours', 'Number of Failures', 'MTBF (Hours)']))
+            dashboard({'Age': age_rul_data, 'Weibull': weibull_rul_data}, operating_data, vibration_data, pump_stats,
+                      failure_intervals, aligned_vibration, data_key=upload_key, narrative=True)
 
         else:
             st.warning('Please upload all required custom data files.')
 
     else:
         # Description of the Pump Maintenance Calculator
-        download_link = download_sample_data()
-
         st.markdown(f""" 
             The **Pump Maintenance Calculator** helps visualize pump performance and maintenance with insights into Mean Time Between Failures (**MTBF**) and Remaining Useful Life (**RUL**). The input datasets and output visuals are as explained below:\n
             **Input**:  
@@ -282,92 +434,43 @@ def main():
             st.dataframe(sample_maintenance_data)
         if st.button('Generate Visuals with above Sample data'):
                 st.session_state.show_visuals = True
-                st.session_state.upload_mode = False
+                st.session_state.pump_upload_mode = False
 
         if st.session_state.show_visuals:
             st.markdown("<h3 style='text-align: center; color: Blue;'>Visuals genetated from above sample data</h3>", unsafe_allow_html=True)
 
             st.subheader("Filter Data by RUL (%) and PumpID")
 
-            col1, col2 = st.columns([1, 3])  # Adjust as needed
-            with col1:
-                rul_percentage = st.slider('Select RUL (%)', min_value=0, max_value=100, value=0)
-
-            # Calculate MTBF and RUL based on sample data
-            mtbf_data = calculate_mtbf(sample_operating_data, sample_maintenance_data)
-            mtbf_data = calculate_rul(mtbf_data, sample_equipment_data)
-
-            filtered_mtbf_data = mtbf_data[mtbf_data['RUL (%)'] >= rul_percentage]
-            col1, col2 = st.columns([1, 3])
-            with col1:
-                #st.header('***Filter Results by Pump ID***')
-                pump_id_options = ['All'] + filtered_mtbf_data['PumpID'].unique().tolist()
-                selected_pump_id = st.selectbox('Select Pump ID', pump_id_options)
-
-            if selected_pump_id != 'All':
-                filtered_mtbf_data = filtered_mtbf_data[filtered_mtbf_data['PumpID'] == selected_pump_id]
-                filtered_operating_data = sample_operating_data[sample_operating_data['PumpID'] == selected_pump_id]
-
+            # MTBF, both RUL models and the vibration alignment are computed once, not on every filter change
+            age_rul_data, weibull_rul_data, (pump_stats, failure_intervals), aligned_vibration = page.run_stage(
+                'compute', 'Sample calculations', lambda: sample_calculations(
+                    sample_operating_data, sample_vibration_data, sample_maintenance_data, sample_equipment_data),
+                params=('sample',))
+            dashboard({'Age': age_rul_data, 'Weibull': weibull_rul_data}, sample_operating_data, sample_vibration_data,
+                      pump_stats, failure_intervals, aligned_vibration, data_key='sample')
 
-            # Generate visuals based on filtered sample data
-            col1, col2 = st.columns([1, 1])
-
-            with col1:
-                if 'Date' in sample_operating_data.columns:
-                    st.subheader('Average MTBF Over Time')
-                    if 'PumpID' in filtered_mtbf_data.columns:
-                        filtered_operating_data = sample_operating_data[sample_operating_data['PumpID'].isin(filtered_mtbf_data['PumpID'])]
-                    avg_operating_data = filtered_operating_data.groupby('Date')['Operating Hours'].mean().reset_index()
-                    fig = px.line(avg_operating_data, x='Date', y='Operating Hours')
-                    fig.update_layout(title='', xaxis_title='Date', yaxis_title='Operating Hours')
-                    st.plotly_chart(fig)
-
-            with col2:
-                if 'Date' in sample_vibration_data.columns:
-                    st.subheader('Average Vibration Levels Over Time')
-                    if 'PumpID' in filtered_mtbf_data.columns:
-                        filtered_vibration_data = sample_vibration_data[sample_vibration_data['PumpID'].isin(filtered_mtbf_data['PumpID'])]
-                    avg_vibration_data = filtered_vibration_data.groupby('Date')['Vibration Level (mm/s)'].mean().reset_index()
-                    fig = px.line(avg_vibration_data, x='Date', y='Vibration Level (mm/s)')
-                    fig.update_layout(title='', xaxis_title='Date', yaxis_title='Vibration Level (mm/s)')
-                    st.plotly_chart(fig)
-
-            col3, col4 = st.columns([1, 1])
-
-            with col3:
-                st.subheader('Estimated RUL (%)')
-                average_rul = filtered_mtbf_data['RUL (%)'].mean()
-                fig = go.Figure(go.Indicator(
-                    mode="gauge+number",
-                    value=average_rul,
-                    title={'text': "Average RUL (%)"}, 
-                    gauge={'axis': {'range': [0, 100]},
-                           'bar': {'color': "darkblue"},
-                           'steps': [
-                               {'range': [0, 50], 'color': "lightgray"},
-                               {'range': [50, 100], 'color': "gray"}]},
-                    number={'suffix': '%', 'valueformat': '.2f'}))
-                fig.update_layout(width=350, height=350)
-                st.plotly_chart(fig)
-
-            with col4:
-                st.subheader('Estimated RUL Details')
-                st.dataframe(filtered_mtbf_data.drop(columns=['Operating Hours', 'Number of Failures', 'MTBF (Hours)']))
-
-            st.markdown(f"""<h4>Want to try with custom data</h4>
-              [({download_link}) to download excel templates with sample data. You may add/modify data into each of the excel template, save and upload to view the visuals per the uploaded custom data]""", unsafe_allow_html=True) 
+            st.markdown("<h4>Want to try with custom data</h4>", unsafe_allow_html=True)
+            st.download_button("Download Excel templates", data=download_sample_data, file_name="sample_data.zip",
+                               mime="application/zip", on_click="ignore")
+            st.caption("Download the excel templates with sample data. You may add/modify data into each of the excel template, save and upload to view the visuals per the uploaded custom data")
 
     #if st.button('Show Visuals'):
         #st.session_state.show_visuals = True
-        #st.session_state.upload_mode = False  # Ensure upload mode is off initially
+        #st.session_state.pump_upload_mode = False  # Ensure upload mode is off initially
 
     # Enter Upload Mode button (only show if Show Visuals button was clicked)
     if st.session_state.show_visuals:
         if st.button('Upload custom data files'):
-            st.session_state.upload_mode = True
+            st.session_state.pump_upload_mode = True
             st.session_state.show_visuals = False
             st.rerun()    # Turn off show visuals after entering upload mode
     
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        stage_breakdown = page.metrics.finish()
+
+    with st.sidebar.expander("Performance of this rerun"):
+        st.dataframe(stage_breakdown, hide_index=True)
\ No newline at end of file
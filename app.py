@@ -0,0 +1,13 @@
+import streamlit as st
+
+# One Streamlit server for every calculator: `streamlit run app.py`.
+# A page script (and with it pandas, plotly and the core modules it imports) only runs on its first visit;
+# after that the modules stay imported and the process-wide parse, figure and job caches are shared by all pages.
+CALCULATORS = [
+    # (script, title, icon, url path)
+    ('OEECalculator/oee.py', 'OEE Calculator', '🔢', 'oee'),
+    ('PumpMaintenanceCalculator/pump.py', 'Pump Maintenance', '🛠️', 'pump'),
+]
+
+st.navigation([st.Page(script, title=title, icon=icon, url_path=url_path)
+               for script, title, icon, url_path in CALCULATORS]).run()
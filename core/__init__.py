@@ -0,0 +1 @@
+# Shared building blocks used by the calculator apps; only core.ui, the widgets both pages show, imports Streamlit
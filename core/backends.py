@@ -0,0 +1,283 @@
+"""Optional DuckDB / Polars execution of the heavy parts of the calculators.
+
+calculate_oee runs its join and metric arithmetic, and calculate_mtbf its
+per-pump aggregations, on a multi-threaded engine instead of pandas. The
+results are shaped to exactly what the pandas code returns (row order, columns,
+dtypes, NaN handling). Select the engine with CALC_BACKEND=pandas|duckdb|polars,
+or pass backend= to the calculators. The engines are optional dependencies
+(pip install duckdb / pip install polars).
+
+    python -m core.bench --sizes 1e5 --verify   # check every engine against pandas
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+BACKENDS = ['pandas', 'duckdb', 'polars']
+DEFAULT_BACKEND = os.environ.get('CALC_BACKEND', 'pandas')
+
+OEE_KEYS = ['Date', 'EquipmentId']
+# Mirrors the arithmetic in core.oee.calculate_oee, operand by operand, so every intermediate has
+# the dtype NumPy would give it; python -m core.bench --verify catches any drift between the two
+OEE_FORMULAS = [
+    ('Availability', ('/', ('-', 'ProductionHrs', 'DownTimeHrs'), 'ProductionHrs')),
+    ('Performance', ('/', ('*', 'ProducedGoods', 'IdealCycle'), ('*', ('-', 'ProductionHrs', 'DownTimeHrs'), 60))),
+    ('Quality', ('/', ('-', 'ProducedGoods', 'DefectGoods'), 'ProducedGoods')),
+    ('OEE', ('*', ('*', ('*', 'Availability', 'Performance'), 'Quality'), 100)),
+]
+SQL_TYPES = {
+    'int8': 'TINYINT', 'int16': 'SMALLINT', 'int32': 'INTEGER', 'int64': 'BIGINT',
+    'uint8': 'UTINYINT', 'uint16': 'USMALLINT', 'uint32': 'UINTEGER', 'uint64': 'UBIGINT',
+    'float32': 'FLOAT', 'float64': 'DOUBLE', 'bool': 'BOOLEAN',
+}
+
+
+def resolve_backend(backend=None):
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of: {', '.join(BACKENDS)}")
+    return backend
+
+
+def _import(backend):
+    try:
+        if backend == 'duckdb':
+            import duckdb
+            return duckdb
+        import polars
+        return polars
+    except ImportError:
+        raise ImportError(f'The {backend} backend needs the {backend} package (pip install {backend})') from None
+
+
+def _plain(values):
+    # Engines see the values behind a categorical, not its codes, so keys from two frames compare
+    # like they do in pandas even when their categories differ
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if values.isna().any() and categories.dtype.kind in 'iub':
+            return values.astype(np.float64)
+        return values.astype(categories.dtype)
+    return values
+
+
+def _key_kind(values):
+    # Kind of a key column as the engines see it (after _plain); 'O' is an object column of Python values
+    return 'str' if isinstance(values.dtype, pd.StringDtype) else values.dtype.kind
+
+
+def _engine_frame(frame, columns):
+    plain = pd.DataFrame({name: _plain(frame[name]) for name in columns})
+    plain['_row'] = np.arange(len(frame), dtype=np.int64)
+    return plain
+
+
+def _result_dtype(op, left, right):
+    # NumPy 2 promotion; a python int scalar takes the dtype of the array it meets
+    if isinstance(left, int):
+        left = right
+    if isinstance(right, int):
+        right = left
+    dtype = np.result_type(left, right)
+    if op == '/' and dtype.kind in 'iub':
+        return np.dtype(np.float64)
+    return dtype
+
+
+def _typed(node, dtypes):
+    # Annotate the formula tree with the dtype of every node
+    if isinstance(node, int):
+        return node, node
+    if isinstance(node, str):
+        return node, dtypes[node]
+    op, left, right = node
+    left, right = _typed(left, dtypes), _typed(right, dtypes)
+    left_dtype = left[1] if not isinstance(left[0], int) else left[0]
+    right_dtype = right[1] if not isinstance(right[0], int) else right[0]
+    return (op, left, right), _result_dtype(op, left_dtype, right_dtype)
+
+
+def _sql(typed, cast_to):
+    # Like NumPy, both operands are cast to the node's result type before the operation
+    node, dtype = typed
+    if isinstance(node, int):
+        return f'CAST({node} AS {SQL_TYPES[cast_to.name]})'
+    if isinstance(node, str):
+        return f'CAST("{node}" AS {SQL_TYPES[cast_to.name]})'
+    op, left, right = node
+    return f'CAST(({_sql(left, dtype)} {op} {_sql(right, dtype)}) AS {SQL_TYPES[cast_to.name]})'
+
+
+def _polars_expr(pl, typed, cast_to):
+    node, dtype = typed
+    target = getattr(pl, {'i': 'Int', 'u': 'UInt', 'f': 'Float'}[cast_to.kind] + str(cast_to.itemsize * 8))
+    if isinstance(node, int):
+        return pl.lit(node).cast(target)
+    if isinstance(node, str):
+        return pl.col(node).cast(target)
+    op, left, right = node
+    left, right = _polars_expr(pl, left, dtype), _polars_expr(pl, right, dtype)
+    return {'-': left - right, '*': left * right, '/': left / right}[op].cast(target)
+
+
+def _leaves(node):
+    if isinstance(node, str):
+        return {node}
+    if isinstance(node, tuple):
+        return _leaves(node[1]) | _leaves(node[2])
+    return set()
+
+
+def _oee_plan(production_data, downtime_data):
+    dtypes = {name: production_data[name].dtype for name in production_data.columns if name not in OEE_KEYS}
+    dtypes.update({name: downtime_data[name].dtype for name in downtime_data.columns if name not in OEE_KEYS})
+    plan = []
+    for name, formula in OEE_FORMULAS:
+        typed = _typed(formula, dtypes)
+        plan.append((name, typed, typed[1]))
+        dtypes[name] = typed[1]
+    return plan
+
+
+def _merge_order(left_rows, right_rows, left, right, on):
+    # Engines emit join matches in any order. With at most one match per left row (unique downtime keys,
+    # the usual case) pandas' inner merge lists them by left row: a scatter, no sort. Once any left row has
+    # several matches, pandas' join path can reorder the whole result, not just those rows (e.g. unique
+    # left keys [1, 2, 3] against right keys [2, 1, 1] give the pairs (0, 1), (1, 0), (0, 2)), so the order
+    # cannot be pieced together from the duplicated key groups alone. It is taken from pandas' own merge
+    # of the keys and row numbers over every row: a key-only merge, but as costly as pandas' join
+    counts = np.bincount(left_rows, minlength=len(left))
+    if len(counts) == 0 or counts.max() <= 1:
+        slots = np.full(len(left), -1, dtype=np.int64)
+        slots[left_rows] = np.arange(len(left_rows))
+        return slots[slots >= 0]
+    expected = pd.merge(left[on].assign(_left=np.arange(len(left))), right[on].assign(_right=np.arange(len(right))),
+                        on=on)
+    pairs = left_rows.astype(np.int64) * len(right) + right_rows
+    sorter = np.argsort(pairs)
+    wanted = expected['_left'].to_numpy(dtype=np.int64) * len(right) + expected['_right'].to_numpy(dtype=np.int64)
+    return sorter[np.searchsorted(pairs, wanted, sorter=sorter)]
+
+
+def engine_oee(production_data, downtime_data, backend):
+    # Inner join on (Date, EquipmentId) in the engine, returning matched row numbers and the metrics;
+    # the merged frame is then assembled with take(), in pandas' left-then-right row order
+    overlap = (set(production_data.columns) & set(downtime_data.columns)) - set(OEE_KEYS)
+    if overlap:
+        # pandas would add _x/_y suffixes, leave that case to pandas
+        return None
+    # Only the keys and the measures the formulas read are handed to the engine
+    measures = set().union(*(_leaves(formula) for _, formula in OEE_FORMULAS))
+    if any(frame[name].dtype.kind not in 'iuf' for frame in (production_data, downtime_data)
+           for name in frame.columns if name in measures):
+        # e.g. object columns read back from SQLite, whose arithmetic only pandas reproduces
+        return None
+    plan = _oee_plan(production_data, downtime_data)
+    left = _engine_frame(production_data, OEE_KEYS + [c for c in production_data.columns if c in measures])
+    right = _engine_frame(downtime_data, OEE_KEYS + [c for c in downtime_data.columns if c in measures])
+    if any(_key_kind(left[key]) != _key_kind(right[key]) or _key_kind(left[key]) == 'O' for key in OEE_KEYS):
+        # Keys of different types (e.g. integer and float or string IDs) or object columns of mixed Python
+        # values: pandas' rules for comparing them are not the engines', leave the join to pandas
+        return None
+    metrics = [name for name, _, _ in plan]
+
+    if backend == 'duckdb':
+        duckdb = _import(backend)
+        con = duckdb.connect()
+        con.register('production', left.rename(columns={'_row': '_left'}))
+        con.register('downtime', right.rename(columns={'_row': '_right'}))
+        # NaN keys match each other in pandas, hence IS NOT DISTINCT FROM; later metrics refer to
+        # earlier ones, so each is added by its own projection
+        query = ('SELECT p.*, d.* EXCLUDE ("Date", "EquipmentId") FROM production p JOIN downtime d '
+                 'ON p."Date" IS NOT DISTINCT FROM d."Date" AND p."EquipmentId" IS NOT DISTINCT FROM d."EquipmentId"')
+        for name, typed, dtype in plan:
+            query = f'SELECT *, {_sql(typed, dtype)} AS "{name}" FROM ({query})'
+        selected = ', '.join(f'"{name}"' for name in ['_left', '_right'] + metrics)
+        fetched = con.execute(f'SELECT {selected} FROM ({query})').fetchnumpy()
+        con.close()
+        arrays = {name: np.ma.filled(values, np.nan) if name in metrics else np.asarray(values)
+                  for name, values in fetched.items()}
+    else:
+        pl = _import(backend)
+        joined = pl.from_pandas(left).lazy().rename({'_row': '_left'}).join(
+            pl.from_pandas(right).lazy().rename({'_row': '_right'}), on=OEE_KEYS, how='inner', nulls_equal=True)
+        for name, typed, dtype in plan:
+            joined = joined.with_columns(_polars_expr(pl, typed, dtype).alias(name))
+        collected = joined.select(['_left', '_right'] + metrics).collect()
+        arrays = {name: collected[name].to_numpy() for name in collected.columns}
+
+    order = _merge_order(arrays['_left'], arrays['_right'], production_data, downtime_data, OEE_KEYS)
+    arrays = {name: values[order] for name, values in arrays.items()}
+
+    merged_data = production_data.take(arrays['_left']).reset_index(drop=True)
+    right_rows = downtime_data.drop(columns=OEE_KEYS).take(arrays['_right']).reset_index(drop=True)
+    for name in right_rows.columns:
+        merged_data[name] = right_rows[name]
+    for name, _, dtype in plan:
+        merged_data[name] = arrays[name].astype(dtype, copy=False)
+
+    # Key columns get whatever dtype pandas' merge would give them (e.g. object for differing categories)
+    expected = pd.merge(production_data.head(0), downtime_data.head(0), on=OEE_KEYS).dtypes
+    for key in OEE_KEYS:
+        if merged_data[key].dtype != expected[key]:
+            merged_data[key] = merged_data[key].astype(expected[key])
+    return merged_data
+
+
+def _group_frame(source, values, key, value_column):
+    # Engine group results -> the frame pandas' groupby(key, observed=True)...reset_index() gives
+    if isinstance(source[key].dtype, pd.CategoricalDtype):
+        keys = pd.Categorical(values[key], dtype=source[key].dtype)
+    else:
+        keys = pd.array(values[key]).astype(source[key].dtype)
+    frame = pd.DataFrame({key: keys, value_column: values[value_column]})
+    return frame.sort_values(key, kind='stable').reset_index(drop=True)
+
+
+def engine_failure_totals(operating_data, maintenance_data, backend):
+    # The two per-pump aggregations of calculate_mtbf; the outer merge of their (one row per pump)
+    # results stays in pandas. None when the hours are not numeric, pandas then does the work.
+    if operating_data['Operating Hours'].dtype.kind not in 'iuf':
+        return None
+    left = pd.DataFrame({'PumpID': _plain(operating_data['PumpID']), 'Hours': operating_data['Operating Hours']})
+    right = pd.DataFrame({'PumpID': _plain(maintenance_data['PumpID'])})
+    if _key_kind(left['PumpID']) == 'O' or _key_kind(right['PumpID']) == 'O':
+        # Object IDs of mixed Python values group by pandas' rules only
+        return None
+    hours_dtype = operating_data[['PumpID', 'Operating Hours']].head(0).groupby(
+        'PumpID', observed=True)['Operating Hours'].sum().dtype
+
+    if backend == 'duckdb':
+        duckdb = _import(backend)
+        con = duckdb.connect()
+        con.register('operating', left)
+        con.register('maintenance', right)
+        # pandas skips NaN and sums an all-NaN group to 0, and drops NaN keys
+        total = 'CAST(SUM(Hours) AS BIGINT)' if left['Hours'].dtype.kind in 'iub' else 'SUM(Hours)'
+        hours = con.execute(f'SELECT PumpID, COALESCE({total}, 0) AS Hours FROM operating '
+                            'WHERE PumpID IS NOT NULL GROUP BY PumpID').fetchnumpy()
+        failures = con.execute('SELECT PumpID, COUNT(*) AS Failures FROM maintenance '
+                               'WHERE PumpID IS NOT NULL GROUP BY PumpID').fetchnumpy()
+        con.close()
+        hours = {name: np.ma.filled(values, np.nan) if values.dtype.kind == 'f' else np.asarray(values)
+                 for name, values in hours.items()}
+        failures = {name: np.asarray(values) for name, values in failures.items()}
+    else:
+        pl = _import(backend)
+        # float32 is summed in float64 like pandas and DuckDB do, not in float32
+        total = pl.col('Hours').cast(pl.Float64) if left['Hours'].dtype.kind == 'f' else pl.col('Hours')
+        hours = (pl.from_pandas(left).lazy().drop_nulls('PumpID').group_by('PumpID')
+                 .agg(total.sum()).collect())
+        failures = (pl.from_pandas(right).lazy().drop_nulls('PumpID').group_by('PumpID')
+                    .agg(pl.len().alias('Failures')).collect())
+        hours = {name: hours[name].to_numpy() for name in hours.columns}
+        failures = {name: failures[name].to_numpy() for name in failures.columns}
+
+    hours['Hours'] = hours['Hours'].astype(hours_dtype)
+    failures['Failures'] = failures['Failures'].astype(np.int64)
+    total_operating_time = _group_frame(operating_data, hours, 'PumpID', 'Hours').rename(
+        columns={'Hours': 'Operating Hours'})
+    num_failures = _group_frame(maintenance_data, failures, 'PumpID', 'Failures').rename(
+        columns={'Failures': 'Number of Failures'})
+    return total_operating_time, num_failures
@@ -0,0 +1,247 @@
+"""Headless batch runner for the OEE and pump calculators.
+
+Runs one worker process per plant and never imports Streamlit or Plotly.
+
+    python -m core.batch oee  --input-dir plants/ --output-dir out/
+    python -m core.batch pump --manifest plants.csv --output-dir out/ --workers 8
+
+With --input-dir every sub-directory is a plant and its files are matched by
+name prefix (production*/downtime* for OEE, operating*/maintenance*/equipment*
+for pumps). A manifest is a CSV with a 'plant' column plus one column per
+input holding the file path, relative paths resolve against the manifest.
+Inputs may be CSV, XLSX, Parquet (a file or a hive-partitioned directory) or
+Arrow IPC/Feather. Only the columns the calculation uses are read, and --ids,
+--start and --end are pushed into Parquet/Arrow scans so partitions and row
+groups outside the selection are never loaded. --backend duckdb|polars runs the
+OEE join and the MTBF aggregations on that engine (see core.backends).
+For OEE, --stream reads CSV inputs in chunks and writes per (EquipmentId, Date)
+means instead of one row per record, for logs that do not fit in memory.
+The OEE summary has P10/P50/P90 OEE from quantile sketches (core.sketch).
+--states also writes each plant's mergeable per (EquipmentId, Date) sums,
+counts and sketch buckets and merges them into fleet_oee.csv, so a fleet
+roll-up never needs the plants' rows in one place.
+For pumps, --rul weibull replaces the age-based RUL with censored Weibull fits
+(per PumpClass when the equipment file has one) and writes the fitted
+parameters to <plant>_weibull.csv; --warm-start <previous output dir> starts
+the fits from the parameters of that run.
+"""
+import argparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from core.backends import BACKENDS
+from core.oee import (DOWNTIME_COLUMNS, PARTIAL_KEYS, PRODUCTION_COLUMNS, calculate_oee, merge_states,
+                      oee_quantiles, partials_to_means, stream_oee, summarize_oee, summarize_partials)
+from core.pump import (EQUIPMENT_COLUMNS, MAINTENANCE_COLUMNS, OPERATING_COLUMNS, TBF_QUANTILES, VIBRATION_COLUMNS,
+                       calculate_mtbf, calculate_rul, fleet_reliability, reliability, summarize_pumps, weibull_rul)
+from core.readers import TABLE_EXTENSIONS, load_filters, parse_ids, read_table
+
+INPUTS = {
+    'oee': ['production', 'downtime'],
+    'pump': ['operating', 'maintenance', 'equipment'],
+}
+# Per input: columns to read, ID column and date column the row filters apply to, all date columns
+INPUT_COLUMNS = {
+    'production': (PRODUCTION_COLUMNS, 'EquipmentId', 'Date', ['Date']),
+    'downtime': (DOWNTIME_COLUMNS, 'EquipmentId', 'Date', ['Date']),
+    'operating': (OPERATING_COLUMNS, 'PumpID', 'Date', ['Date']),
+    'vibration': (VIBRATION_COLUMNS, 'PumpID', 'Date', ['Date']),
+    'maintenance': (MAINTENANCE_COLUMNS, 'PumpID', 'Failure Date', ['Failure Date']),
+    'equipment': (EQUIPMENT_COLUMNS, 'PumpID', None, ['ManufactureDate', 'ExpireDate']),
+}
+
+
+def input_options(role, ids=None, start=None, end=None):
+    # read_table/read_upload keyword arguments for one input: pruned columns, row filters, normalization
+    columns, id_column, date_column, date_columns = INPUT_COLUMNS[role]
+    return {
+        'columns': columns,
+        'filters': load_filters(id_column, ids, date_column, start, end),
+        'normalize': {'id_columns': [id_column], 'date_columns': date_columns},
+    }
+
+
+def read_input(role, path, ids=None, start=None, end=None):
+    return read_table(path, **input_options(role, ids, start, end))
+
+
+def discover_plants(input_dir, calculator):
+    plants = {}
+    for plant in sorted(os.listdir(input_dir)):
+        plant_dir = os.path.join(input_dir, plant)
+        if not os.path.isdir(plant_dir):
+            continue
+        # Sub-directories are partitioned Parquet exports
+        files = sorted(name for name in os.listdir(plant_dir)
+                       if name.lower().endswith(TABLE_EXTENSIONS) or os.path.isdir(os.path.join(plant_dir, name)))
+        paths = {}
+        for role in INPUTS[calculator]:
+            matches = [name for name in files if name.lower().startswith(role)]
+            if matches:
+                paths[role] = os.path.join(plant_dir, matches[0])
+        plants[plant] = paths
+    return plants
+
+
+def read_manifest(manifest_path, calculator):
+    manifest = pd.read_csv(manifest_path, dtype=str)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    plants = {}
+    for row in manifest.to_dict('records'):
+        paths = {}
+        for role in INPUTS[calculator]:
+            if isinstance(row.get(role), str) and row[role]:
+                paths[role] = os.path.join(base_dir, row[role])
+        plants[row['plant']] = paths
+    return plants
+
+
+def write_states(output_dir, plant, partials, sketch):
+    # One plant's OEE states with a leading Plant column, read back by fleet_states
+    for name, frame in (('partials', partials), ('sketch', sketch)):
+        frame = pd.concat({plant: frame}, names=['Plant']).reset_index()
+        frame.to_csv(os.path.join(output_dir, f'{plant}_oee_{name}.csv'), index=False)
+
+
+def fleet_states(summary, output_dir):
+    # Merges the states of every plant that finished: fleet averages are exact, percentiles within the
+    # sketch accuracy
+    merged = None
+    for plant in summary.loc[summary['status'] == 'ok', 'plant']:
+        paths = [os.path.join(output_dir, f'{plant}_oee_{name}.csv') for name in ('partials', 'sketch')]
+        keys = ['Plant'] + PARTIAL_KEYS
+        merged = merge_states(merged, (pd.read_csv(paths[0]).set_index(keys),
+                                       pd.read_csv(paths[1]).set_index(keys + ['Bucket'])))
+    if merged is None:
+        return None
+    partials, sketch = merged
+    fleet = dict(summarize_partials(partials), **oee_quantiles(sketch))
+    fleet.update({'Plants': partials.index.get_level_values('Plant').nunique(),
+                  'Equipment': partials.index.droplevel('Date').nunique()})
+    fleet = pd.DataFrame([fleet])
+    fleet.to_csv(os.path.join(output_dir, 'fleet_oee.csv'), index=False)
+    return fleet
+
+
+def run_plant(calculator, plant, paths, output_dir, as_of=None, stream=False, ids=None, start=None, end=None,
+              backend=None, rul='age', warm_start=None, states=False):
+    # Executed inside a worker process, returns one summary row for the plant
+    started = time.perf_counter()
+    row = {'plant': plant}
+    try:
+        missing = [role for role in INPUTS[calculator] if role not in paths]
+        if missing:
+            raise FileNotFoundError(f"missing input(s): {', '.join(missing)}")
+
+        if calculator == 'oee' and stream:
+            partials, sketch = stream_oee(paths['production'], paths['downtime'],
+                                          filters=load_filters('EquipmentId', ids, 'Date', start, end), states=True)
+            result = partials_to_means(partials).reset_index()
+            row.update(summarize_partials(partials))
+        elif calculator == 'oee':
+            result, partials, sketch = calculate_oee(read_input('production', paths['production'], ids, start, end),
+                                                     read_input('downtime', paths['downtime'], ids, start, end),
+                                                     backend, states=True)
+            row.update(summarize_oee(result))
+        if calculator == 'oee':
+            row.update(oee_quantiles(sketch))
+            if states:
+                write_states(output_dir, plant, partials, sketch)
+        else:
+            operating_data = read_input('operating', paths['operating'], ids, start, end)
+            maintenance_data = read_input('maintenance', paths['maintenance'], ids, start, end)
+            equipment_data = read_input('equipment', paths['equipment'], ids)
+            result = calculate_mtbf(operating_data, maintenance_data, backend)
+            result = calculate_rul(result, equipment_data, current_date=as_of)
+            pump_stats, intervals = reliability(operating_data, maintenance_data)
+            if rul == 'weibull':
+                previous_path = warm_start and os.path.join(warm_start, f'{plant}_weibull.csv')
+                previous = pd.read_csv(previous_path) if previous_path and os.path.exists(previous_path) else None
+                result, fits = weibull_rul(result, equipment_data, pump_stats, intervals, previous=previous)
+                fits.to_csv(os.path.join(output_dir, f'{plant}_weibull.csv'), index=False)
+                row['Weibull Fits'] = int(fits['Converged'].sum())
+            row.update(summarize_pumps(result))
+            # Interval-based numbers next to the hours/failures ratio above
+            fleet = fleet_reliability(pump_stats, intervals)
+            row.update({'Fleet MTBF (Hours)': fleet['MTBF (Hours)'],
+                        **{name: fleet[name] for name in ['Failures per 1000 Hours', *TBF_QUANTILES]}})
+
+        result_path = os.path.join(output_dir, f'{plant}_{calculator}.csv')
+        result.to_csv(result_path, index=False)
+        row['status'] = 'ok'
+        row['output'] = result_path
+    except Exception as exc:
+        row['status'] = 'error'
+        row['error'] = f'{type(exc).__name__}: {exc}'
+        traceback.print_exc(file=sys.stderr)
+    row['seconds'] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def run_batch(calculator, plants, output_dir, workers=None, as_of=None, stream=False, ids=None, start=None,
+              end=None, backend=None, rul='age', warm_start=None, states=False):
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_plant, calculator, plant, paths, output_dir, as_of, stream, ids, start, end,
+                               backend, rul, warm_start, states)
+                   for plant, paths in plants.items()]
+        for future in as_completed(futures):
+            row = future.result()
+            print(f"{row['plant']}: {row['status']} ({row['seconds']}s)", file=sys.stderr)
+            rows.append(row)
+
+    summary = pd.DataFrame(rows).sort_values('plant').reset_index(drop=True)
+    summary.to_csv(os.path.join(output_dir, f'summary_{calculator}.csv'), index=False)
+    if calculator == 'oee' and states:
+        fleet_states(summary, output_dir)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.batch', description='Batch OEE / pump MTBF+RUL runner')
+    parser.add_argument('calculator', choices=sorted(INPUTS))
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input-dir', help='directory with one sub-directory of input files per plant')
+    source.add_argument('--manifest', help="CSV with a 'plant' column and one path column per input")
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--as-of', default=None, help='reference date for pump age / RUL (default: now)')
+    parser.add_argument('--stream', action='store_true', help='OEE only: chunked out-of-core computation over CSV inputs')
+    parser.add_argument('--ids', type=parse_ids, default=None, help='only these Equipment IDs / PumpIDs, e.g. 11,12')
+    parser.add_argument('--start', default=None, help='first date to read (inclusive)')
+    parser.add_argument('--end', default=None, help='last date to read (inclusive)')
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help='engine for the join/aggregations: pandas, duckdb or polars (default: CALC_BACKEND or pandas)')
+    parser.add_argument('--rul', choices=['age', 'weibull'], default='age',
+                        help='pumps only: RUL from calendar age or from censored Weibull fits of the failure intervals')
+    parser.add_argument('--warm-start', default=None,
+                        help="pumps only: output directory of an earlier --rul weibull run whose fits start the new ones")
+    parser.add_argument('--states', action='store_true',
+                        help='OEE only: write mergeable per-plant states and their fleet roll-up (fleet_oee.csv)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.input_dir:
+        plants = discover_plants(args.input_dir, args.calculator)
+    else:
+        plants = read_manifest(args.manifest, args.calculator)
+    if not plants:
+        print('No plants found.', file=sys.stderr)
+        return 1
+
+    summary = run_batch(args.calculator, plants, args.output_dir, workers=args.workers, as_of=args.as_of,
+                        stream=args.stream, ids=args.ids, start=args.start, end=args.end, backend=args.backend,
+                        rul=args.rul, warm_start=args.warm_start, states=args.states)
+    return 0 if (summary['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
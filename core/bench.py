@@ -0,0 +1,226 @@
+"""Scaling benchmarks for the OEE and pump calculators on seeded synthetic data.
+
+    python -m core.bench --sizes 1e3 1e4 1e5 1e6 --output bench.json
+    python -m core.bench --sizes 1e5 --baseline bench.json --tolerance 0.25
+
+Every stage records wall time, peak resident memory while it ran (sampled from
+/proc on Linux, the process high-water mark elsewhere) and rows/second. With --baseline, stages slower than baseline * (1 + tolerance)
+are reported as regressions and the exit status is 1.
+
+--backend runs calculate_oee/calculate_mtbf on DuckDB or Polars (core.backends).
+--verify instead checks every installed engine against pandas, on the generated
+tables and on their normalized form, and exits 1 on any difference.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import pandas as pd
+
+from core.backends import BACKENDS, resolve_backend
+from core.batch import input_options
+from core.downsample import WEBGL_THRESHOLD, downsample_trend
+from core.instrument import RssSampler
+from core.normalize import normalize_frame
+from core.oee import OEECube, TimePyramid, calculate_oee, partials_to_means, summarize_partials
+from core.pump import (align_vibration, calculate_mtbf, calculate_rul, pre_failure_profile, pre_failure_windows,
+                       reliability, vibration_features, weibull_rul)
+from core.synthetic import oee_tables, pump_tables
+
+
+def run_stage(results, calculator, stage, rows, func):
+    with RssSampler() as sampler:
+        started = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - started
+    results.append({
+        'calculator': calculator,
+        'stage': stage,
+        'rows': rows,
+        'seconds': seconds,
+        'peak_rss_bytes': sampler.peak,
+        'rows_per_second': rows / seconds if seconds > 0 else None,
+    })
+    return value
+
+
+def bench_oee(results, rows, equipment, seed, backend=None):
+    from core.figures import average_metrics_bar, gauge, oee_over_time
+
+    production_data, downtime_data = run_stage(results, 'oee', 'generate', rows,
+                                               lambda: oee_tables(rows, equipment, seed))
+    merged_data = run_stage(results, 'oee', 'calculate_oee', rows,
+                            lambda: calculate_oee(production_data, downtime_data, backend))
+    cube = run_stage(results, 'oee', 'cube', rows, lambda: OEECube(merged_data))
+
+    def aggregate():
+        # The dashboard's queries for 'All' plus a handful of single-equipment selections
+        out = []
+        for equipment_id in [None] + cube.equipment_ids()[:10]:
+            equipment_partials = cube.by_equipment(equipment_id)
+            out.append((summarize_partials(equipment_partials), partials_to_means(cube.by_date(equipment_id)),
+                        partials_to_means(equipment_partials)))
+        return out
+    summary, _, equipment_means = run_stage(results, 'oee', 'aggregate', rows, aggregate)[0]
+    pyramid = run_stage(results, 'oee', 'time_rollup', rows, lambda: TimePyramid(cube.by_date(), cube.sketch_by_date()))
+
+    def trend_zoom():
+        # A pan across the history with a 90-day window, each answered from one pyramid level
+        start, end = pyramid.span()
+        return [pyramid.query(day, day + pd.Timedelta(days=90)) for day in pd.date_range(start, end, periods=100)]
+    run_stage(results, 'oee', 'trend_zoom', rows, trend_zoom)
+
+    def figures():
+        # The page's builders, uncached, serialized as st.plotly_chart sends them
+        grain, trend, _ = pyramid.query()
+        figs = [gauge(summary[f'Average {name}'] * 100, f'Average {name}', '#2779B7')
+                for name in ('Availability', 'Performance', 'Quality')]
+        figs += [gauge(summary['Average OEE'], 'Average OEE', '#FFABAB'),
+                 average_metrics_bar(equipment_means.reset_index()), oee_over_time(trend, grain)]
+        return [fig.to_json() for fig in figs]
+    run_stage(results, 'oee', 'figures', rows, figures)
+
+
+def bench_pump(results, rows, pumps, seed, backend=None):
+    from core.figures import gauge, pre_failure_line, trend_line
+
+    operating_data, vibration_data, maintenance_data, equipment_data = run_stage(
+        results, 'pump', 'generate', rows, lambda: pump_tables(rows, pumps, seed))
+    mtbf_data = run_stage(results, 'pump', 'calculate_mtbf', rows,
+                          lambda: calculate_mtbf(operating_data, maintenance_data, backend))
+    mtbf_data = run_stage(results, 'pump', 'calculate_rul', rows,
+                          lambda: calculate_rul(mtbf_data, equipment_data, current_date='2025-01-01'))
+    pump_stats, intervals = run_stage(results, 'pump', 'reliability', rows,
+                                      lambda: reliability(operating_data, maintenance_data))
+    run_stage(results, 'pump', 'weibull_rul', rows,
+              lambda: weibull_rul(mtbf_data, equipment_data, pump_stats, intervals))
+    run_stage(results, 'pump', 'vibration_features', rows, lambda: vibration_features(vibration_data, step='1D'))
+    aligned = run_stage(results, 'pump', 'align_vibration', rows,
+                        lambda: align_vibration(vibration_data, operating_data, maintenance_data))
+    run_stage(results, 'pump', 'pre_failure_windows', rows, lambda: pre_failure_windows(aligned))
+
+    def aggregate():
+        pump_ids = mtbf_data.loc[mtbf_data['RUL (%)'] >= 0, 'PumpID']
+        operating = operating_data[operating_data['PumpID'].isin(pump_ids)].groupby('Date')['Operating Hours'].mean()
+        vibration = vibration_data[vibration_data['PumpID'].isin(pump_ids)].groupby('Date')['Vibration Level (mm/s)'].mean()
+        return operating.reset_index(), vibration.reset_index()
+    operating_trend, vibration_trend = run_stage(results, 'pump', 'aggregate', rows, aggregate)
+
+    def figures():
+        figs = [gauge(mtbf_data['RUL (%)'].mean(), 'Average RUL (%)', 'darkblue', step_colors=('lightgray', 'gray'),
+                      width=350, height=350),
+                pre_failure_line(pre_failure_profile(aligned))]
+        for trend, y in ((operating_trend, 'Operating Hours'), (vibration_trend, 'Vibration Level (mm/s)')):
+            reduced, envelope, _ = downsample_trend(trend, 'Date', y)
+            figs.append(trend_line(reduced, envelope, 'Date', y, webgl=len(reduced) > WEBGL_THRESHOLD))
+        return [fig.to_json() for fig in figs]
+    run_stage(results, 'pump', 'figures', rows, figures)
+
+
+def _normalized(frame, role):
+    return normalize_frame(frame, **input_options(role)['normalize'])
+
+
+def verify(rows, equipment, seed):
+    # Engine results must equal pandas exactly; the one allowance is MTBF over float64 hours, where a
+    # different summation order moves the last bits
+    production_data, downtime_data = oee_tables(rows, equipment, seed)
+    operating_data, _, maintenance_data, _ = pump_tables(rows, equipment, seed)
+    inputs = {
+        'raw': (production_data, downtime_data, operating_data, maintenance_data),
+        'normalized': (_normalized(production_data, 'production'), _normalized(downtime_data, 'downtime'),
+                       _normalized(operating_data, 'operating'), _normalized(maintenance_data, 'maintenance')),
+    }
+    failures = []
+    for label, (production, downtime, operating, maintenance) in inputs.items():
+        expected_oee = calculate_oee(production, downtime, backend='pandas')
+        expected_mtbf = calculate_mtbf(operating, maintenance, backend='pandas')
+        exact_mtbf = operating['Operating Hours'].dtype != 'float64'
+        for backend in BACKENDS[1:]:
+            try:
+                pd.testing.assert_frame_equal(calculate_oee(production, downtime, backend=backend), expected_oee,
+                                              check_exact=True)
+                pd.testing.assert_frame_equal(calculate_mtbf(operating, maintenance, backend=backend), expected_mtbf,
+                                              check_exact=exact_mtbf, rtol=1e-12, atol=0)
+            except ImportError as exc:
+                print(f'verify {backend}: skipped, {exc}', file=sys.stderr)
+                continue
+            except AssertionError as exc:
+                failures.append(f'{backend}/{label} @ {rows:,} rows: {exc}')
+                continue
+            print(f'verify {backend}/{label} @ {rows:,} rows: ok', file=sys.stderr)
+    return failures
+
+
+def compare(results, baseline, tolerance):
+    reference = {(r['calculator'], r['stage'], r['rows']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for row in results:
+        previous = reference.get((row['calculator'], row['stage'], row['rows']))
+        if previous and row['seconds'] > previous * (1 + tolerance):
+            regressions.append(dict(row, baseline_seconds=previous, ratio=row['seconds'] / previous))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.bench', description='Calculator scaling benchmarks')
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e3, 1e4, 1e5, 1e6],
+                        help='row counts to run (1e3 .. 1e8)')
+    parser.add_argument('--calculators', nargs='+', choices=['oee', 'pump'], default=['oee', 'pump'])
+    parser.add_argument('--equipment', type=int, default=100, help='distinct EquipmentId / PumpID values')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before flagging, 0.2 = 20%%')
+    parser.add_argument('--backend', choices=BACKENDS, default=None, help='engine for calculate_oee/calculate_mtbf '
+                        '(default: CALC_BACKEND or pandas)')
+    parser.add_argument('--verify', action='store_true', help='compare every engine against pandas instead of timing')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.verify:
+        failures = [failure for size in args.sizes for failure in verify(int(size), args.equipment, args.seed)]
+        for failure in failures:
+            print(f'MISMATCH {failure}', file=sys.stderr)
+        return 1 if failures else 0
+
+    backend = resolve_backend(args.backend)
+    results = []
+    for size in args.sizes:
+        rows = int(size)
+        if 'oee' in args.calculators:
+            bench_oee(results, rows, args.equipment, args.seed, backend)
+        if 'pump' in args.calculators:
+            bench_pump(results, rows, args.equipment, args.seed, backend)
+        print(f'{rows:,} rows done', file=sys.stderr)
+
+    report = {
+        'created': pd.Timestamp.now().isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'backend': backend,
+        'seed': args.seed,
+        'equipment': args.equipment,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(pd.DataFrame(results)[['calculator', 'stage', 'rows', 'seconds', 'peak_rss_bytes', 'rows_per_second']].to_string(index=False))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for row in regressions:
+            print(f"REGRESSION {row['calculator']}/{row['stage']} @ {row['rows']:,} rows: "
+                  f"{row['seconds']:.3f}s vs {row['baseline_seconds']:.3f}s ({row['ratio']:.2f}x)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Points sent to the browser per trend line, and the size above which charts switch to WebGL traces
+POINT_BUDGET = int(os.environ.get('CALC_CHART_POINT_BUDGET', 2000))
+WEBGL_THRESHOLD = int(os.environ.get('CALC_CHART_WEBGL_THRESHOLD', 1000))
+
+
+def _bucket_edges(n, n_buckets):
+    # Equal-count buckets over positions 0..n-1, returned as start offsets
+    return np.unique(np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1])
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point, then per bucket the point
+    # forming the largest triangle with the previous pick and the mean of the next bucket
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    starts = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    ends = np.append(starts[1:], n)
+    ends[-1] = n - 1
+    counts = ends - starts
+    # Mean of every bucket in one pass, the "next bucket" of the last bucket is the final point
+    next_x = np.append((np.add.reduceat(x[:-1], starts[:-1]) / counts[:-1])[1:], x[-1])
+    next_y = np.append((np.add.reduceat(y[:-1], starts[:-1]) / counts[:-1])[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = starts[i], ends[i]
+        area = np.abs((x[a] - next_x[i]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_envelope(y, n_buckets):
+    # Per-bucket min/max, returned with the position of each bucket's first point
+    y = np.asarray(y, dtype=np.float64)
+    starts = _bucket_edges(len(y), n_buckets)
+    return starts, np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+
+def downsample_trend(data, x, y, budget=POINT_BUDGET, x_range=None):
+    # Sort a trend frame by time, cut it to x_range and reduce it to at most `budget` points.
+    # Returns the reduced frame, a min/max envelope frame (None when nothing was dropped) and
+    # the number of points in the window before reduction. Small frames pass through untouched.
+    data = data.dropna(subset=[y])
+    if x_range is None and len(data) <= budget:
+        return data, None, len(data)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        times = pd.to_datetime(data[x], errors='coerce')
+    if times.notna().all():
+        data = data.assign(**{x: times})
+    data = data.sort_values(x, kind='stable').reset_index(drop=True)
+
+    if x_range is not None:
+        lo = np.searchsorted(data[x].to_numpy(), np.asarray(x_range[0], dtype=data[x].dtype), side='left')
+        hi = np.searchsorted(data[x].to_numpy(), np.asarray(x_range[1], dtype=data[x].dtype), side='right')
+        data = data.iloc[lo:hi].reset_index(drop=True)
+
+    n = len(data)
+    if n <= budget:
+        return data, None, n
+
+    x_values = data[x].to_numpy()
+    x_numeric = x_values.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(x_values.dtype, np.datetime64) else np.arange(n)
+    y_values = data[y].to_numpy()
+    reduced = data.take(lttb_indices(x_numeric, y_values, budget))
+    starts, lows, highs = minmax_envelope(y_values, max(budget // 4, 1))
+    envelope = pd.DataFrame({x: x_values[starts], 'min': lows, 'max': highs})
+    return reduced, envelope, n
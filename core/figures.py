@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Built figures kept per process (override with CALC_FIGURE_CACHE_SIZE)
+DEFAULT_MAX_FIGURES = 256
+
+
+def _digest(value, h):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        h.update(repr((list(frame.columns), [str(dtype) for dtype in frame.dtypes], len(frame))).encode())
+        h.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(b'(')
+        for item in value:
+            _digest(item, h)
+        h.update(b')')
+    elif isinstance(value, dict):
+        _digest(sorted(value.items()), h)
+    else:
+        h.update(repr(value).encode())
+    h.update(b'|')
+
+
+def figure_key(builder, args, kwargs):
+    # Figures are keyed on what they show: the builder and a hash of its aggregate inputs
+    h = hashlib.blake2b(digest_size=16)
+    _digest((args, kwargs), h)
+    return builder.__name__, h.hexdigest()
+
+
+class FigureCache:
+    # Process-wide LRU of built Plotly figures, shared by every Streamlit session.
+    # st.plotly_chart copies a Figure without re-validating it, so a hit skips building and validation;
+    # callers must treat the figures they get back as read-only.
+
+    def __init__(self, max_figures=DEFAULT_MAX_FIGURES):
+        self.max_figures = max_figures
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, builder, *args, **kwargs):
+        key = figure_key(builder, args, kwargs)
+        with self._lock:
+            figure = self._entries.get(key)
+            if figure is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+
+        figure = builder(*args, **kwargs)
+
+        with self._lock:
+            self._entries[key] = figure
+            while len(self._entries) > self.max_figures:
+                self._entries.popitem(last=False)
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+FIGURE_CACHE = FigureCache(int(os.environ.get('CALC_FIGURE_CACHE_SIZE', DEFAULT_MAX_FIGURES)))
+
+
+def cached_figure(builder, *args, **kwargs):
+    return FIGURE_CACHE.get_or_build(builder, *args, **kwargs)
+
+
+def gauge(value, title, bar_color, step_colors=('lightgray', 'lightgray'), width=500, height=330):
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=value,
+        title={'text': title},
+        gauge={'axis': {'range': [0, 100]},
+               'bar': {'color': bar_color},
+               'steps': [
+                   {'range': [0, 50], 'color': step_colors[0]},
+                   {'range': [50, 100], 'color': step_colors[1]}]},
+        number={'suffix': '%', 'valueformat': '.2f'}))
+    fig.update_layout(width=width, height=height)
+    return fig
+
+
+def oee_over_time(avg_oee_date_data, grain='Day'):
+    # One point per period of `grain` (core.oee.TimePyramid levels)
+    title = 'Average OEE of Equipment on Each Date' if grain == 'Day' else f'Average OEE of Equipment per {grain}'
+    fig = px.line(avg_oee_date_data, x='Date', y='OEE', title=title, height=350)
+    if 'OEE P10' in avg_oee_date_data.columns and len(avg_oee_date_data):
+        # P10-P90 of the records in each period (from the OEE sketches) drawn behind the average
+        fig.add_trace(go.Scatter(x=avg_oee_date_data['Date'], y=avg_oee_date_data['OEE P90'], mode='lines',
+                                 line={'width': 0}, showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=avg_oee_date_data['Date'], y=avg_oee_date_data['OEE P10'], mode='lines',
+                                 line={'width': 0}, fill='tonexty', fillcolor='rgba(99, 110, 250, 0.2)',
+                                 name='P10–P90'))
+        fig.data = fig.data[1:] + fig.data[:1]
+    return fig
+
+
+def average_metrics_bar(avg_equipment_data):
+    avg_metrics_data = avg_equipment_data[['EquipmentId', 'Availability', 'Performance', 'Quality']]
+    avg_metrics_data = avg_metrics_data.melt(id_vars=['EquipmentId'], value_vars=['Availability', 'Performance', 'Quality'],
+                                             var_name='Metric', value_name='Average')
+
+    fig = px.bar(avg_metrics_data, x='EquipmentId', y='Average', color='Metric', barmode='group',
+                 title='Average Availability, Performance, and Quality of Each Equipment',
+                 labels={'EquipmentId': 'Equipment ID', 'Average': 'Average Value'},
+                 hover_data={'Average': True},
+                 height=350)
+    fig.update_traces(texttemplate='%{y:.2%}')
+    return fig
+
+
+def trend_line(reduced, envelope, x, y, webgl=False):
+    # Downsampled trend with the optional min/max band drawn behind the line
+    fig = px.line(reduced, x=x, y=y, render_mode='webgl' if webgl else 'auto')
+    if envelope is not None:
+        band = go.Scattergl if webgl else go.Scatter
+        fig.add_trace(band(x=envelope[x], y=envelope['max'], mode='lines', line={'width': 0},
+                           showlegend=False, hoverinfo='skip'))
+        fig.add_trace(band(x=envelope[x], y=envelope['min'], mode='lines', line={'width': 0}, fill='tonexty',
+                           fillcolor='rgba(99, 110, 250, 0.2)', showlegend=False, hoverinfo='skip'))
+        fig.data = fig.data[1:] + fig.data[:1]
+    fig.update_layout(title='', xaxis_title=x, yaxis_title=y)
+    return fig
+
+
+def pre_failure_line(profile):
+    # Days to failure count down towards the failure at the right edge
+    fig = px.line(profile, x='Days To Failure', y=['Mean', 'RMS'], markers=True, height=350,
+                  labels={'value': 'Vibration Level (mm/s)', 'variable': ''})
+    fig.update_xaxes(autorange='reversed')
+    return fig
@@ -0,0 +1,160 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+# JSON-lines file the dashboards append per-stage timings to (empty string disables logging)
+METRICS_LOG = os.environ.get('CALC_METRICS_LOG', 'calculator_metrics.jsonl')
+
+
+def max_rss_bytes():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return max_rss_bytes()
+
+
+class RssSampler:
+    # Samples resident memory on a background thread; reset() starts a new peak window
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def reset(self):
+        self.peak = current_rss_bytes()
+        return self.peak
+
+    def __enter__(self):
+        self.reset()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+class RunMetrics:
+    # Lap timer for one script run: lap('figures') closes the running stage and opens the next.
+    # Repeated stage names are summed in the breakdown; skip('figures', name) records a step whose last
+    # result was reused.
+
+    def __init__(self, app, session_id=None, log_path=METRICS_LOG):
+        self.app = app
+        self.session_id = session_id
+        self.log_path = log_path
+        self.run_id = uuid.uuid4().hex
+        self.stages = []
+        self.skipped = []
+        self._current = None
+        self._sampler = RssSampler().__enter__()
+
+    @property
+    def finished(self):
+        return self._sampler is None
+
+    def lap(self, stage):
+        self._close()
+        rss = self._sampler.reset()
+        self._current = (stage, time.perf_counter(), rss)
+
+    def skip(self, stage, name):
+        self.skipped.append({'stage': stage, 'step': name})
+
+    def _close(self):
+        if self._current is None:
+            return
+        stage, started, rss_before = self._current
+        rss_after = current_rss_bytes()
+        self.stages.append({
+            'stage': stage,
+            'seconds': time.perf_counter() - started,
+            'rss_peak_bytes': max(self._sampler.peak, rss_after),
+            'rss_delta_bytes': rss_after - rss_before,
+        })
+        self._current = None
+
+    def finish(self):
+        # Close the last stage, stop sampling and append the run to the log; safe to call twice
+        self._close()
+        if self._sampler is not None:
+            self._sampler.__exit__(None, None, None)
+            self._sampler = None
+            self._write_log()
+        return self.breakdown()
+
+    def breakdown(self):
+        columns = ['Stage', 'Seconds', 'Peak RSS (MB)', 'RSS Change (MB)', 'Skipped']
+        if not self.stages and not self.skipped:
+            return pd.DataFrame(columns=columns)
+        stages = pd.DataFrame(self.stages, columns=['stage', 'seconds', 'rss_peak_bytes', 'rss_delta_bytes'])
+        grouped = stages.groupby('stage', sort=False).agg(
+            seconds=('seconds', 'sum'), rss_peak_bytes=('rss_peak_bytes', 'max'), rss_delta_bytes=('rss_delta_bytes', 'sum'))
+        skipped = {}
+        for step in self.skipped:
+            skipped.setdefault(step['stage'], []).append(step['step'])
+        # Stages with only reused steps get a row too, with no time spent
+        grouped = grouped.reindex(list(grouped.index) + [stage for stage in skipped if stage not in grouped.index])
+        return pd.DataFrame({
+            'Stage': grouped.index,
+            'Seconds': grouped['seconds'].fillna(0).round(4).to_numpy(),
+            'Peak RSS (MB)': (grouped['rss_peak_bytes'] / 1e6).round(1).to_numpy(),
+            'RSS Change (MB)': (grouped['rss_delta_bytes'] / 1e6).round(1).to_numpy(),
+            'Skipped': [', '.join(skipped.get(stage, [])) for stage in grouped.index],
+        }, columns=columns)
+
+    def summary(self):
+        # One line for a partial rerun: time per stage that ran, then the steps it reused
+        seconds = {}
+        for stage in self.stages:
+            seconds[stage['stage']] = seconds.get(stage['stage'], 0.0) + stage['seconds']
+        ran = ' · '.join(f'{stage} {total:.2f}s' for stage, total in seconds.items())
+        reused = ', '.join(step['step'] for step in self.skipped)
+        return ran + (f' · skipped {reused}' if reused else '')
+
+    def _write_log(self):
+        if not self.log_path or not (self.stages or self.skipped):
+            return
+        timestamp = pd.Timestamp.now(tz='UTC').isoformat()
+        lines = [json.dumps(dict(stage, ts=timestamp, app=self.app, session=self.session_id, run=self.run_id))
+                 for stage in self.stages]
+        lines += [json.dumps(dict(step, skipped=True, ts=timestamp, app=self.app, session=self.session_id,
+                                  run=self.run_id)) for step in self.skipped]
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError:
+            pass
+
+
+def latency_percentiles(log_path, percentiles=(0.5, 0.9, 0.99)):
+    # Per app/stage latency percentiles over every logged rerun; reused (skipped) steps took no time
+    log = pd.read_json(log_path, lines=True)
+    if 'skipped' in log.columns:
+        log = log[log['skipped'].isna()]
+    return log.groupby(['app', 'stage'])['seconds'].quantile(list(percentiles)).unstack()
+
+
+if __name__ == '__main__':
+    print(latency_percentiles(sys.argv[1] if len(sys.argv) > 1 else METRICS_LOG).to_string())
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads shared by every session (override with CALC_JOB_WORKERS)
+JOB_WORKERS = int(os.environ.get('CALC_JOB_WORKERS', 2))
+# The job each worker thread is running, so code deep inside a stage can stop it early
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # A pipeline of named stages run on a worker thread; each stage gets the previous stage's result.
+    # Cancelling is cooperative: the job stops at its next check_cancelled(), made before every stage and by
+    # long stages between files, chunks and groups, and its result is never set.
+
+    def __init__(self, key, stages):
+        self.key = key
+        self.stages = stages
+        self.stage_index = 0
+        self.stage = stages[0][0] if stages else ''
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.timings = []
+        self._cancelled = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def fraction(self):
+        return self.stage_index / len(self.stages) if self.stages else 1.0
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.status == 'pending':
+            self.status = 'cancelled'
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def run(self):
+        value = None
+        self.status = 'running'
+        _current.job = self
+        try:
+            for index, (name, func) in enumerate(self.stages):
+                self.check_cancelled()
+                self.stage_index, self.stage = index, name
+                started = time.perf_counter()
+                value = func(value)
+                self.timings.append((name, time.perf_counter() - started))
+            self.check_cancelled()
+        except JobCancelled:
+            self.status = 'cancelled'
+            return
+        except Exception as exc:
+            self.error = exc
+            self.status = 'failed'
+            return
+        finally:
+            _current.job = None
+        self.stage_index = len(self.stages)
+        self.result = value
+        self.status = 'done'
+
+
+class JobRunner:
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='calculator-job')
+
+    def submit(self, key, stages, previous=None):
+        # Returns `previous` while it is still for the same key, otherwise cancels it and starts a new job,
+        # so a change of inputs or filters never lets superseded work run to the end
+        if previous is not None and previous.key == key:
+            return previous
+        if previous is not None:
+            previous.cancel()
+        job = Job(key, stages)
+        self._pool.submit(job.run)
+        return job
+
+
+JOBS = JobRunner()
+
+
+def check_cancelled():
+    # Raises JobCancelled inside a cancelled job; a no-op outside jobs (batch runs, the service, tests)
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        job.check_cancelled()
+
+
+def format_timings(job):
+    return ' · '.join(f'{name} {seconds:.2f}s' for name, seconds in job.timings)
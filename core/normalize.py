@@ -0,0 +1,106 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Tried in order on a sample of each text date column; day-first comes before month-first
+# because that is how the templates write dates ('01-06-2024')
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d',
+    '%d-%m-%Y', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d.%m.%Y',
+    '%m-%d-%Y', '%m/%d/%Y', '%m/%d/%Y %H:%M:%S',
+]
+DATE_SAMPLE_SIZE = 200
+
+
+def detect_date_format(values, sample_size=DATE_SAMPLE_SIZE):
+    # First strptime format that parses every sampled value, 'mixed' when the column has no single format
+    sample = pd.Series(values).dropna().astype(str).drop_duplicates()
+    if len(sample) > sample_size:
+        sample = sample.sample(sample_size, random_state=0)
+    for date_format in DATE_FORMATS:
+        try:
+            pd.to_datetime(sample, format=date_format)
+        except (ValueError, TypeError):
+            continue
+        return date_format
+    return 'mixed'
+
+
+def parse_dates(values, date_format=None):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, None
+    if pd.api.types.infer_dtype(values, skipna=True) in ('date', 'datetime'):
+        # Already date/datetime objects, e.g. Excel cells or Arrow date32
+        return pd.to_datetime(values, errors='coerce'), None
+    # The format was detected on a sample, so a row outside it may not match: then the later candidates are
+    # tried on the whole column. A column no single format parses is read as 'ISO8601' when its sample was ISO
+    # ('mixed' with dayfirst reads 2024-01-02 as 1 February), otherwise as 'mixed', day-first unless the sample
+    # was month-first
+    date_format = date_format or detect_date_format(values)
+    candidates = DATE_FORMATS[DATE_FORMATS.index(date_format):] if date_format in DATE_FORMATS else [date_format]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        for candidate in candidates:
+            try:
+                return pd.to_datetime(values, format=candidate, dayfirst=True), candidate
+            except (ValueError, TypeError):
+                continue
+        fallback = 'ISO8601' if date_format.startswith('%Y-') else 'mixed'
+        parsed = pd.to_datetime(values, format=fallback, dayfirst=not date_format.startswith('%m'), errors='coerce')
+    return parsed, fallback
+
+
+def _compact_measure(values):
+    # int64 measures are stored as int32 when they fit. Floats stay float64: float32 would move the calculated
+    # metrics away from the stream and batch paths, which read the same files at full precision
+    if not pd.api.types.is_integer_dtype(values):
+        return values
+    # Not below int32: calculate_oee multiplies hours by 60 and NumPy keeps int8/int16 products
+    # in the narrow type, so they would silently wrap around
+    info = np.iinfo(np.int32)
+    if values.dtype.itemsize > 4 and (values.empty or (values.min() >= info.min and values.max() <= info.max)):
+        return values.astype(np.int32)
+    return values
+
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def normalize_frame(frame, id_columns=(), date_columns=(), date_formats=None):
+    # One pass at ingest: IDs -> category, dates -> datetime64, numeric measures -> smallest lossless dtype.
+    # The detected date formats and the byte counts are kept in frame.attrs['normalize'].
+    date_formats = dict(date_formats or {})
+    before = frame_bytes(frame)
+    columns = {}
+    for name in frame.columns:
+        values = frame[name]
+        if name in id_columns:
+            columns[name] = values.astype('category')
+        elif name in date_columns:
+            columns[name], detected = parse_dates(values, date_formats.get(name))
+            if detected:
+                date_formats[name] = detected
+        else:
+            columns[name] = _compact_measure(values)
+    normalized = pd.DataFrame(columns, index=frame.index)
+    normalized.attrs['normalize'] = {
+        'date_formats': date_formats,
+        'bytes_before': before,
+        'bytes_after': frame_bytes(normalized),
+    }
+    return normalized
+
+
+def _format_bytes(size):
+    return f'{size / 1e6:.1f} MB' if size >= 1e5 else f'{size / 1e3:.1f} KB'
+
+
+def format_normalize_report(name, frame):
+    report = frame.attrs.get('normalize')
+    if not report:
+        return f'{name}: {_format_bytes(frame_bytes(frame))}'
+    before, after = report['bytes_before'], report['bytes_after']
+    saved = 100 * (before - after) / before if before else 0
+    return f'{name}: {_format_bytes(before)} → {_format_bytes(after)} ({saved:.0f}% saved)'
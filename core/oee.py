@@ -0,0 +1,296 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.backends import engine_oee, resolve_backend
+from core.jobs import check_cancelled
+from core.normalize import parse_dates
+from core.readers import apply_filters
+from core.sketch import merge_sketches, quantile_sketch, rollup_sketch, sketch_quantiles
+
+
+def calculate_oee(production_hours_data, downtime_hours_data, backend=None, states=False, plant=None):
+    if states:
+        # Also the result's mergeable aggregate states, see oee_states
+        merged_data = calculate_oee(production_hours_data, downtime_hours_data, backend)
+        return (merged_data,) + oee_states(merged_data, plant=plant)
+    backend = resolve_backend(backend)
+    if backend != 'pandas':
+        # Same result computed by DuckDB/Polars, None for inputs only pandas handles (see engine_oee)
+        merged_data = engine_oee(production_hours_data, downtime_hours_data, backend)
+        if merged_data is not None:
+            return merged_data
+
+    # Merge production and downtime data
+    merged_data = pd.merge(production_hours_data, downtime_hours_data, on=['Date', 'EquipmentId'])
+
+    # Calculate OEE Components
+    merged_data['Availability'] = (merged_data['ProductionHrs'] - merged_data['DownTimeHrs']) / merged_data['ProductionHrs']
+    merged_data['Performance'] = (merged_data['ProducedGoods'] * merged_data['IdealCycle']) / ((merged_data['ProductionHrs'] - merged_data['DownTimeHrs']) * 60)
+    merged_data['Quality'] = (merged_data['ProducedGoods'] - merged_data['DefectGoods']) / merged_data['ProducedGoods']
+    merged_data['OEE'] = merged_data['Availability'] * merged_data['Performance'] * merged_data['Quality'] * 100
+    return merged_data
+
+
+def summarize_oee(merged_data):
+    # Headline numbers shown in the dashboard summary, average OEE is the product of the mean components
+    average_availability = merged_data['Availability'].mean()
+    average_performance = merged_data['Performance'].mean()
+    average_quality = merged_data['Quality'].mean()
+    return {
+        'Records': len(merged_data),
+        'Equipment': merged_data['EquipmentId'].nunique(),
+        'Average Availability': average_availability,
+        'Average Performance': average_performance,
+        'Average Quality': average_quality,
+        'Average OEE': average_availability * average_performance * average_quality * 100,
+    }
+
+
+# Columns each input needs for calculate_oee, anything else is dropped on read
+PRODUCTION_COLUMNS = ['Date', 'EquipmentId', 'ProductionHrs', 'ProducedGoods', 'DefectGoods', 'IdealCycle']
+DOWNTIME_COLUMNS = ['Date', 'EquipmentId', 'DownTimeHrs']
+METRICS = ['Availability', 'Performance', 'Quality', 'OEE']
+PARTIAL_KEYS = ['EquipmentId', 'Date']
+# Percentiles of the per-record OEE distribution, read from the OEE sketches
+OEE_QUANTILES = {'OEE P10': 0.1, 'OEE P50': 0.5, 'OEE P90': 0.9}
+
+
+def oee_partials(merged_data, keys=PARTIAL_KEYS):
+    # Per-group sums and non-null counts of each metric; unlike means these can be added together
+    # observed=True: categorical IDs (core.normalize) must not produce empty groups
+    grouped = merged_data.groupby(keys, observed=True)
+    return pd.concat([grouped.size().rename('Records'),
+                      grouped[METRICS].sum().add_suffix(' Sum'),
+                      grouped[METRICS].count().add_suffix(' Count')], axis=1)
+
+
+def merge_partials(left, right):
+    if left is None:
+        return right
+    return left.add(right, fill_value=0)
+
+
+def partials_to_means(partials):
+    means = pd.DataFrame(index=partials.index)
+    for metric in METRICS:
+        means[metric] = partials[f'{metric} Sum'] / partials[f'{metric} Count']
+    return means
+
+
+def rollup_partials(partials, level):
+    # Re-group (EquipmentId, Date) partials to a coarser key, e.g. level='Date' for the trend chart
+    return partials.groupby(level=level, observed=True).sum()
+
+
+def oee_sketch(merged_data, keys=PARTIAL_KEYS):
+    # Per-group quantile sketch of OEE (core.sketch), mergeable like the partials
+    return quantile_sketch(merged_data, keys, 'OEE')
+
+
+def oee_states(merged_data, keys=PARTIAL_KEYS, plant=None):
+    # (partials, sketch) of one shard; with a plant both get a leading 'Plant' level, so the states of
+    # several plants merge into one fleet without their raw rows
+    partials, sketch = oee_partials(merged_data, keys), oee_sketch(merged_data, keys)
+    if plant is not None:
+        partials, sketch = (pd.concat({plant: frame}, names=['Plant']) for frame in (partials, sketch))
+    return partials, sketch
+
+
+def merge_states(left, right):
+    if left is None:
+        return right
+    return merge_partials(left[0], right[0]), merge_sketches(left[1], right[1])
+
+
+def oee_quantiles(sketch, level=None):
+    # OEE_QUANTILES per `level` group, or over the whole sketch as a dict
+    return sketch_quantiles(sketch, OEE_QUANTILES, level)
+
+
+def _averages(totals):
+    # Headline averages from summed partials, average OEE is the product of the mean components
+    average_availability = totals['Availability Sum'] / totals['Availability Count']
+    average_performance = totals['Performance Sum'] / totals['Performance Count']
+    average_quality = totals['Quality Sum'] / totals['Quality Count']
+    return {
+        'Average Availability': average_availability,
+        'Average Performance': average_performance,
+        'Average Quality': average_quality,
+        'Average OEE': average_availability * average_performance * average_quality * 100,
+    }
+
+
+def summarize_partials(partials):
+    totals = partials.sum()
+    return {
+        'Records': int(totals['Records']),
+        'Equipment': partials.index.get_level_values('EquipmentId').nunique(),
+        **_averages(totals),
+    }
+
+
+def stream_oee(production_path, downtime_path, chunksize=500_000, filters=None, states=False):
+    # Out-of-core calculate_oee for CSV logs: production is read chunk by chunk and joined against
+    # the downtime table, only (EquipmentId, Date) partials are kept between chunks.
+    # Memory is bounded by the chunk size plus the number of (EquipmentId, Date) keys.
+    # states=True returns (partials, OEE sketch), the sketch merged across chunks like the partials.
+    if not (production_path.lower().endswith('.csv') and downtime_path.lower().endswith('.csv')):
+        raise ValueError('Streaming OEE needs CSV inputs')
+
+    filters = filters or []
+    downtime_index = pd.concat((apply_filters(chunk, filters) for chunk in
+                                pd.read_csv(downtime_path, usecols=DOWNTIME_COLUMNS, chunksize=chunksize)),
+                               ignore_index=True)
+    def chunk_states(merged_data):
+        return oee_states(merged_data) if states else (oee_partials(merged_data), None)
+
+    merged = None
+    for chunk in pd.read_csv(production_path, usecols=PRODUCTION_COLUMNS, chunksize=chunksize):
+        check_cancelled()
+        chunk = apply_filters(chunk, filters)
+        merged = merge_states(merged, chunk_states(calculate_oee(chunk, downtime_index)))
+
+    if merged is None:
+        merged = chunk_states(calculate_oee(pd.DataFrame(columns=PRODUCTION_COLUMNS), downtime_index))
+    return merged if states else merged[0]
+
+
+class OEECube:
+    # (EquipmentId, Date) partials of one dataset, built once so a filter change is a slice, not a scan.
+    # OEEStore answers the same four queries from SQLite.
+
+    def __init__(self, merged_data):
+        self.merged_data = merged_data
+        self.partials = oee_partials(merged_data).sort_index()
+        self.sketch = oee_sketch(merged_data)
+        self._by_date = rollup_partials(self.partials, 'Date')
+        self._by_equipment = rollup_partials(self.partials, 'EquipmentId')
+        self._sketch_by_date = rollup_sketch(self.sketch, 'Date')
+        self._equipment_ids = merged_data['EquipmentId'].unique().tolist()
+        self._rows = merged_data.groupby('EquipmentId', observed=True).indices
+
+    def equipment_ids(self):
+        return self._equipment_ids
+
+    def by_date(self, equipment_id=None):
+        if equipment_id is None:
+            return self._by_date
+        return self.partials.xs(equipment_id, level='EquipmentId')
+
+    def by_equipment(self, equipment_id=None):
+        if equipment_id is None:
+            return self._by_equipment
+        return self._by_equipment.loc[[equipment_id]]
+
+    def sketch_by_date(self, equipment_id=None):
+        # OEE sketch per (Date, Bucket), across machines for 'All'
+        if equipment_id is None:
+            return self._sketch_by_date
+        try:
+            return self.sketch.xs(equipment_id, level='EquipmentId')
+        except KeyError:
+            # No finite OEE for this machine, so no buckets
+            return self.sketch.iloc[:0].droplevel('EquipmentId')
+
+    def quantiles_by_date(self, equipment_id=None):
+        # P10/P50/P90 OEE band per date
+        return oee_quantiles(self.sketch_by_date(equipment_id), 'Date')
+
+    def quantiles(self, equipment_id=None):
+        return oee_quantiles(self.sketch_by_date(equipment_id))
+
+    def results(self, equipment_id=None):
+        if equipment_id is None:
+            return self.merged_data
+        return self.merged_data.take(self._rows[equipment_id])
+
+
+# Grains of the trend rollup, finest first. Weeks are ISO weeks (Monday to Sunday); shifts are SHIFT_HOURS
+# long from SHIFT_START_HOUR and only exist when the dates carry a time of day
+TIME_GRAINS = ['Shift', 'Day', 'Week', 'Month']
+SHIFT_HOURS = 8
+SHIFT_START_HOUR = 6
+# Most periods a trend shows before moving to the next coarser grain (override with CALC_TREND_POINTS)
+TREND_POINTS = int(os.environ.get('CALC_TREND_POINTS', 400))
+
+
+def period_starts(times, grain):
+    # Start of the `grain` period every timestamp falls in
+    times = pd.DatetimeIndex(times)
+    if grain == 'Shift':
+        offset = pd.Timedelta(hours=SHIFT_START_HOUR)
+        return (times - offset).floor(f'{SHIFT_HOURS}h') + offset
+    if grain == 'Day':
+        return times.floor('D')
+    return times.to_period('W-SUN' if grain == 'Week' else 'M').start_time
+
+
+class TimePyramid:
+    # Date partials, and optionally the Date OEE sketch, rolled up once to every time grain. A level holds
+    # the means and P10/P50/P90 of its periods, so a zoom or pan is a binary search and one slice of at
+    # most TREND_POINTS rows whatever the history length; running sums of the finest level give the exact
+    # averages of any window.
+
+    def __init__(self, partials, sketch=None):
+        # Dates may be text, e.g. from OEEStore; the sketch's dates are parsed with the same format
+        times, date_format = parse_dates(pd.Series(partials.index))
+        valid = times.notna().to_numpy()
+        times = pd.DatetimeIndex(times[valid])
+        partials = partials.iloc[valid]
+        if sketch is not None:
+            sketch_times = parse_dates(pd.Series(sketch.index.get_level_values('Date')), date_format)[0]
+            sketch_valid = sketch_times.notna().to_numpy()
+            sketch_times = pd.DatetimeIndex(sketch_times[sketch_valid])
+            sketch = sketch.iloc[sketch_valid]
+
+        has_time = len(times) and (times != times.floor('D')).any()
+        self.grains = [grain for grain in TIME_GRAINS if grain != 'Shift' or has_time]
+        self.levels = {}
+        self._starts = {}
+        for grain in self.grains:
+            check_cancelled()
+            level = partials.groupby(period_starts(times, grain)).sum()
+            level.index.name = 'Date'
+            frame = partials_to_means(level)
+            if sketch is not None:
+                rolled = sketch.set_axis(pd.MultiIndex.from_arrays(
+                    [period_starts(sketch_times, grain), sketch.index.get_level_values('Bucket')],
+                    names=['Date', 'Bucket']))
+                frame = frame.join(oee_quantiles(rolled, 'Date'))
+            frame['Records'] = level['Records']
+            self.levels[grain] = frame.reset_index()
+            self._starts[grain] = level.index.to_numpy()
+            if grain == self.grains[0]:
+                self._columns = level.columns
+                self._running = np.vstack([np.zeros(len(level.columns)), np.cumsum(level.to_numpy(np.float64), axis=0)])
+
+    def span(self):
+        # First and last period start of the finest grain, None for an empty pyramid
+        starts = self._starts[self.grains[0]]
+        return (pd.Timestamp(starts[0]), pd.Timestamp(starts[-1])) if len(starts) else None
+
+    def _window(self, grain, start, end):
+        starts = self._starts[grain]
+        lo = 0 if start is None else np.searchsorted(starts, period_starts([start], grain)[0].to_datetime64())
+        hi = len(starts) if end is None else np.searchsorted(starts, pd.Timestamp(end).to_datetime64(), side='right')
+        return lo, hi
+
+    def choose_grain(self, start=None, end=None, max_points=TREND_POINTS):
+        # Finest grain that shows the window in at most max_points periods
+        for grain in self.grains:
+            lo, hi = self._window(grain, start, end)
+            if hi - lo <= max_points:
+                return grain
+        return self.grains[-1]
+
+    def query(self, start=None, end=None, grain=None, max_points=TREND_POINTS):
+        # (grain, periods of the window at that grain, exact averages over the window)
+        grain = grain if grain in self.levels else self.choose_grain(start, end, max_points)
+        lo, hi = self._window(grain, start, end)
+        first, last = self._window(self.grains[0], start, end)
+        totals = pd.Series(self._running[last] - self._running[first], index=self._columns)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            summary = {'Records': int(totals['Records']), **_averages(totals)}
+        return grain, self.levels[grain].iloc[lo:hi].reset_index(drop=True), summary
@@ -0,0 +1,222 @@
+"""Persistent, incrementally updated OEE history in a local SQLite file.
+
+Raw production/downtime rows are upserted per (Date, EquipmentId) key: a key
+present in an upload replaces everything stored for that key. Only the
+affected keys are re-run through calculate_oee, and the per-date and
+per-equipment rollups are updated from the changed partials, so a refresh
+costs in proportion to the delta rather than the history. OEE quantile
+sketches (core.sketch) are kept per key and per date the same way.
+
+    python -m core.oee_store history.sqlite production.csv downtime.csv
+"""
+import sqlite3
+import sys
+import threading
+
+import pandas as pd
+
+from core.batch import read_input
+from core.jobs import check_cancelled
+from core.normalize import parse_dates
+from core.oee import (DOWNTIME_COLUMNS, METRICS, PRODUCTION_COLUMNS, calculate_oee, oee_partials,
+                      oee_quantiles, oee_sketch, partials_to_means)
+
+PARTIAL_COLUMNS = ['Records'] + [f'{m} Sum' for m in METRICS] + [f'{m} Count' for m in METRICS]
+RESULT_COLUMNS = ['Date', 'EquipmentId'] + METRICS
+SKETCH_COLUMNS = ['Date', 'EquipmentId', 'Bucket', 'Count']
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _columns_sql(columns, sql_type):
+    return ', '.join(f'{_quote(c)} {sql_type}' for c in columns)
+
+
+def _param(value):
+    # sqlite3 cannot bind NumPy scalars, such as the ids pandas hands back
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _normalize_keys(frame):
+    # Dates are stored as day text so CSV and Excel uploads of the same day land on the same key, whether or
+    # not they carry a time of day; rows whose date does not parse share one 'NaT' key
+    frame = frame.copy()
+    frame['Date'] = parse_dates(frame['Date'])[0].dt.strftime('%Y-%m-%d').fillna('NaT')
+    return frame
+
+
+class OEEStore:
+
+    def __init__(self, path):
+        self.path = path
+        # The connection is shared between Streamlit sessions, so every use goes through the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        # Bumped by every upsert through this store, so dashboards know their aggregates are stale
+        self.version = 0
+        self._create_schema()
+        self._backfill_sketch()
+
+    def _create_schema(self):
+        partial_sql = _columns_sql(PARTIAL_COLUMNS, 'REAL NOT NULL DEFAULT 0')
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS production (Date TEXT, EquipmentId, {_columns_sql(PRODUCTION_COLUMNS[2:], 'REAL')});
+            CREATE INDEX IF NOT EXISTS production_key ON production (Date, EquipmentId);
+            CREATE TABLE IF NOT EXISTS downtime (Date TEXT, EquipmentId, {_columns_sql(DOWNTIME_COLUMNS[2:], 'REAL')});
+            CREATE INDEX IF NOT EXISTS downtime_key ON downtime (Date, EquipmentId);
+            CREATE TABLE IF NOT EXISTS results (Date TEXT, EquipmentId, {_columns_sql(METRICS, 'REAL')});
+            CREATE INDEX IF NOT EXISTS results_key ON results (Date, EquipmentId);
+            CREATE INDEX IF NOT EXISTS results_equipment ON results (EquipmentId);
+            CREATE TABLE IF NOT EXISTS partials (Date TEXT, EquipmentId, {partial_sql}, PRIMARY KEY (Date, EquipmentId));
+            CREATE INDEX IF NOT EXISTS partials_equipment ON partials (EquipmentId);
+            CREATE TABLE IF NOT EXISTS by_date (Date TEXT PRIMARY KEY, {partial_sql});
+            CREATE TABLE IF NOT EXISTS by_equipment (EquipmentId PRIMARY KEY, {partial_sql});
+            CREATE TABLE IF NOT EXISTS sketch (Date TEXT, EquipmentId, Bucket INTEGER, Count INTEGER,
+                                               PRIMARY KEY (Date, EquipmentId, Bucket));
+            CREATE INDEX IF NOT EXISTS sketch_equipment ON sketch (EquipmentId);
+            CREATE TABLE IF NOT EXISTS sketch_by_date (Date TEXT, Bucket INTEGER, Count INTEGER,
+                                                       PRIMARY KEY (Date, Bucket));
+        """)
+
+    def _backfill_sketch(self):
+        # Stores written before the sketches existed get them once from their stored results
+        with self._lock, self.conn:
+            if self.conn.execute('SELECT 1 FROM sketch LIMIT 1').fetchone() is not None:
+                return
+            results = self._read('SELECT Date, EquipmentId, OEE FROM results')
+            if results.empty:
+                return
+            oee_sketch(results).reset_index()[SKETCH_COLUMNS].to_sql('sketch', self.conn, if_exists='append', index=False)
+            self.conn.execute('DELETE FROM sketch_by_date')
+            self.conn.execute('INSERT INTO sketch_by_date SELECT Date, Bucket, SUM(Count) FROM sketch GROUP BY Date, Bucket')
+
+    def close(self):
+        self.conn.close()
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def _replace_rows(self, table, frame, keys_table):
+        self.conn.execute(f'DELETE FROM {table} WHERE (Date, EquipmentId) IN (SELECT Date, EquipmentId FROM {keys_table})')
+        frame.to_sql(table, self.conn, if_exists='append', index=False)
+
+    def upsert(self, production_data, downtime_data):
+        # Returns the number of (Date, EquipmentId) keys that were recomputed
+        production_data = _normalize_keys(production_data[PRODUCTION_COLUMNS])
+        downtime_data = _normalize_keys(downtime_data[DOWNTIME_COLUMNS])
+        production_keys = production_data[['Date', 'EquipmentId']].drop_duplicates()
+        downtime_keys = downtime_data[['Date', 'EquipmentId']].drop_duplicates()
+        delta_keys = pd.concat([production_keys, downtime_keys]).drop_duplicates()
+
+        with self._lock, self.conn:
+            production_keys.to_sql('_production_keys', self.conn, if_exists='replace', index=False)
+            downtime_keys.to_sql('_downtime_keys', self.conn, if_exists='replace', index=False)
+            delta_keys.to_sql('_delta_keys', self.conn, if_exists='replace', index=False)
+
+            self._replace_rows('production', production_data, '_production_keys')
+            self._replace_rows('downtime', downtime_data, '_downtime_keys')
+
+            # Recompute only the affected keys from the stored raw rows
+            old_partials = self._read('SELECT p.* FROM partials p JOIN _delta_keys USING (Date, EquipmentId)')
+            merged_data = calculate_oee(
+                self._read('SELECT p.* FROM production p JOIN _delta_keys USING (Date, EquipmentId)'),
+                self._read('SELECT d.* FROM downtime d JOIN _delta_keys USING (Date, EquipmentId)'))
+            new_partials = oee_partials(merged_data).reset_index()
+            # Raising here rolls the upload back, so a cancelled job leaves the history as it was
+            check_cancelled()
+
+            self._replace_rows('results', merged_data[RESULT_COLUMNS], '_delta_keys')
+            self._replace_rows('partials', new_partials[['Date', 'EquipmentId'] + PARTIAL_COLUMNS], '_delta_keys')
+            self._replace_rows('sketch', oee_sketch(merged_data).reset_index()[SKETCH_COLUMNS], '_delta_keys')
+
+            self._refresh_by_date()
+            self._apply_equipment_delta(old_partials, new_partials)
+
+            for table in ('_production_keys', '_downtime_keys', '_delta_keys'):
+                self.conn.execute(f'DROP TABLE {table}')
+            self.version += 1
+        return len(delta_keys)
+
+    def _refresh_by_date(self):
+        # A date's rollup is rebuilt from its partials, so it stays exact however often it changes
+        sums = ', '.join(f'SUM({_quote(c)})' for c in PARTIAL_COLUMNS)
+        self.conn.execute('DELETE FROM by_date WHERE Date IN (SELECT Date FROM _delta_keys)')
+        self.conn.execute(f"""
+            INSERT INTO by_date (Date, {', '.join(_quote(c) for c in PARTIAL_COLUMNS)})
+            SELECT Date, {sums} FROM partials
+            WHERE Date IN (SELECT Date FROM _delta_keys) GROUP BY Date""")
+        self.conn.execute('DELETE FROM sketch_by_date WHERE Date IN (SELECT Date FROM _delta_keys)')
+        self.conn.execute("""
+            INSERT INTO sketch_by_date (Date, Bucket, Count)
+            SELECT Date, Bucket, SUM(Count) FROM sketch
+            WHERE Date IN (SELECT Date FROM _delta_keys) GROUP BY Date, Bucket""")
+
+    def _apply_equipment_delta(self, old_partials, new_partials):
+        # Equipment rollups span the whole history, so add (new - old) instead of re-aggregating
+        new_totals = new_partials.groupby('EquipmentId', observed=True)[PARTIAL_COLUMNS].sum()
+        old_totals = old_partials.groupby('EquipmentId', observed=True)[PARTIAL_COLUMNS].sum()
+        delta = new_totals.sub(old_totals, fill_value=0).reset_index()
+        columns = ', '.join(_quote(c) for c in PARTIAL_COLUMNS)
+        updates = ', '.join(f'{_quote(c)} = {_quote(c)} + excluded.{_quote(c)}' for c in PARTIAL_COLUMNS)
+        self.conn.executemany(
+            f"""INSERT INTO by_equipment (EquipmentId, {columns}) VALUES ({', '.join('?' * (len(PARTIAL_COLUMNS) + 1))})
+                ON CONFLICT (EquipmentId) DO UPDATE SET {updates}""",
+            delta.astype(object).itertuples(index=False, name=None))
+        self.conn.execute('DELETE FROM by_equipment WHERE Records <= 0')
+
+    def equipment_ids(self):
+        return self._read('SELECT EquipmentId FROM by_equipment ORDER BY EquipmentId')['EquipmentId'].tolist()
+
+    def by_date(self, equipment_id=None):
+        # Date partials, from the materialized rollup or, for one machine, from its partials
+        if equipment_id is None:
+            partials = self._read('SELECT * FROM by_date ORDER BY Date')
+        else:
+            partials = self._read('SELECT * FROM partials WHERE EquipmentId = ? ORDER BY Date', (_param(equipment_id),))
+        return partials.set_index('Date')[PARTIAL_COLUMNS]
+
+    def by_equipment(self, equipment_id=None):
+        if equipment_id is None:
+            partials = self._read('SELECT * FROM by_equipment ORDER BY EquipmentId')
+        else:
+            partials = self._read('SELECT * FROM by_equipment WHERE EquipmentId = ?', (_param(equipment_id),))
+        return partials.set_index('EquipmentId')[PARTIAL_COLUMNS]
+
+    def sketch_by_date(self, equipment_id=None):
+        if equipment_id is None:
+            sketch = self._read('SELECT Date, Bucket, Count FROM sketch_by_date')
+        else:
+            sketch = self._read('SELECT Date, Bucket, Count FROM sketch WHERE EquipmentId = ?', (_param(equipment_id),))
+        return sketch.set_index(['Date', 'Bucket'])
+
+    def quantiles_by_date(self, equipment_id=None):
+        return oee_quantiles(self.sketch_by_date(equipment_id), 'Date')
+
+    def quantiles(self, equipment_id=None):
+        return oee_quantiles(self.sketch_by_date(equipment_id))
+
+    def results(self, equipment_id=None):
+        if equipment_id is None:
+            return self._read('SELECT * FROM results ORDER BY Date, EquipmentId')
+        return self._read('SELECT * FROM results WHERE EquipmentId = ? ORDER BY Date', (_param(equipment_id),))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3:
+        print('usage: python -m core.oee_store STORE PRODUCTION DOWNTIME', file=sys.stderr)
+        return 2
+    store_path, production_path, downtime_path = argv
+    store = OEEStore(store_path)
+    updated = store.upsert(read_input('production', production_path), read_input('downtime', downtime_path))
+    print(f'{updated} (Date, EquipmentId) keys recomputed')
+    print(partials_to_means(store.by_equipment()).to_string())
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
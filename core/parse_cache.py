@@ -0,0 +1,246 @@
+import glob
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from io import BytesIO
+
+from core.jobs import JobCancelled, check_cancelled
+from core.readers import prepare_frame, read_table, table_kind
+
+# Default byte budget for parsed frames held in memory (override with CALC_PARSE_CACHE_MAX_BYTES)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Arrow IPC copies of parsed xlsx/csv uploads, keyed by content, so a file is only parsed as text once
+# (override with CALC_SIDECAR_DIR, empty turns sidecars off, and CALC_SIDECAR_MAX_BYTES)
+SIDECAR_DIR = os.environ.get('CALC_SIDECAR_DIR', os.path.join(tempfile.gettempdir(), 'calc-sidecars'))
+SIDECAR_MAX_BYTES = int(os.environ.get('CALC_SIDECAR_MAX_BYTES', 4 * 1024 * 1024 * 1024))
+SIDECAR_KINDS = ('xlsx', 'csv')
+# Processes parsing the files of one load side by side (override with CALC_INGEST_WORKERS, 1 parses in-process)
+INGEST_WORKERS = int(os.environ.get('CALC_INGEST_WORKERS', min(4, os.cpu_count() or 1)))
+# How often a job waiting on offloaded parses checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _make_key(data, kind, options):
+    # Key on the file content and on everything that changes how it is parsed
+    return (_digest(data), kind, repr(sorted(options.items())))
+
+
+def sidecar_path(data, sidecar_dir=SIDECAR_DIR):
+    return os.path.join(sidecar_dir, f'{_digest(data)}.arrow')
+
+
+def _prune_sidecars(sidecar_dir, max_bytes):
+    # Least recently used sidecars go first; reads touch their file
+    files = []
+    for path in glob.glob(os.path.join(sidecar_dir, '*.arrow')):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def _write_sidecar(frame, path, max_bytes):
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        feather.write_feather(frame, temporary)
+        # Concurrent writers of the same file race harmlessly: each rename installs a complete copy
+        os.replace(temporary, path)
+    except (OSError, ValueError, TypeError):
+        # e.g. object columns mixing numbers and text have no Arrow type; such files are parsed every time
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return
+    _prune_sidecars(os.path.dirname(path), max_bytes)
+
+
+def read_with_sidecar(source, kind, sidecar_dir=SIDECAR_DIR, max_bytes=SIDECAR_MAX_BYTES, columns=None,
+                      filters=None, normalize=None):
+    # read_table for xlsx/csv bytes that goes through the file's Arrow sidecar: the first parse reads every
+    # column and writes the sidecar, later ones (other columns/filters, another process) scan the sidecar
+    data = source.getvalue()
+    path = sidecar_path(data, sidecar_dir)
+    if os.path.exists(path):
+        try:
+            frame = read_table(path, kind='arrow', columns=columns, filters=filters, normalize=normalize)
+            os.utime(path)
+            return frame
+        except (OSError, ValueError):
+            # Truncated or unreadable sidecar: parse the file again and replace it
+            pass
+    frame = read_table(BytesIO(data), kind=kind)
+    _write_sidecar(frame, path, max_bytes)
+    return prepare_frame(frame, columns, filters, normalize)
+
+
+def _frame_bytes(frame):
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+class ParseCache:
+    # Process-wide LRU of parsed DataFrames, shared by every Streamlit session
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_parse(self, data, kind, reader, **options):
+        return self.get_or_parse_many([(data, kind, reader, options, False)])[0]
+
+    def get_or_parse_many(self, requests, pool=None):
+        # requests: (data, kind, reader, options, offload) tuples. Misses flagged `offload` are parsed
+        # concurrently on `pool`, so a load of several files takes about as long as its largest one
+        keys = [_make_key(data, kind, options) for data, kind, _, options, _ in requests]
+        frames = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    # Callers are free to mutate what they get back, so never hand out the cached frame
+                    frames.append(entry[0].copy())
+                else:
+                    self.misses += 1
+                    frames.append(None)
+
+        # Parse outside the lock so a large workbook does not block other sessions
+        misses = [index for index, frame in enumerate(frames) if frame is None]
+        offloaded = [index for index in misses if requests[index][4]] if pool is not None else []
+        futures = {index: pool.submit(requests[index][2], BytesIO(requests[index][0]), **requests[index][3])
+                   for index in (offloaded if len(offloaded) > 1 else [])}
+        parsed = {}
+        try:
+            # A cancelled job stops between files and stops waiting on the pool, whose queued parses are dropped
+            for index in misses:
+                if index not in futures:
+                    check_cancelled()
+                    data, _, reader, options, _ = requests[index]
+                    parsed[index] = reader(BytesIO(data), **options)
+            for index, future in futures.items():
+                while not wait([future], timeout=CANCEL_POLL_SECONDS).done:
+                    check_cancelled()
+                parsed[index] = future.result()
+        except JobCancelled:
+            for future in futures.values():
+                future.cancel()
+            raise
+
+        with self._lock:
+            for index, frame in parsed.items():
+                size = _frame_bytes(frame)
+                if size <= self.max_bytes and keys[index] not in self._entries:
+                    self._entries[keys[index]] = (frame, size)
+                    self.current_bytes += size
+                    self._evict()
+        for index, frame in parsed.items():
+            frames[index] = frame.copy()
+        return frames
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+PARSE_CACHE = ParseCache(int(os.environ.get('CALC_PARSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)))
+
+
+_INGEST_POOL = None
+_INGEST_POOL_LOCK = threading.Lock()
+
+
+def ingest_pool():
+    # Created on first use and shared by every session; spawned, since forking the multithreaded
+    # Streamlit server process can deadlock the children
+    global _INGEST_POOL
+    with _INGEST_POOL_LOCK:
+        if _INGEST_POOL is None and INGEST_WORKERS > 1:
+            _INGEST_POOL = ProcessPoolExecutor(INGEST_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _INGEST_POOL
+
+
+def _upload_request(uploaded_file, options, sidecar_dir):
+    kind = table_kind(uploaded_file.name)
+    data = uploaded_file.getvalue()
+    if sidecar_dir and kind in SIDECAR_KINDS:
+        # Worth a worker process only while the file still has to be parsed as text
+        offload = not os.path.exists(sidecar_path(data, sidecar_dir))
+        reader = partial(read_with_sidecar, kind=kind, sidecar_dir=sidecar_dir)
+    else:
+        offload = kind in SIDECAR_KINDS
+        reader = partial(read_table, kind=kind)
+    return data, kind, reader, options, offload
+
+
+def read_uploads(uploads, cache=PARSE_CACHE, sidecar_dir=SIDECAR_DIR):
+    # Parse several uploads at once: (uploaded_file, options) pairs -> frames in the same order. Options are
+    # core.readers.read_table keyword arguments and part of the cache key, so date formats are detected once
+    # per file; files not cached in memory are parsed concurrently, from their sidecar when one exists
+    global _INGEST_POOL
+    requests = [_upload_request(uploaded_file, dict(options), sidecar_dir) for uploaded_file, options in uploads]
+    try:
+        return cache.get_or_parse_many(requests, ingest_pool())
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool next time and parse in-process now
+        with _INGEST_POOL_LOCK:
+            _INGEST_POOL = None
+        return cache.get_or_parse_many(requests)
+
+
+def read_upload(uploaded_file, cache=PARSE_CACHE, columns=None, filters=None, normalize=None):
+    # Parse one upload (anything with .name and .getvalue()), reusing earlier parses of the same bytes
+    return read_uploads([(uploaded_file, {'columns': columns, 'filters': filters, 'normalize': normalize})],
+                        cache)[0]
+
+
+def format_cache_stats(cache=PARSE_CACHE):
+    stats = cache.stats()
+    return (f"Parse cache: {stats['hits']} hits / {stats['misses']} misses, "
+            f"{stats['entries']} files, {stats['bytes'] / 1e6:.1f} of {stats['max_bytes'] / 1e6:.0f} MB")
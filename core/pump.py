@@ -0,0 +1,554 @@
+import numpy as np
+import pandas as pd
+
+from core.backends import engine_failure_totals, resolve_backend
+from core.jobs import check_cancelled
+from core.normalize import parse_dates
+
+# Columns each input needs (PumpClass is optional), anything else (e.g. maintenance Description) is dropped on read
+OPERATING_COLUMNS = ['PumpID', 'Date', 'Operating Hours']
+VIBRATION_COLUMNS = ['PumpID', 'Date', 'Vibration Level (mm/s)']
+MAINTENANCE_COLUMNS = ['PumpID', 'Failure Date']
+EQUIPMENT_COLUMNS = ['PumpID', 'ManufactureDate', 'ExpireDate', 'PumpClass']
+
+
+def calculate_mtbf(operating_data, maintenance_data, backend=None):
+    # Function to calculate MTBF
+    backend = resolve_backend(backend)
+    totals = None
+    if backend != 'pandas':
+        # The per-pump aggregations run in DuckDB/Polars and come back shaped like the pandas ones
+        totals = engine_failure_totals(operating_data, maintenance_data, backend)
+    if totals is not None:
+        total_operating_time, num_failures = totals
+    else:
+        total_operating_time = operating_data.groupby('PumpID', observed=True)['Operating Hours'].sum().reset_index()
+        num_failures = maintenance_data.groupby('PumpID', observed=True).size().reset_index(name='Number of Failures')
+    mtbf_data = pd.merge(total_operating_time, num_failures, on='PumpID', how='outer')
+    mtbf_data['MTBF (Hours)'] = mtbf_data['Operating Hours'] / mtbf_data['Number of Failures']
+    return mtbf_data
+
+
+# Percentiles of the per-pump time-between-failures distribution
+TBF_QUANTILES = {'TBF P10 (Hours)': 0.1, 'TBF Median (Hours)': 0.5, 'TBF P90 (Hours)': 0.9}
+
+
+def _grouped_quantiles(codes, values, quantiles, n_groups):
+    # Linear-interpolated quantiles of `values` per group code from one lexsort, NaN for empty groups
+    if len(values) == 0:
+        return {name: np.full(n_groups, np.nan) for name in quantiles}
+    values = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    last = len(values) - 1
+    result = {}
+    for name, q in quantiles.items():
+        position = np.maximum(counts - 1, 0) * q
+        low = np.floor(position).astype(np.int64)
+        low_values = values[np.minimum(starts + low, last)]
+        high_values = values[np.minimum(starts + np.ceil(position).astype(np.int64), last)]
+        result[name] = np.where(counts > 0, low_values + (high_values - low_values) * (position - low), np.nan)
+    return result
+
+
+def _event_times(values):
+    # Dates as int64 nanoseconds (NaT -> min int64); text dates go through the same format detection as ingest
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values, _ = parse_dates(values)
+    return pd.to_datetime(values, errors='coerce').to_numpy().astype('datetime64[ns]').view(np.int64)
+
+
+def _pump_time_keys(pump_columns, time_columns):
+    # (pump, time) -> one sortable int64 key across several tables: pump code * number of distinct times + time
+    # rank, so a single sorted array is a per-pump time index that searchsorted can join against.
+    # Returns per-table pump codes and keys (-1 where the pump or time is missing), the pump ids and the span.
+    codes, pump_ids = pd.factorize(pd.concat(pump_columns, ignore_index=True), sort=True)
+    times = np.concatenate(time_columns)
+    dated = (codes >= 0) & (times != np.iinfo(np.int64).min)
+    _, ranks = np.unique(times[dated], return_inverse=True)
+    span = max(len(ranks), 1)
+    keys = np.full(len(codes), -1, dtype=np.int64)
+    keys[dated] = codes[dated].astype(np.int64) * span + ranks
+    bounds = np.cumsum([len(column) for column in pump_columns])[:-1]
+    return np.split(codes, bounds), np.split(keys, bounds), pump_ids, span
+
+
+def reliability(operating_data, maintenance_data):
+    # True time between failures for every pump in one vectorized pass. Failures are sorted per pump, the
+    # calendar gaps come from one grouped diff and the operating hours run up to each failure from a
+    # searchsorted join of (pump, date) keys against the cumulative operating hours.
+    # Returns (pump_stats, intervals); the first interval of a pump runs from its first operating record.
+    hours = pd.to_numeric(operating_data['Operating Hours'], errors='coerce').to_numpy(np.float64)
+    hours = np.nan_to_num(hours, nan=0.0)
+    failure_times = _event_times(maintenance_data['Failure Date'])
+    (operating_codes, failure_codes), (operating_keys, failure_keys), pump_ids, span = _pump_time_keys(
+        [operating_data['PumpID'], maintenance_data['PumpID']],
+        [_event_times(operating_data['Date']), failure_times])
+    n_pumps = len(pump_ids)
+    dated_operating = operating_keys >= 0
+    dated_failures = failure_keys >= 0
+    operating_keys = operating_keys[dated_operating]
+    failure_keys = failure_keys[dated_failures]
+
+    order = np.argsort(operating_keys, kind='stable')
+    operating_keys = operating_keys[order]
+    cumulative_hours = np.r_[0.0, np.cumsum(hours[dated_operating][order])]
+
+    order = np.argsort(failure_keys, kind='stable')
+    failure_keys = failure_keys[order]
+    failure_pumps = failure_codes[dated_failures][order]
+    failure_times = failure_times[dated_failures][order]
+    # Operating hours logged on the day of a failure count towards the interval it ends
+    hours_to_failure = (cumulative_hours[np.searchsorted(operating_keys, failure_keys, side='right')] -
+                        cumulative_hours[np.searchsorted(operating_keys, failure_pumps.astype(np.int64) * span)])
+
+    first_failure = np.diff(failure_pumps, prepend=-1) != 0
+    last_failure = np.diff(failure_pumps, append=-1) != 0
+    interval_hours = np.diff(hours_to_failure, prepend=0.0)
+    interval_hours[first_failure] = hours_to_failure[first_failure]
+    interval_days = np.diff(failure_times, prepend=failure_times[:1]).astype(np.float64) / pd.Timedelta(days=1).value
+    interval_days[first_failure] = np.nan
+    intervals = pd.DataFrame({
+        'PumpID': pump_ids[failure_pumps],
+        'Failure Date': pd.to_datetime(failure_times),
+        'Hours Since Previous': interval_hours,
+        'Days Since Previous': interval_days,
+    })
+
+    valid = operating_codes >= 0
+    operating_hours = np.bincount(operating_codes[valid], weights=hours[valid], minlength=n_pumps)
+    failures = np.bincount(failure_codes[failure_codes >= 0], minlength=n_pumps)
+    interval_counts = np.bincount(failure_pumps, minlength=n_pumps)
+    hours_to_last = np.zeros(n_pumps)
+    hours_to_last[failure_pumps[last_failure]] = hours_to_failure[last_failure]
+    day_sums = np.bincount(failure_pumps, weights=np.nan_to_num(interval_days), minlength=n_pumps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pump_stats = pd.DataFrame({
+            'PumpID': pump_ids,
+            'Operating Hours': operating_hours,
+            'Number of Failures': failures,
+            # Mean of the observed intervals, NaN (not inf) for pumps that have not failed yet
+            'MTBF (Hours)': np.where(interval_counts > 0, hours_to_last / interval_counts, np.nan),
+            **_grouped_quantiles(failure_pumps, interval_hours, TBF_QUANTILES, n_pumps),
+            'Mean Days Between Failures': np.where(interval_counts > 1, day_sums / (interval_counts - 1), np.nan),
+            'Failures per 1000 Hours': np.where(operating_hours > 0, failures / operating_hours * 1000, np.nan),
+            # Censored time since the last failure (all of it for pumps without failures)
+            'Hours Since Last Failure': operating_hours - hours_to_last,
+        })
+    return pump_stats, intervals
+
+
+def fleet_reliability(pump_stats, intervals):
+    # Fleet-wide numbers from reliability() output, over every interval rather than averaging pump means
+    hours = intervals['Hours Since Previous'].to_numpy()
+    operating_hours = pump_stats['Operating Hours'].sum()
+    failures = pump_stats['Number of Failures'].sum()
+    summary = {
+        'Pumps': len(pump_stats),
+        'Operating Hours': operating_hours,
+        'Number of Failures': failures,
+        'MTBF (Hours)': hours.mean() if len(hours) else np.nan,
+        'Failures per 1000 Hours': failures / operating_hours * 1000 if operating_hours > 0 else np.nan,
+    }
+    for name, q in TBF_QUANTILES.items():
+        summary[name] = np.quantile(hours, q) if len(hours) else np.nan
+    return summary
+
+
+def calculate_rul(mtbf_data, equipment_data, current_date=None):
+    # Function to calculate RUL
+    if 'ExpireDate' not in equipment_data.columns:
+        raise ValueError("'ExpireDate' column is missing in Equipment Data.")
+
+    current_date = pd.Timestamp.now() if current_date is None else pd.Timestamp(current_date)
+    equipment_data = equipment_data.copy()
+    equipment_data['ManufactureDate'] = pd.to_datetime(equipment_data['ManufactureDate'])
+    equipment_data['ExpireDate'] = pd.to_datetime(equipment_data['ExpireDate'])
+    equipment_data['Pump Age (Days)'] = (current_date - equipment_data['ManufactureDate']).dt.days
+    equipment_data['Expected Lifespan (Days)'] = (equipment_data['ExpireDate'] - equipment_data['ManufactureDate']).dt.days
+
+    mtbf_data = pd.merge(mtbf_data, equipment_data[['PumpID', 'Pump Age (Days)', 'Expected Lifespan (Days)']], on='PumpID', how='left')
+    mtbf_data['RUL (%)'] = ((mtbf_data['Expected Lifespan (Days)'] - mtbf_data['Pump Age (Days)']) / mtbf_data['Expected Lifespan (Days)']) * 100
+    mtbf_data['RUL (%)'] = mtbf_data['RUL (%)'].clip(lower=0)
+    mtbf_data['RUL (%)'] = np.array(mtbf_data['RUL (%)']).round(2)
+    return mtbf_data
+
+
+# Censored Weibull fits need this many positive failure intervals per pump (or pump class), otherwise the
+# pump keeps the age-based RUL; shapes are kept inside the bounds and a fit that hits one is not used
+WEIBULL_MIN_FAILURES = 3
+WEIBULL_SHAPE_BOUNDS = (0.05, 50.0)
+# Optional equipment column; pumps of one class share a Weibull fit
+PUMP_CLASS_COLUMN = 'PumpClass'
+WEIBULL_COLUMNS = ['Group', 'Shape', 'Scale (Hours)', 'Failures', 'Censored', 'Iterations', 'Converged']
+
+
+def fit_weibull(durations, failed, groups, n_groups, initial_shape=None, max_iter=100, tol=1e-9):
+    # Censored maximum likelihood Weibull fits for n_groups at once. With the scale profiled out, the
+    # shape solves 1/k + sum(d*ln t)/r - sum(t^k ln t)/sum(t^k) = 0; every group takes its Newton step
+    # (in log k, at most a factor e) in the same array operation, and groups leave the loop once converged.
+    # Durations are scaled by their group maximum so t**k cannot overflow.
+    low, high = WEIBULL_SHAPE_BOUNDS
+    shape = np.ones(n_groups) if initial_shape is None else np.clip(np.nan_to_num(initial_shape, nan=1.0), low, high)
+    failed = failed.astype(np.float64)
+    span = np.zeros(n_groups)
+    np.maximum.at(span, groups, durations)
+    log_t = np.log(durations / span[groups])
+
+    failures = np.bincount(groups, weights=failed, minlength=n_groups)
+    log_sum = np.bincount(groups, weights=failed * log_t, minlength=n_groups)
+    log_square_sum = np.bincount(groups, weights=failed * log_t ** 2, minlength=n_groups)
+    # Identical failure times have no finite shape
+    spread = failures * log_square_sum - log_sum ** 2
+    active = (failures >= WEIBULL_MIN_FAILURES) & (spread > 1e-12 * np.maximum(failures, 1) ** 2)
+    eligible = active.copy()
+    iterations = np.zeros(n_groups, dtype=np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            check_cancelled()
+            t_k = np.exp(shape[groups] * log_t)
+            a = np.bincount(groups, weights=t_k, minlength=n_groups)
+            b = np.bincount(groups, weights=t_k * log_t, minlength=n_groups)
+            c = np.bincount(groups, weights=t_k * log_t ** 2, minlength=n_groups)
+            score = 1 / shape + log_sum / failures - b / a
+            slope = -1 / shape ** 2 - (c * a - b ** 2) / a ** 2
+            step = np.where(active, np.clip(-score / (slope * shape), -1, 1), 0.0)
+            shape = np.clip(shape * np.exp(step), low, high)
+            iterations += active
+            active &= np.abs(step) > tol
+
+        scaled = np.bincount(groups, weights=np.exp(shape[groups] * log_t), minlength=n_groups)
+        scale = span * (scaled / failures) ** (1 / shape)
+    converged = eligible & ~active & (shape > low) & (shape < high)
+    return {
+        'Shape': np.where(converged, shape, np.nan),
+        'Scale (Hours)': np.where(converged, scale, np.nan),
+        'Failures': failures.astype(np.int64),
+        'Censored': np.bincount(groups, weights=1 - failed, minlength=n_groups).astype(np.int64),
+        'Iterations': iterations,
+        'Converged': converged,
+    }
+
+
+def _object_index(values):
+    # PumpIDs compared by value whether they arrive categorical or not
+    return pd.Index(np.asarray(values, dtype=object))
+
+
+def weibull_fits(pump_stats, intervals, pump_groups=None, previous=None):
+    # Fits on reliability() output: every failure interval is an observed lifetime and each pump's hours since
+    # its last failure a right-censored one. `pump_groups` maps PumpID -> pump class (default: one fit per
+    # pump); `previous` is an earlier weibull_fits() result whose shapes warm-start the Newton iterations.
+    pump_ids = _object_index(pump_stats['PumpID'])
+    if pump_groups is None:
+        pump_group_labels = pump_ids
+    else:
+        pump_group_labels = _object_index(pd.Series(pump_groups).reindex(pump_ids))
+    group_codes, group_labels = pd.factorize(pump_group_labels, sort=True)
+
+    interval_pumps = pump_ids.get_indexer(_object_index(intervals['PumpID']))
+    interval_codes = np.where(interval_pumps >= 0, group_codes[interval_pumps], -1)
+    durations = np.r_[intervals['Hours Since Previous'].to_numpy(np.float64),
+                      pump_stats['Hours Since Last Failure'].to_numpy(np.float64)]
+    codes = np.r_[interval_codes, group_codes]
+    failed = np.r_[np.ones(len(intervals), dtype=bool), np.zeros(len(pump_stats), dtype=bool)]
+    # A zero-length lifetime has no Weibull density and a zero-length censored run carries no information
+    keep = (codes >= 0) & (durations > 0)
+
+    initial_shape = None
+    if previous is not None and len(previous):
+        initial_shape = pd.Series(previous['Shape'].to_numpy(), index=_object_index(previous['Group']))
+        initial_shape = initial_shape[~initial_shape.index.duplicated()].reindex(_object_index(group_labels)).to_numpy()
+    fits = fit_weibull(durations[keep], failed[keep], codes[keep], len(group_labels), initial_shape)
+    return pd.DataFrame({'Group': group_labels, **fits}, columns=WEIBULL_COLUMNS)
+
+
+def weibull_rul(rul_data, equipment_data, pump_stats, intervals, group_by=PUMP_CLASS_COLUMN, previous=None):
+    # Survival-model RUL on top of calculate_rul output: RUL (%) becomes the median residual life at the pump's
+    # current run length (hours since its last failure) as a share of the median life of a new pump, from the
+    # Weibull fit of its pump class (`group_by`, a column of equipment_data; one fit per pump when it is missing).
+    # Pumps without a usable fit keep the age-based value. Returns (rul_data, fits); pass fits back as
+    # `previous` to warm-start the next refit.
+    rul_data = rul_data.copy()
+    pump_groups = None
+    if group_by is not None and group_by in equipment_data.columns:
+        pump_groups = pd.Series(equipment_data[group_by].to_numpy(),
+                                index=_object_index(equipment_data['PumpID'])).groupby(level=0).first()
+    fits = weibull_fits(pump_stats, intervals, pump_groups, previous)
+
+    pumps = _object_index(rul_data['PumpID'])
+    stats = pump_stats.set_index(_object_index(pump_stats['PumpID']))
+    groups = pumps if pump_groups is None else _object_index(pump_groups.reindex(pumps))
+    fit_rows = _object_index(fits['Group']).get_indexer(groups)
+    shape = np.where(fit_rows >= 0, fits['Shape'].to_numpy()[fit_rows], np.nan)
+    scale = np.where(fit_rows >= 0, fits['Scale (Hours)'].to_numpy()[fit_rows], np.nan)
+    age = stats['Hours Since Last Failure'].reindex(pumps).to_numpy(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        # Median residual life m at age a: S(a + m) / S(a) = 1/2  =>  (a + m)^k = a^k + scale^k ln 2
+        residual = scale * ((age / scale) ** shape + np.log(2)) ** (1 / shape) - age
+        median_life = scale * np.log(2) ** (1 / shape)
+        weibull_rul = np.clip(100 * residual / median_life, 0, 100).round(2)
+    use_weibull = ~np.isnan(weibull_rul)
+    rul_data['Median Residual Life (Hours)'] = np.where(use_weibull, residual, np.nan).round(2)
+    rul_data['RUL (%)'] = np.where(use_weibull, weibull_rul, rul_data['RUL (%)'])
+    rul_data['RUL Model'] = np.where(use_weibull, 'Weibull', 'Age')
+    return rul_data, fits
+
+
+def summarize_pumps(mtbf_data):
+    # Fleet-level numbers for one plant, inf MTBF (pumps without failures) is left out of the mean
+    mtbf = mtbf_data['MTBF (Hours)'].replace([np.inf, -np.inf], np.nan)
+    return {
+        'Pumps': mtbf_data['PumpID'].nunique(),
+        'Operating Hours': mtbf_data['Operating Hours'].sum(),
+        'Number of Failures': mtbf_data['Number of Failures'].sum(),
+        'Average MTBF (Hours)': mtbf.mean(),
+        'Average RUL (%)': mtbf_data['RUL (%)'].mean(),
+    }
+
+
+def _segmented_ewm(values, decay):
+    # y[i] = decay[i] * y[i-1] + (1 - decay[i]) * values[i] for all series at once, as a
+    # log-step prefix scan; decay == 0 starts a new series
+    scale = decay.astype(np.float64)
+    total = (1 - scale) * values
+    step = 1
+    while step < len(values):
+        total[step:] = total[step:] + scale[step:] * total[:-step]
+        scale[step:] = scale[step:] * scale[:-step]
+        step *= 2
+    return total
+
+
+# Readings gathered per chunk of vibration windows, which bounds the memory of vibration_features
+WINDOW_CHUNK = 4_000_000
+
+
+def _window_moments(values, starts, counts):
+    # Mean, mean square, peak |x| and exactly centered second and fourth moments of values[start:start + count]
+    # for every window. Prefix sums of raw powers would cancel catastrophically in the fourth moment, so each
+    # window's readings are gathered into one contiguous run and reduced with ufunc.reduceat, a chunk of
+    # windows at a time
+    moments = np.empty((5, len(counts)))
+    ends = np.cumsum(counts)
+    first = 0
+    while first < len(counts):
+        check_cancelled()
+        last = max(np.searchsorted(ends, ends[first] - counts[first] + WINDOW_CHUNK, side='right'), first + 1)
+        chunk_counts = counts[first:last]
+        offsets = np.cumsum(chunk_counts) - chunk_counts
+        window_values = values[np.arange(chunk_counts.sum()) + np.repeat(starts[first:last] - offsets, chunk_counts)]
+        mean = np.add.reduceat(window_values, offsets) / chunk_counts
+        squares = (window_values - np.repeat(mean, chunk_counts)) ** 2
+        moments[:, first:last] = (mean,
+                                  np.add.reduceat(window_values ** 2, offsets) / chunk_counts,
+                                  np.maximum.reduceat(np.abs(window_values), offsets),
+                                  np.add.reduceat(squares, offsets) / chunk_counts,
+                                  np.add.reduceat(squares ** 2, offsets) / chunk_counts)
+        first = last
+    return moments
+
+
+def vibration_features(vibration_data, window='1D', halflife='7D', step=None):
+    # Condition-monitoring features over a trailing time window per pump, for all pumps in one pass: a reading
+    # gets its pump's readings in (time - window, time], as pandas' rolling(window) would give. Readings are
+    # sorted into contiguous per-pump runs and window bounds come from one searchsorted on (pump, time) keys.
+    # Every reading is evaluated, which costs readings x readings per window, or with `step` only each pump's
+    # last reading per step period, which keeps the work and the table compact.
+    times = pd.to_datetime(vibration_data['Date'], errors='coerce')
+    values = pd.to_numeric(vibration_data['Vibration Level (mm/s)'], errors='coerce').to_numpy(np.float64)
+    valid = times.notna().to_numpy() & ~np.isnan(values)
+    pump_codes, pump_ids = pd.factorize(vibration_data['PumpID'].to_numpy()[valid], sort=True)
+    stamps = times[valid].to_numpy().astype('datetime64[ns]').view(np.int64)
+    values = values[valid]
+
+    columns = ['PumpID', 'Window End', 'Readings', 'Mean', 'RMS', 'Peak', 'Crest Factor', 'Kurtosis', 'RMS Trend']
+    if len(values) == 0:
+        return pd.DataFrame(columns=columns)
+
+    order = np.lexsort((stamps, pump_codes))
+    pump_codes, stamps, values = pump_codes[order], stamps[order], values[order]
+    if step is None:
+        ends = np.arange(len(values))
+    else:
+        periods = pd.to_datetime(stamps).floor(step).to_numpy().view(np.int64)
+        ends = np.flatnonzero(np.r_[(np.diff(pump_codes) != 0) | (np.diff(periods) != 0), True])
+    # A window starts at its pump's first reading later than time - window
+    ranked, ranks = np.unique(np.r_[stamps, stamps[ends] - pd.Timedelta(window).value], return_inverse=True)
+    keys = pump_codes.astype(np.int64) * len(ranked) + ranks[:len(stamps)]
+    starts = np.searchsorted(keys, keys[ends] - ranks[ends] + ranks[len(stamps):], side='right')
+    counts = ends - starts + 1
+
+    mean, mean_square, peak, variance, fourth_moment = _window_moments(values, starts, counts)
+    rms = np.sqrt(mean_square)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crest = np.where(rms > 0, peak / rms, np.nan)
+        kurtosis = np.where(variance > 0, fourth_moment / variance ** 2, np.nan)
+
+    # Exponentially weighted RMS trend, decaying with the time elapsed between a pump's evaluated readings;
+    # the difference across a pump boundary is negative and clipped so exp() cannot overflow there
+    window_pumps = pump_codes[ends]
+    window_ends = stamps[ends]
+    elapsed = np.maximum(np.diff(window_ends, prepend=window_ends[0]), 0).astype(np.float64)
+    decay = np.exp(-np.log(2) * elapsed / pd.Timedelta(halflife).value)
+    decay[np.r_[True, np.diff(window_pumps) != 0]] = 0
+    trend = _segmented_ewm(rms, decay)
+
+    return pd.DataFrame({
+        'PumpID': pump_ids[window_pumps],
+        'Window End': pd.to_datetime(window_ends),
+        'Readings': counts,
+        'Mean': mean,
+        'RMS': rms,
+        'Peak': peak,
+        'Crest Factor': crest,
+        'Kurtosis': kurtosis,
+        'RMS Trend': trend,
+    }, columns=columns)
+
+
+def latest_vibration_features(features):
+    # One row per pump: its most recent window (features are sorted by PumpID, then time)
+    is_last = features['PumpID'].ne(features['PumpID'].shift(-1))
+    return features[is_last].reset_index(drop=True)
+
+
+
+DAY_NS = pd.Timedelta(days=1).value
+NAT_NS = np.iinfo(np.int64).min
+
+
+def _event_days(values):
+    times = _event_times(values)
+    return times, np.where(times != NAT_NS, times // DAY_NS * DAY_NS, NAT_NS)
+
+
+def align_vibration(vibration_data, operating_data, maintenance_data):
+    # As-of join of every vibration reading to its pump's operating day and to the failures on either side of it.
+    # Readings, operating records and failures share one (pump, day) key space, so each join is a searchsorted
+    # into a sorted per-pump index: O(n log n) over all readings, no merges or cross joins.
+    # Failure dates are whole days: a reading on the day of a failure counts as before it (Days To Failure 0).
+    # Returns the readings in their original order with the alignment columns added (NaN/NaT where unmatched).
+    reading_times, reading_days = _event_days(vibration_data['Date'])
+    _, operating_days = _event_days(operating_data['Date'])
+    _, failure_days = _event_days(maintenance_data['Failure Date'])
+    hours = np.nan_to_num(pd.to_numeric(operating_data['Operating Hours'], errors='coerce').to_numpy(np.float64))
+    _, (reading_keys, operating_keys, failure_keys), _, span = _pump_time_keys(
+        [vibration_data['PumpID'], operating_data['PumpID'], maintenance_data['PumpID']],
+        [reading_days, operating_days, failure_days])
+
+    dated = operating_keys >= 0
+    order = np.argsort(operating_keys[dated], kind='stable')
+    operating_keys = operating_keys[dated][order]
+    cumulative_hours = np.r_[0.0, np.cumsum(hours[dated][order])]
+
+    dated = failure_keys >= 0
+    order = np.argsort(failure_keys[dated], kind='stable')
+    failure_keys = failure_keys[dated][order]
+    failure_days = failure_days[dated][order]
+
+    # Readings are joined once per distinct (pump, day); the sorted keys also keep searchsorted cache-friendly
+    aligned = reading_keys >= 0
+    keys, reading_index = np.unique(reading_keys[aligned], return_inverse=True)
+    pumps = keys // span
+    # Operating records of the reading's pump and day
+    day_start = np.searchsorted(operating_keys, keys)
+    day_end = np.searchsorted(operating_keys, keys, side='right')
+
+    # First failure on or after the reading day and the one before it, kept only when they are the same pump's
+    next_index = np.searchsorted(failure_keys, keys)
+    next_key = np.append(failure_keys, -1)[next_index]
+    previous_key = np.r_[-1, failure_keys][next_index]
+    has_next = (next_key >= 0) & (next_key < (pumps + 1) * span)
+    has_previous = previous_key >= pumps * span
+    next_failure = np.where(has_next, np.append(failure_days, NAT_NS)[next_index], NAT_NS)
+    previous_failure = np.where(has_previous, np.r_[NAT_NS, failure_days][next_index], NAT_NS)
+    # Operating hours from the start of the reading day through the day of the next failure
+    failure_end = np.searchsorted(operating_keys, next_key, side='right')
+
+    day_start, day_end, failure_end = day_start[reading_index], day_end[reading_index], failure_end[reading_index]
+    has_next, has_previous = has_next[reading_index], has_previous[reading_index]
+    next_failure, previous_failure = next_failure[reading_index], previous_failure[reading_index]
+
+    def column(values, fill):
+        out = np.full(len(reading_keys), fill, dtype=values.dtype)
+        out[aligned] = values
+        return out
+
+    return vibration_data.reset_index(drop=True).assign(**{
+        'Operating Day': column(reading_days[aligned], NAT_NS).view('datetime64[ns]'),
+        'Day Operating Hours': column(np.where(day_end > day_start,
+                                               cumulative_hours[day_end] - cumulative_hours[day_start], np.nan),
+                                      np.nan),
+        'Previous Failure': column(previous_failure, NAT_NS).view('datetime64[ns]'),
+        'Next Failure': column(next_failure, NAT_NS).view('datetime64[ns]'),
+        'Days Since Failure': column(np.where(has_previous, (reading_times[aligned] - previous_failure) / DAY_NS,
+                                              np.nan), np.nan),
+        'Days To Failure': column(np.where(has_next, (next_failure - reading_days[aligned]) / DAY_NS, np.nan),
+                                  np.nan),
+        'Hours To Failure': column(np.where(has_next, cumulative_hours[failure_end] - cumulative_hours[day_start],
+                                            np.nan), np.nan),
+    })
+
+
+def pre_failure_profile(aligned, days=30):
+    # Fleet vibration by whole days left to the next failure, over the readings at most `days` before one
+    remaining = aligned['Days To Failure'].to_numpy(np.float64)
+    values = pd.to_numeric(aligned['Vibration Level (mm/s)'], errors='coerce').to_numpy(np.float64)
+    window = (remaining <= days) & ~np.isnan(values)
+    bins = remaining[window].astype(np.int64)
+    counts = np.bincount(bins, minlength=days + 1)
+    sums = np.bincount(bins, weights=values[window], minlength=days + 1)
+    squares = np.bincount(bins, weights=values[window] ** 2, minlength=days + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'Days To Failure': np.arange(days + 1),
+            'Readings': counts,
+            'Mean': np.where(counts > 0, sums / counts, np.nan),
+            'RMS': np.where(counts > 0, np.sqrt(squares / counts), np.nan),
+        })
+
+
+def pre_failure_windows(aligned, days=30):
+    # One row per failure with readings in the `days` before it: the window's vibration next to the pump's
+    # baseline, the mean of its readings outside every pre-failure window
+    remaining = aligned['Days To Failure'].to_numpy(np.float64)
+    values = pd.to_numeric(aligned['Vibration Level (mm/s)'], errors='coerce').to_numpy(np.float64)
+    pump_codes, pump_ids = pd.factorize(aligned['PumpID'].to_numpy(), sort=True)
+    measured = (pump_codes >= 0) & ~np.isnan(values)
+    window = measured & (remaining <= days)
+    baseline = measured & ~(remaining <= days)
+    n_pumps = len(pump_ids)
+    baseline_counts = np.bincount(pump_codes[baseline], minlength=n_pumps)
+    baseline_sums = np.bincount(pump_codes[baseline], weights=values[baseline], minlength=n_pumps)
+
+    columns = ['PumpID', 'Failure Date', 'Readings', 'Mean', 'RMS', 'Peak', 'Baseline Mean', 'Change (%)']
+    if not window.any():
+        return pd.DataFrame(columns=columns)
+    pumps = pump_codes[window]
+    failures = aligned['Next Failure'].to_numpy().astype('datetime64[ns]').view(np.int64)[window]
+    values = values[window]
+    order = np.lexsort((failures, pumps))
+    pumps, failures, values = pumps[order], failures[order], values[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(pumps) != 0) | (np.diff(failures) != 0)])
+    counts = np.diff(np.r_[starts, len(values)])
+
+    mean = np.add.reduceat(values, starts) / counts
+    window_pumps = pumps[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baseline_mean = np.where(baseline_counts > 0, baseline_sums / baseline_counts, np.nan)[window_pumps]
+        change = np.where(baseline_mean > 0, (mean / baseline_mean - 1) * 100, np.nan)
+    return pd.DataFrame({
+        'PumpID': pump_ids[window_pumps],
+        'Failure Date': failures[starts].view('datetime64[ns]'),
+        'Readings': counts,
+        'Mean': mean,
+        'RMS': np.sqrt(np.add.reduceat(values ** 2, starts) / counts),
+        'Peak': np.maximum.reduceat(np.abs(values), starts),
+        'Baseline Mean': baseline_mean,
+        'Change (%)': change,
+    }, columns=columns)
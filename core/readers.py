@@ -0,0 +1,161 @@
+import datetime
+import importlib.util
+import operator
+import os
+import warnings
+
+import pandas as pd
+
+from core.normalize import normalize_frame
+
+# File types accepted by the upload widgets, Parquet and Arrow IPC/Feather need pyarrow
+TABLE_TYPES = ['csv', 'xlsx', 'parquet', 'arrow', 'feather']
+TABLE_EXTENSIONS = tuple(f'.{ext}' for ext in TABLE_TYPES)
+
+_KINDS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+# python-calamine parses xlsx natively, several times faster than openpyxl; used when installed
+# (override with CALC_XLSX_ENGINE)
+XLSX_ENGINE = os.environ.get('CALC_XLSX_ENGINE') or (
+    'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl')
+_COMPARE = {'==': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+def table_kind(name):
+    # A directory is a partitioned Parquet export (e.g. EquipmentId=11/part-0.parquet)
+    if os.path.isdir(name):
+        return 'parquet'
+    return _KINDS.get(os.path.splitext(name.lower())[1], 'xlsx')
+
+
+def load_filters(id_column=None, ids=None, date_column=None, start=None, end=None):
+    # Row filters as (column, op, value) triples; the end date is inclusive
+    filters = []
+    if id_column and ids:
+        filters.append((id_column, 'in', list(ids)))
+    if date_column and start is not None:
+        filters.append((date_column, '>=', pd.Timestamp(start)))
+    if date_column and end is not None:
+        filters.append((date_column, '<', pd.Timestamp(end).normalize() + pd.Timedelta(days=1)))
+    return filters
+
+
+def parse_ids(text):
+    # "11, 12 13" -> ['11', '12', '13'], values are cast to the column type when filtering
+    return [token for token in text.replace(',', ' ').split() if token]
+
+
+def _is_temporal(value):
+    return isinstance(value, (datetime.date, pd.Timestamp))
+
+
+def apply_filters(frame, filters):
+    # Row filters for formats that cannot apply them while reading; filters on absent columns are skipped
+    mask = pd.Series(True, index=frame.index)
+    for column, op, value in filters:
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if op == 'in':
+            if pd.api.types.is_numeric_dtype(values):
+                value = pd.to_numeric(pd.Series(value), errors='coerce')
+            else:
+                values, value = values.astype(str), [str(v) for v in value]
+            mask &= values.isin(value)
+        else:
+            if _is_temporal(value):
+                # datetime64 columns do not compare with datetime.date
+                value = pd.Timestamp(value)
+                if not pd.api.types.is_datetime64_any_dtype(values):
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', UserWarning)
+                        values = pd.to_datetime(values, errors='coerce')
+            mask &= _COMPARE[op](values, value)
+    if mask.all():
+        return frame
+    return frame[mask].reset_index(drop=True)
+
+
+def _arrow_scalar(pa, value, field_type):
+    if _is_temporal(value):
+        value = pd.Timestamp(value)
+        if pa.types.is_date(field_type):
+            return pa.scalar(value.date()).cast(field_type)
+        if pa.types.is_timestamp(field_type):
+            return pa.scalar(value.to_pydatetime()).cast(field_type)
+        # Dates stored as text are compared after parsing, not as strings
+        raise TypeError(f'cannot compare {field_type} with a date')
+    return pa.scalar(value).cast(field_type)
+
+
+def _arrow_filter(pa, schema, filters):
+    # Split filters into one Arrow expression evaluated during the scan (row groups and
+    # partitions whose statistics cannot match are skipped) and the rest
+    import pyarrow.compute as pc
+
+    expression, remaining = None, []
+    for column, op, value in filters:
+        try:
+            field_type = schema.field(column).type
+            if op == 'in':
+                term = pc.field(column).isin(pa.array(list(value)).cast(field_type))
+            else:
+                term = _COMPARE[op](pc.field(column), _arrow_scalar(pa, value, field_type))
+        except (KeyError, TypeError, pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            remaining.append((column, op, value))
+            continue
+        expression = term if expression is None else expression & term
+    return expression, remaining
+
+
+def _read_columnar(source, kind, columns, filters):
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError('Reading Parquet/Arrow files requires pyarrow (pip install pyarrow)') from None
+
+    if isinstance(source, (str, os.PathLike)):
+        scanner = ds.dataset(source, format='parquet' if kind == 'parquet' else 'ipc', partitioning='hive')
+        schema = scanner.schema
+    else:
+        file_format = ds.ParquetFileFormat() if kind == 'parquet' else ds.IpcFileFormat()
+        scanner = file_format.make_fragment(pa.BufferReader(source.read()))
+        schema = scanner.physical_schema
+
+    expression, remaining = _arrow_filter(pa, schema, filters)
+    if columns is not None:
+        # Columns only needed by the remaining filters still have to be read
+        wanted = set(columns) | {column for column, _, _ in remaining}
+        columns = [name for name in schema.names if name in wanted]
+    table = scanner.to_table(columns=columns, filter=expression)
+    return table.to_pandas(), remaining
+
+
+def read_table(source, kind=None, columns=None, filters=None, normalize=None):
+    # Read a path or file-like object; only `columns` are loaded (missing ones are ignored so
+    # optional columns stay optional) and `filters` are pushed into the scan where the format allows.
+    # `normalize` holds core.normalize.normalize_frame arguments, e.g. {'id_columns': [...], 'date_columns': [...]}
+    kind = kind or table_kind(source)
+    filters = list(filters or [])
+    if kind in ('parquet', 'arrow'):
+        frame, filters = _read_columnar(source, kind, columns, filters)
+    else:
+        usecols = None
+        if columns is not None:
+            wanted = set(columns) | {column for column, _, _ in filters}
+            usecols = lambda name: name in wanted
+        if kind == 'csv':
+            frame = pd.read_csv(source, usecols=usecols)
+        else:
+            frame = pd.read_excel(source, usecols=usecols, engine=XLSX_ENGINE)
+    return prepare_frame(frame, columns, filters, normalize)
+
+
+def prepare_frame(frame, columns=None, filters=None, normalize=None):
+    # The part of read_table after the file is read: normalize, apply filters, drop unrequested columns
+    if normalize is not None:
+        # Before the remaining filters, so text dates are compared in their detected format
+        frame = normalize_frame(frame, **normalize)
+    frame = apply_filters(frame, list(filters)) if filters else frame
+    extra = [] if columns is None else [name for name in frame.columns if name not in columns]
+    return frame.drop(columns=extra) if extra else frame
@@ -0,0 +1,495 @@
+"""Local HTTP service for the OEE and pump calculators, for clients without a browser (MES, CMMS).
+
+    python -m core.service --port 8765 --workers 2
+
+    POST /oee?plant=A                    {"production": [...], "downtime": [...]}
+    POST /mtbf?plant=A                   {"operating": [...], "maintenance": [...]}
+    POST /rul?plant=A&as_of=2025-01-01   {"operating": [...], "maintenance": [...], "equipment": [...]}
+    GET  /health
+
+Each input is a list of records or a {column: [values]} object with the
+columns the Streamlit pages read. With Content-Type
+application/vnd.apache.arrow.stream the body is instead one Arrow IPC stream
+per input, in the order above. The answer is {"plant": ..., "rows": [...]}, or
+an Arrow IPC stream of the rows when the request sends that type in Accept.
+
+Requests for the same endpoint, plant and as_of that arrive within --batch-ms
+of each other are concatenated and computed by one calculate_oee /
+calculate_mtbf / calculate_rul call on a pool of worker processes that is
+started and warmed up before the first request; if a worker dies the pool is
+replaced and its batches are retried once. Answers are kept in an LRU
+keyed on the request body, and identical requests in flight share one
+computation. /health returns the request, batch and cache counters.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from core.batch import INPUT_COLUMNS
+from core.normalize import parse_dates
+from core.oee import calculate_oee
+from core.pump import calculate_mtbf, calculate_rul
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+# Inputs of each endpoint in body order and the ID column the requests of a batch are kept apart on
+ENDPOINTS = {
+    'oee': (['production', 'downtime'], 'EquipmentId'),
+    'mtbf': (['operating', 'maintenance'], 'PumpID'),
+    'rul': (['operating', 'maintenance', 'equipment'], 'PumpID'),
+}
+DEFAULT_BATCH_MS = 2.0
+DEFAULT_MAX_BATCH = 256
+# Answers kept for repeated bodies (override with CALC_SERVICE_CACHE_SIZE)
+DEFAULT_CACHE_SIZE = 4096
+REQUEST_TIMEOUT = 120
+
+
+class RequestError(ValueError):
+    # A request the service cannot read; answered with 400 and never part of a batch
+    pass
+
+
+def parse_body(endpoint, body, content_type):
+    # Request body -> inputs in ENDPOINTS order: lists of records, {column: values} objects or frames
+    roles = ENDPOINTS[endpoint][0]
+    if content_type.split(';')[0].strip() == ARROW_STREAM:
+        import pyarrow as pa
+        reader = pa.BufferReader(body)
+        try:
+            return [pa.ipc.open_stream(reader).read_all().to_pandas() for _ in roles]
+        except (pa.ArrowInvalid, OSError) as exc:
+            raise RequestError(f'expected {len(roles)} Arrow IPC streams ({", ".join(roles)}): {exc}') from None
+    try:
+        payload = json.loads(body)
+    except ValueError as exc:
+        raise RequestError(f'invalid JSON: {exc}') from None
+    if not isinstance(payload, dict):
+        raise RequestError('the body must be a JSON object')
+    missing = [role for role in roles if role not in payload]
+    if missing:
+        raise RequestError(f"missing input(s): {', '.join(missing)}")
+    for role in roles:
+        if not isinstance(payload[role], (list, dict)):
+            raise RequestError(f"'{role}' must be a list of records or an object of columns")
+    return [payload[role] for role in roles]
+
+
+def _batch_frame(parts, id_column):
+    # One frame for an input across the batch, the number of rows each request brought and the IDs as
+    # sent, before the frame coerced them to one dtype for the whole batch (None without an ID column).
+    # The requests must bring the same columns, or batch-mates would fill in a column that one of them lacks
+    if all(isinstance(part, list) for part in parts):
+        columns = [set().union(*part) for part in parts]
+        frame = pd.DataFrame(list(chain.from_iterable(parts)))
+        counts = [len(part) for part in parts]
+        ids = np.empty(len(frame), dtype=object)
+        ids[:] = [record.get(id_column) for record in chain.from_iterable(parts)]
+    else:
+        frames = [part if isinstance(part, pd.DataFrame) else pd.DataFrame(part) for part in parts]
+        columns = [set(frame.columns) for frame in frames]
+        frame = pd.concat(frames, ignore_index=True)
+        counts = [len(frame) for frame in frames]
+        ids = np.concatenate([frame[id_column].to_numpy(dtype=object) for frame in frames
+                              if id_column in frame.columns] or [np.empty(0, dtype=object)])
+    if any(names != columns[0] for names in columns[1:]):
+        raise ValueError('the requests of the batch have different columns')
+    return frame, counts, ids if id_column in frame.columns else None
+
+
+def _combine(endpoint, requests):
+    # One frame per input over the whole batch. The requests are kept apart by replacing the ID column
+    # with request * ids + code (codes shared by all inputs), so joins and group-bys never mix requests
+    roles, id_column = ENDPOINTS[endpoint]
+    frames = []
+    raw_ids = []
+    for position, role in enumerate(roles):
+        frame, counts, ids = _batch_frame([tables[position] for tables in requests], id_column)
+        if ids is None:
+            raise KeyError(f"'{role}' has no '{id_column}' column")
+        frames.append((role, frame, counts))
+        raw_ids.append(ids)
+    # Missing IDs get a code of their own instead of -1, which would land on the previous request
+    codes, ids = pd.factorize(np.concatenate(raw_ids), use_na_sentinel=False)
+    start = 0
+    combined = []
+    for role, frame, counts in frames:
+        request = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        frame[id_column] = request * max(len(ids), 1) + codes[start:start + len(frame)]
+        start += len(frame)
+        columns, _, _, date_columns = INPUT_COLUMNS[role]
+        # Only the dates are parsed; the pages' full normalization is not worth it for request-sized tables
+        for name in date_columns:
+            if name in frame.columns:
+                frame[name] = parse_dates(frame[name])[0]
+        combined.append(frame[[name for name in frame.columns if name in columns]])
+    return combined, ids
+
+
+def _compute(endpoint, frames, as_of):
+    if endpoint == 'oee':
+        return calculate_oee(*frames)
+    result = calculate_mtbf(frames[0], frames[1])
+    if endpoint == 'rul':
+        result = calculate_rul(result, frames[2], current_date=as_of)
+    return result
+
+
+def _split(endpoint, result, ids, n_requests):
+    # Batched result -> one frame per request with the original IDs put back, in the dtype they take for
+    # that request alone (e.g. integers stay integers when a batch-mate sent string IDs)
+    id_column = ENDPOINTS[endpoint][1]
+    composite = result[id_column].to_numpy(dtype=np.int64)
+    request, code = np.divmod(composite, max(len(ids), 1))
+    order = np.argsort(request, kind='stable')
+    result = result.iloc[order].reset_index(drop=True)
+    code = code[order]
+    bounds = np.searchsorted(request[order], np.arange(n_requests + 1))
+    frames = []
+    for i in range(n_requests):
+        frame = result.iloc[bounds[i]:bounds[i + 1]].reset_index(drop=True)
+        frame[id_column] = pd.Series(ids.take(code[bounds[i]:bounds[i + 1]]), dtype=object).infer_objects()
+        frames.append(frame)
+    return frames
+
+
+def _encode(frame, plant, accept):
+    if accept == ARROW_STREAM:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return 200, ARROW_STREAM, sink.getvalue().to_pybytes()
+    rows = frame.to_json(orient='records', date_format='iso')
+    return 200, 'application/json', b'{"plant": %s, "rows": %s}' % (json.dumps(plant).encode(), rows.encode())
+
+
+def _error(status, message):
+    return status, 'application/json', json.dumps({'error': message}).encode()
+
+
+def _calculate(endpoint, requests, as_of):
+    combined, ids = _combine(endpoint, requests)
+    return _split(endpoint, _compute(endpoint, combined, as_of), ids, len(requests))
+
+
+def run_batch(endpoint, plant, as_of, items):
+    # Executed inside a worker process: items are (body, content type, accept) of requests for the same
+    # endpoint/plant/as_of, returns one (status, content type, bytes) answer per item
+    answers = [None] * len(items)
+    parsed = []
+    for position, (body, content_type, accept) in enumerate(items):
+        try:
+            parsed.append((position, parse_body(endpoint, body, content_type), accept))
+        except RequestError as exc:
+            answers[position] = _error(400, str(exc))
+    try:
+        results = _calculate(endpoint, [tables for _, tables, _ in parsed], as_of) if parsed else []
+    except Exception:
+        # One bad request must not fail the others: fall back to computing them one by one
+        results = []
+        for _, tables, _ in parsed:
+            try:
+                results.append(_calculate(endpoint, [tables], as_of)[0])
+            except Exception as exc:
+                results.append(exc)
+    for (position, _, accept), result in zip(parsed, results):
+        if not isinstance(result, Exception):
+            try:
+                answers[position] = _encode(result, plant, accept)
+                continue
+            except Exception as exc:
+                # e.g. an ID column mixing numbers and strings has no Arrow type
+                result = exc
+        answers[position] = _error(422, f'{type(result).__name__}: {result}')
+    return answers
+
+
+def _warm_up(_):
+    # Runs the calculations once on tiny inputs so the first real batch does not pay for imports and
+    # pandas' lazily initialised code paths
+    day = '2024-01-01'
+    oee = json.dumps({'production': [{'Date': day, 'EquipmentId': 1, 'ProductionHrs': 8, 'ProducedGoods': 100,
+                                      'DefectGoods': 1, 'IdealCycle': 4}],
+                      'downtime': [{'Date': day, 'EquipmentId': 1, 'DownTimeHrs': 1}]}).encode()
+    pump = json.dumps({'operating': [{'Date': day, 'PumpID': 1, 'Operating Hours': 10}],
+                       'maintenance': [{'PumpID': 1, 'Failure Date': day}],
+                       'equipment': [{'PumpID': 1, 'ManufactureDate': '2020-01-01',
+                                      'ExpireDate': '2030-01-01'}]}).encode()
+    run_batch('oee', '', None, [(oee, 'application/json', 'application/json')])
+    run_batch('rul', '', day, [(pump, 'application/json', ARROW_STREAM)])
+    return os.getpid()
+
+
+class MicroBatcher:
+    # Collects submissions with the same key and hands them to `dispatch(key, payloads)`, which returns a
+    # Future of one result per payload. A batch leaves after waiting `window` seconds, but never while
+    # `capacity` batches are still running; submissions keep joining it meanwhile, so batches grow with load
+    # instead of queueing up behind busy workers
+
+    def __init__(self, dispatch, window, max_batch, capacity):
+        self.dispatch = dispatch
+        self.window = window
+        self.max_batch = max_batch
+        self.capacity = capacity
+        self.batches = 0
+        self.batched = 0
+        self._running = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+        threading.Thread(target=self._flush_loop, name='micro-batcher', daemon=True).start()
+
+    def submit(self, key, payload):
+        future = Future()
+        with self._cond:
+            if key not in self._pending:
+                self._pending[key] = (time.monotonic() + self.window, [])
+                self._cond.notify()
+            self._pending[key][1].append((payload, future))
+        return future
+
+    def _next_batch(self):
+        # Oldest waiting batch once it is due or full: (key, entries), else how long to wait for one
+        if self._running >= self.capacity or not self._pending:
+            return None, None
+        key, (deadline, entries) = min(self._pending.items(), key=lambda item: item[1][0])
+        delay = deadline - time.monotonic()
+        if delay > 0 and len(entries) < self.max_batch:
+            return None, delay
+        if len(entries) > self.max_batch:
+            self._pending[key] = (deadline, entries[self.max_batch:])
+        else:
+            del self._pending[key]
+        self._running += 1
+        self.batches += 1
+        self.batched += min(len(entries), self.max_batch)
+        return (key, entries[:self.max_batch]), None
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                batch, delay = self._next_batch()
+                while batch is None:
+                    self._cond.wait(delay)
+                    batch, delay = self._next_batch()
+            self._run(*batch)
+
+    def _finished(self, futures, done):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify()
+        try:
+            results = done.result()
+        except Exception as exc:
+            for future in futures:
+                future.set_exception(exc)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def _run(self, key, entries):
+        futures = [future for _, future in entries]
+        try:
+            batch = self.dispatch(key, [payload for payload, _ in entries])
+        except Exception as exc:
+            batch = Future()
+            batch.set_exception(exc)
+        batch.add_done_callback(lambda done: self._finished(futures, done))
+
+
+class CalculationService:
+    # Answer cache, in-flight deduplication and batching in front of the worker pool; workers=0 computes
+    # in a thread of this process instead
+
+    def __init__(self, workers=1, batch_ms=DEFAULT_BATCH_MS, max_batch=DEFAULT_MAX_BATCH,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.requests = 0
+        self.hits = 0
+        self._answers = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self.workers = workers
+        if workers:
+            self._pool, warm_up = self._start_pool()
+            for future in warm_up:
+                future.result()
+        else:
+            self._pool = ThreadPoolExecutor(1)
+        self._batcher = MicroBatcher(self._dispatch, batch_ms / 1000, max_batch, max(workers, 1))
+
+    def _start_pool(self):
+        # Spawned, since forking this multithreaded process can deadlock the children
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return pool, [pool.submit(_warm_up, worker) for worker in range(self.workers)]
+
+    def _restart_pool(self, broken):
+        # A worker that died (e.g. out of memory) breaks the whole pool; replace it once, whichever batch
+        # notices first. The new pool warms up ahead of the retried batches instead of blocking this thread
+        with self._pool_lock:
+            if self._pool is broken:
+                broken.shutdown(wait=False)
+                self._pool, _ = self._start_pool()
+            return self._pool
+
+    def _dispatch(self, key, items):
+        # Future of run_batch on the pool; a batch hit by a broken pool is retried once on a fresh pool
+        endpoint, plant, as_of = key
+        answer = Future()
+
+        def submit(pool, retry):
+            try:
+                batch = pool.submit(run_batch, endpoint, plant, as_of, items)
+            except BrokenProcessPool as exc:
+                batch = Future()
+                batch.set_exception(exc)
+            batch.add_done_callback(lambda done: finished(pool, done, retry))
+
+        def finished(pool, done, retry):
+            try:
+                answer.set_result(done.result())
+            except BrokenProcessPool as exc:
+                if retry:
+                    submit(self._restart_pool(pool), False)
+                else:
+                    answer.set_exception(exc)
+            except Exception as exc:
+                answer.set_exception(exc)
+
+        submit(self._pool, True)
+        return answer
+
+    def answer(self, endpoint, plant, as_of, body, content_type, accept):
+        accept = ARROW_STREAM if ARROW_STREAM in accept else 'application/json'
+        key = (endpoint, plant, as_of, content_type, accept, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            self.requests += 1
+            answer = self._answers.get(key)
+            if answer is not None:
+                self._answers.move_to_end(key)
+                self.hits += 1
+                return answer
+            future = self._in_flight.get(key)
+            submitted = future is None
+            if submitted:
+                future = self._in_flight[key] = self._batcher.submit((endpoint, plant, as_of),
+                                                                     (body, content_type, accept))
+            else:
+                self.hits += 1
+        if submitted:
+            # Outside the lock: a future that is already done runs _store right here, and _store takes the lock
+            future.add_done_callback(lambda done: self._store(key, done))
+        return future.result(REQUEST_TIMEOUT)
+
+    def _store(self, key, done):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if done.exception() is None and done.result()[0] == 200 and self.cache_size:
+                self._answers[key] = done.result()
+                while len(self._answers) > self.cache_size:
+                    self._answers.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            batches, batched = self._batcher.batches, self._batcher.batched
+            return {'requests': self.requests, 'cache_hits': self.hits, 'cached_answers': len(self._answers),
+                    'batches': batches, 'mean_batch_size': batched / batches if batches else None}
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+
+class CalculationHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections, clients reuse one socket for many requests
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/health':
+            self._send(200, 'application/json', json.dumps(self.service.stats()).encode())
+        else:
+            self._send(*_error(404, f'unknown path {self.path}'))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        endpoint = url.path.strip('/')
+        if endpoint not in ENDPOINTS:
+            self._send(*_error(404, f'unknown path {url.path}'))
+            return
+        query = parse_qs(url.query)
+        plant = query.get('plant', [''])[0]
+        as_of = query.get('as_of', [None])[0]
+        try:
+            answer = self.service.answer(endpoint, plant, as_of, body,
+                                         self.headers.get('Content-Type', 'application/json'),
+                                         self.headers.get('Accept', ''))
+        except TimeoutError:
+            answer = _error(503, 'calculation timed out')
+        except Exception as exc:
+            answer = _error(500, f'{type(exc).__name__}: {exc}')
+        self._send(*answer)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8765, service=None):
+    handler = type('Handler', (CalculationHandler,), {'service': service or CalculationService()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.service', description='Local OEE / pump MTBF+RUL service')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: localhost only)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='warm worker processes, 0 computes inside the server process')
+    parser.add_argument('--batch-ms', type=float, default=DEFAULT_BATCH_MS,
+                        help='how long requests for the same endpoint/plant wait for others to batch with')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help='requests per batch at most')
+    parser.add_argument('--cache-size', type=int,
+                        default=int(os.environ.get('CALC_SERVICE_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+                        help='answers kept for repeated request bodies, 0 disables')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    service = CalculationService(args.workers, args.batch_ms, args.max_batch, args.cache_size)
+    server = make_server(args.host, args.port, service)
+    print(f'Serving on http://{args.host}:{server.server_address[1]} with {args.workers} worker(s)', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+class StageGraph:
+    # A dashboard's filter -> aggregate -> figures stages with their results kept between reruns.
+    # A stage is keyed on its own parameters (widget values, the data's key) and on the versions of the
+    # stages it reads, so a widget change recomputes only the stages downstream of it; the others return
+    # their last result and are reported to RunMetrics as skipped.
+
+    def __init__(self):
+        self._entries = {}
+
+    def version(self, name):
+        entry = self._entries.get(name)
+        return entry[1] if entry is not None else None
+
+    def run(self, stage, name, func, params=(), after=(), metrics=None):
+        key = (params, tuple(self.version(dependency) for dependency in after))
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == key:
+            if metrics is not None:
+                metrics.skip(stage, name)
+            return entry[2]
+        if metrics is not None:
+            metrics.lap(stage)
+        value = func()
+        self._entries[name] = (key, (entry[1] + 1) if entry is not None else 0, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+# Seeded generators for data shaped like the sample templates of both calculators
+
+
+def _format_days(day_offsets, start, fmt):
+    # strftime is per element in Python, so format each distinct day once and gather
+    days, inverse = np.unique(day_offsets, return_inverse=True)
+    return (start + pd.to_timedelta(days, unit='D')).strftime(fmt).to_numpy()[inverse]
+
+
+def oee_tables(rows, equipment=100, seed=0):
+    # Production and downtime tables with one row per (Date, EquipmentId) key
+    rng = np.random.default_rng(seed)
+    equipment = max(min(equipment, rows), 1)
+    days = -(-rows // equipment)
+    dates = pd.date_range('2024-01-01', periods=days).strftime('%Y-%m-%d').to_numpy()
+    date_values = np.repeat(dates, equipment)[:rows]
+    equipment_ids = np.tile(np.arange(11, 11 + equipment), days)[:rows]
+
+    production_hours = rng.integers(8, 25, rows)
+    downtime_hours = rng.uniform(0.5, 2.0, rows).round(1)
+    ideal_cycle = rng.uniform(1.0, 1.8, rows).round(1)
+    # Goods take 60-98% of the run time at the ideal cycle (minutes per unit), so Performance stays below 1,
+    # and up to 8% of them are defective
+    run_minutes = (production_hours - downtime_hours) * 60
+    produced_goods = np.floor(run_minutes / ideal_cycle * rng.uniform(0.6, 0.98, rows)).astype(np.int64)
+    production_hours_data = pd.DataFrame({
+        'Date': date_values,
+        'EquipmentId': equipment_ids,
+        'ProductionHrs': production_hours,
+        'ProducedGoods': produced_goods,
+        'DefectGoods': rng.binomial(produced_goods, rng.uniform(0, 0.08, rows)),
+        'IdealCycle': ideal_cycle,
+    })
+    downtime_hours_data = pd.DataFrame({
+        'Date': date_values,
+        'EquipmentId': equipment_ids,
+        'DownTimeHrs': downtime_hours,
+    })
+    return production_hours_data, downtime_hours_data
+
+
+def pump_tables(rows, pumps=100, seed=0):
+    # Operating and vibration tables of `rows` rows, maintenance with about one failure per 50 operating days
+    rng = np.random.default_rng(seed)
+    pumps = max(min(pumps, rows), 1)
+    pump_ids = np.arange(1, pumps + 1)
+    days = -(-rows // pumps)
+    start = pd.Timestamp('2024-01-01')
+
+    operating_data = pd.DataFrame({
+        'PumpID': np.tile(pump_ids, days)[:rows],
+        'Date': _format_days(np.repeat(np.arange(days), pumps)[:rows], start, '%d-%m-%Y'),
+        'Operating Hours': rng.integers(1, 13, rows),
+    })
+
+    vibration_times = np.datetime64(start, 's') + rng.integers(0, days * 86400, rows).astype('timedelta64[s]')
+    vibration_data = pd.DataFrame({
+        'PumpID': rng.choice(pump_ids, rows),
+        'Date': np.char.replace(np.datetime_as_string(vibration_times, unit='s'), 'T', ' ').astype(object),
+        'Vibration Level (mm/s)': rng.gamma(2.0, 0.3, rows).round(3),
+    })
+
+    failures = max(rows // 50, 1)
+    maintenance_data = pd.DataFrame({
+        'PumpID': rng.choice(pump_ids, failures),
+        'Failure Date': _format_days(rng.integers(0, days, failures), start, '%Y-%m-%d'),
+        'Description': rng.choice(['Change oil', 'Replace bearings', 'Clean filters', 'Inspect seals'], failures),
+    })
+
+    manufacture = pd.Timestamp('2005-01-01') + pd.to_timedelta(rng.integers(0, 15 * 365, pumps), unit='D')
+    equipment_data = pd.DataFrame({
+        'PumpID': pump_ids,
+        'ManufactureDate': manufacture.strftime('%Y-%m-%d'),
+        'ExpireDate': (manufacture + pd.to_timedelta(rng.integers(15 * 365, 30 * 365, pumps), unit='D')).strftime('%Y-%m-%d'),
+    })
+    return operating_data, vibration_data, maintenance_data, equipment_data
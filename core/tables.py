@@ -0,0 +1,55 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# Rows sent to the browser per table page (override with CALC_TABLE_PAGE_SIZE)
+PAGE_SIZE = int(os.environ.get('CALC_TABLE_PAGE_SIZE', 100))
+# Raw uploads are previewed as a bounded head or sample unless the user browses all rows
+PREVIEW_MODES = ['Head', 'Random sample', 'Browse all']
+
+
+def filter_rows(frame, column, text):
+    # Case-insensitive substring match on one column; categories are matched once each, not per row
+    if not text or column not in frame.columns:
+        return frame
+    values = frame[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        matches = values.cat.categories.astype(str).str.contains(text, case=False, regex=False)
+        # Code -1 (missing) picks the trailing False
+        mask = np.append(np.asarray(matches, dtype=bool), False)[values.cat.codes.to_numpy()]
+    else:
+        mask = values.astype(str).str.contains(text, case=False, regex=False).to_numpy(dtype=bool)
+    return frame[mask]
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    return max(1, math.ceil(rows / page_size))
+
+
+def page_rows(frame, page, page_size=PAGE_SIZE, sort_by=None, ascending=True):
+    # Rows of `page` (0-based, clamped) after a stable sort; only these are sent to the browser
+    page = min(max(page, 0), page_count(len(frame), page_size) - 1)
+    start = page * page_size
+    if sort_by not in frame.columns:
+        return frame.iloc[start:start + page_size]
+    order = frame[sort_by].reset_index(drop=True).sort_values(ascending=ascending, kind='stable').index
+    return frame.iloc[order[start:start + page_size]]
+
+
+def preview_rows(frame, mode, rows=PAGE_SIZE, seed=0):
+    if mode == 'Random sample' and len(frame) > rows:
+        # Kept in file order so the sample reads like the upload
+        return frame.sample(rows, random_state=seed).sort_index()
+    return frame.head(rows)
+
+
+def format_row_range(start, shown, total, unfiltered=None):
+    if not total:
+        text = 'No rows'
+    else:
+        text = f'Rows {start + 1:,}–{start + shown:,} of {total:,}'
+    if unfiltered is not None and unfiltered != total:
+        text += f' (filtered from {unfiltered:,})'
+    return text
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.downsample import POINT_BUDGET, downsample_trend, lttb_indices
+
+
+def test_lttb_picks_the_hand_checked_points():
+    # Buckets are points 1-2 and 3-5. Against (0, 0) and the mean (4, 13/3) of the second bucket, point 2
+    # spans twice the area 11.33 to point 1's 0.33; against (2, 5) and the last point (6, 4), point 4 spans
+    # 14 to the 11 of point 3 and the 5 of point 5
+    y = [0, 1, 5, 2, 8, 3, 4]
+    assert lttb_indices(np.arange(7), y, 4).tolist() == [0, 2, 4, 6]
+
+
+@pytest.mark.parametrize('n, n_out', [(10, 3), (101, 10), (5000, 2000), (5001, 1999)])
+def test_lttb_keeps_the_endpoints_and_the_size(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 1.5, n))
+    selected = lttb_indices(x, rng.normal(size=n), n_out)
+    assert len(selected) == n_out
+    assert selected[0] == 0 and selected[-1] == n - 1
+    # One point per bucket, in order
+    assert (np.diff(selected) > 0).all()
+
+
+@pytest.mark.parametrize('n_out', [2, 50, 60])
+def test_lttb_keeps_everything_it_cannot_reduce(n_out):
+    assert lttb_indices(np.arange(50), np.zeros(50), n_out).tolist() == list(range(50))
+
+
+def test_lttb_keeps_a_single_spike():
+    y = np.zeros(1000)
+    y[437] = 10.0
+    assert 437 in lttb_indices(np.arange(1000), y, 20)
+
+
+def _trend(rows, seed=0):
+    # Unsorted readings with a missing value, as trend frames arrive from the aggregations
+    rng = np.random.default_rng(seed)
+    trend = pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=rows, freq='h'),
+                          'RMS': rng.normal(size=rows).cumsum()})
+    trend.loc[3, 'RMS'] = np.nan
+    return trend.sample(frac=1, random_state=seed)
+
+
+def test_downsample_trend_meets_the_point_budget():
+    trend = _trend(3 * POINT_BUDGET)
+    reduced, envelope, total = downsample_trend(trend, 'Date', 'RMS')
+    assert total == len(trend) - 1
+    assert len(reduced) == POINT_BUDGET
+    assert reduced['Date'].is_monotonic_increasing
+    kept = trend.dropna().sort_values('Date')
+    assert reduced['Date'].iloc[0] == kept['Date'].iloc[0]
+    assert reduced['Date'].iloc[-1] == kept['Date'].iloc[-1]
+    # The band spans every reading
+    assert len(envelope) == POINT_BUDGET // 4
+    assert envelope['min'].min() == kept['RMS'].min()
+    assert envelope['max'].max() == kept['RMS'].max()
+
+
+def test_downsample_trend_cuts_to_the_range_first():
+    trend = _trend(3 * POINT_BUDGET)
+    window = (pd.Timestamp('2024-01-10'), pd.Timestamp('2024-01-20'))
+    reduced, envelope, total = downsample_trend(trend, 'Date', 'RMS', x_range=window)
+    # Ten days and the closing hour fit the budget, so nothing is dropped
+    assert total == 10 * 24 + 1 == len(reduced)
+    assert envelope is None
+    assert reduced['Date'].between(*window).all()
+
+
+def test_small_trend_passes_through():
+    trend = _trend(100)
+    reduced, envelope, total = downsample_trend(trend, 'Date', 'RMS')
+    assert envelope is None
+    pd.testing.assert_frame_equal(reduced, trend.dropna())
+    assert total == 99
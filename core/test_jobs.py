@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.jobs import JobRunner, check_cancelled
+from core.parse_cache import ParseCache
+
+# How long a cancelled job may take to notice
+PROMPTLY = 2.0
+
+
+@pytest.fixture
+def runner():
+    return JobRunner(max_workers=1)
+
+
+def _wait_finished(job, timeout=PROMPTLY):
+    deadline = time.perf_counter() + timeout
+    while not job.finished and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return job.finished
+
+
+def test_cancel_stops_a_long_stage_promptly(runner):
+    started = threading.Event()
+    later_stage_ran = threading.Event()
+    passes = []
+
+    def long_stage(_):
+        started.set()
+        # Far longer than the test, unless the cancel is noticed between passes
+        for chunk in range(10_000):
+            check_cancelled()
+            passes.append(chunk)
+            time.sleep(0.01)
+        return 'done'
+
+    job = runner.submit('key', [('Long', long_stage), ('Later', lambda value: later_stage_ran.set())])
+    assert started.wait(PROMPTLY)
+    job.cancel()
+    assert _wait_finished(job)
+    assert job.status == 'cancelled'
+    assert job.result is None
+    assert len(passes) < 10_000
+    assert not later_stage_ran.is_set()
+
+
+def test_cancel_stops_waiting_on_offloaded_parses(runner):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_reader(source, **options):
+        started.set()
+        release.wait(30)
+        return source
+
+    cache = ParseCache()
+    requests = [(b'first', 'csv', slow_reader, {}, True), (b'second', 'csv', slow_reader, {}, True)]
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        job = runner.submit('key', [('Parsing uploads', lambda _: cache.get_or_parse_many(requests, pool))])
+        assert started.wait(PROMPTLY)
+        job.cancel()
+        try:
+            assert _wait_finished(job)
+        finally:
+            release.set()
+    assert job.status == 'cancelled'
+    # Nothing of the abandoned load is cached
+    assert cache.current_bytes == 0
+
+
+def test_superseded_job_is_cancelled_inside_its_stage(runner):
+    started = threading.Event()
+
+    def long_stage(_):
+        started.set()
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    first = runner.submit('first', [('Long', long_stage)])
+    assert started.wait(PROMPTLY)
+    second = runner.submit('second', [('Quick', lambda _: 'done')], previous=first)
+    # One worker: the new job only runs once the superseded one has let go of it
+    assert _wait_finished(second)
+    assert first.status == 'cancelled'
+    assert second.result == 'done'
+
+
+def test_check_cancelled_outside_a_job_does_nothing():
+    check_cancelled()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from core.normalize import detect_date_format, normalize_frame, parse_dates
+from core.oee import calculate_oee
+
+
+def test_row_outside_the_sample_moves_to_a_later_format():
+    # Day-first fits the sample detection looks at; one row beyond it has a 13th month, so the column is month-first
+    days = pd.date_range('2020-01-01', '2024-12-31')
+    days = days[days.day <= 12]
+    values = pd.Series(days.strftime('%m-%d-%Y'))
+    values.iloc[-1] = '12-13-2024'
+    assert detect_date_format(values) == '%d-%m-%Y'
+    parsed, date_format = parse_dates(values)
+    assert date_format == '%m-%d-%Y'
+    assert parsed.notna().all()
+    assert parsed.iloc[0] == pd.Timestamp('2020-01-01')
+    assert parsed.iloc[1] == pd.Timestamp('2020-01-02')
+    assert parsed.iloc[-1] == pd.Timestamp('2024-12-13')
+
+
+def test_iso_column_without_a_single_format_is_parsed_as_iso8601():
+    days = pd.date_range('2001-01-01', periods=10_000)
+    values = pd.Series(days.strftime('%Y-%m-%d'))
+    values.iloc[-1] = '2023-09-27 08:30:00'
+    values.iloc[-2] = 'n/a'
+    assert detect_date_format(values) == '%Y-%m-%d'
+    parsed, date_format = parse_dates(values)
+    assert date_format == 'ISO8601'
+    assert parsed.iloc[-1] == pd.Timestamp('2023-09-27 08:30:00')
+    # Text that is no date at all is still missing, not an error
+    assert parsed.isna().tolist() == [False] * 9998 + [True, False]
+    pd.testing.assert_series_equal(parsed.iloc[:9998], pd.Series(days[:9998]), check_names=False, check_dtype=False)
+
+
+def test_known_format_is_used_when_every_row_matches():
+    values = pd.Series(['01-06-2024', '13-06-2024', None])
+    parsed, date_format = parse_dates(values, '%d-%m-%Y')
+    assert date_format == '%d-%m-%Y'
+    assert parsed.tolist()[:2] == [pd.Timestamp('2024-06-01'), pd.Timestamp('2024-06-13')]
+    assert pd.isna(parsed.iloc[2])
+
+
+def test_normalized_upload_gives_the_same_oee_as_the_raw_tables():
+    # Measures that float32 cannot hold exactly must reach calculate_oee unchanged
+    rng = np.random.default_rng(6)
+    rows = 500
+    days = pd.Series(pd.date_range('2024-01-01', periods=50).strftime('%Y-%m-%d'))
+    production = pd.DataFrame({
+        'Date': days.sample(rows, replace=True, random_state=1).to_numpy(),
+        'EquipmentId': rng.integers(1, 20, rows),
+        'ProductionHrs': rng.uniform(8, 24, rows),
+        'ProducedGoods': rng.integers(100, 1000, rows),
+        'DefectGoods': rng.integers(0, 50, rows),
+        'IdealCycle': rng.uniform(0.1, 1.0, rows),
+    })
+    downtime = pd.DataFrame({'Date': days, 'EquipmentId': rng.integers(1, 20, len(days)),
+                             'DownTimeHrs': rng.uniform(0, 4, len(days))})
+
+    normalized = [normalize_frame(frame, id_columns=('EquipmentId',), date_columns=('Date',))
+                  for frame in (production, downtime)]
+    assert all(normalized[0][name].dtype == np.float64 for name in ('ProductionHrs', 'IdealCycle'))
+    raw = [frame.assign(Date=pd.to_datetime(frame['Date'])) for frame in (production, downtime)]
+    expected = calculate_oee(*raw).sort_values(['Date', 'EquipmentId'], ignore_index=True)
+    result = calculate_oee(*normalized).sort_values(['Date', 'EquipmentId'], ignore_index=True)
+    result['EquipmentId'] = result['EquipmentId'].astype(np.int64)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_exact=True)
+
+
+def test_day_first_column_without_a_single_format_is_parsed_as_mixed():
+    days = pd.date_range('2001-01-01', periods=10_000)
+    values = pd.Series(days.strftime('%d/%m/%Y'))
+    values.iloc[-1] = '27-09-2023 08:30'
+    assert detect_date_format(values) == '%d/%m/%Y'
+    parsed, date_format = parse_dates(values)
+    assert date_format == 'mixed'
+    assert parsed.iloc[-1] == pd.Timestamp('2023-09-27 08:30:00')
+    pd.testing.assert_series_equal(parsed.iloc[:-1], pd.Series(days[:-1]), check_names=False, check_dtype=False)
@@ -0,0 +1,149 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.oee import (METRICS, TIME_GRAINS, TREND_POINTS, OEECube, TimePyramid, calculate_oee, oee_partials, oee_quantiles,
+                      oee_sketch, stream_oee)
+from core.readers import apply_filters
+from core.sketch import quantile_sketch
+
+CHUNKSIZE = 4
+
+
+@pytest.fixture
+def logs(tmp_path):
+    # Every (EquipmentId, Date) key has rows several chunks apart, so its partials are only complete once the
+    # chunks are merged; one day has no downtime and one machine has none at all
+    rng = np.random.default_rng(3)
+    rows = 40
+    production = pd.DataFrame({
+        'Date': [f'2024-03-{1 + i % 5:02d}' for i in range(rows)],
+        'EquipmentId': [11 + (i // 5) % 3 for i in range(rows)],
+        'ProductionHrs': rng.integers(8, 24, rows),
+        'ProducedGoods': rng.integers(0, 900, rows),
+        'DefectGoods': rng.integers(0, 40, rows),
+        'IdealCycle': rng.uniform(0.5, 1.5, rows).round(2),
+        'Shift': 'A',
+    })
+    downtime = pd.DataFrame({
+        'Date': [f'2024-03-{day:02d}' for day in (1, 2, 3, 4, 1, 2, 3, 4)],
+        'EquipmentId': [11, 11, 11, 11, 12, 12, 12, 12],
+        'DownTimeHrs': rng.uniform(0, 4, 8).round(1),
+    })
+    production_path, downtime_path = tmp_path / 'production.csv', tmp_path / 'downtime.csv'
+    production.to_csv(production_path, index=False)
+    downtime.to_csv(downtime_path, index=False)
+    return str(production_path), str(downtime_path)
+
+
+def _reference(production_path, downtime_path, filters):
+    production = apply_filters(pd.read_csv(production_path), filters)
+    downtime = apply_filters(pd.read_csv(downtime_path), filters)
+    return calculate_oee(production.drop(columns='Shift'), downtime)
+
+
+def _assert_same_partials(streamed, expected):
+    # Merged chunks add in another order and come back as floats
+    pd.testing.assert_frame_equal(streamed.sort_index(), expected.sort_index(), check_dtype=False,
+                                  rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize('filters', [
+    [],
+    [('EquipmentId', 'in', [11, 13])],
+    [('Date', '>=', datetime.date(2024, 3, 3)), ('EquipmentId', 'in', [11, 12])],
+    # Filters out every row
+    [('EquipmentId', 'in', [99])],
+], ids=['unfiltered', 'equipment', 'date and equipment', 'empty'])
+def test_stream_matches_calculate_oee_partials(logs, filters):
+    expected = oee_partials(_reference(*logs, filters))
+    _assert_same_partials(stream_oee(*logs, chunksize=CHUNKSIZE, filters=filters), expected)
+
+
+def test_stream_states_match_calculate_oee(logs):
+    filters = [('EquipmentId', 'in', [11, 12])]
+    merged_data = _reference(*logs, filters)
+    partials, sketch = stream_oee(*logs, chunksize=CHUNKSIZE, filters=filters, states=True)
+    _assert_same_partials(partials, oee_partials(merged_data))
+    # Sketches add bucket counts, so merged chunks give exactly the one-pass sketch
+    pd.testing.assert_frame_equal(sketch.sort_index(), oee_sketch(merged_data).sort_index())
+
+
+def test_stream_chunk_size_does_not_change_the_result(logs):
+    whole = stream_oee(*logs)
+    _assert_same_partials(stream_oee(*logs, chunksize=1), whole)
+
+
+def test_stream_needs_csv_inputs(logs):
+    with pytest.raises(ValueError):
+        stream_oee(logs[0].replace('.csv', '.xlsx'), logs[1])
+
+
+def _merged_data(days, with_time, seed=5):
+    # calculate_oee-shaped records over `days` days, several per day, at 1:00-23:00 when `with_time`
+    rng = np.random.default_rng(seed)
+    rows = days * 6
+    dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, days, rows), unit='D')
+    if with_time:
+        dates += pd.to_timedelta(rng.integers(1, 24, rows), unit='h')
+    merged_data = pd.DataFrame({'Date': dates, 'EquipmentId': rng.integers(1, 6, rows),
+                                **{metric: rng.uniform(0.5, 1.0, rows) for metric in METRICS}})
+    merged_data['OEE'] *= 100
+    # Missing metrics count towards Records but not towards their mean
+    merged_data.loc[rng.random(rows) < 0.05, 'Performance'] = np.nan
+    return merged_data
+
+
+def _periods(dates, grain):
+    # Period starts written out per grain, independently of period_starts
+    if grain == 'Shift':
+        return (dates - pd.Timedelta(hours=6)).dt.floor('8h') + pd.Timedelta(hours=6)
+    if grain == 'Day':
+        return dates.dt.floor('D')
+    return dates.dt.to_period('W-SUN' if grain == 'Week' else 'M').dt.start_time
+
+
+def _direct_periods(merged_data, grain):
+    # One grain straight from the records, without partials or running sums
+    by_period = merged_data.assign(Date=_periods(merged_data['Date'], grain))
+    level = by_period.groupby('Date')[METRICS].mean()
+    level = level.join(oee_quantiles(quantile_sketch(by_period, ['Date'], 'OEE'), 'Date'))
+    level['Records'] = by_period.groupby('Date').size()
+    return level.reset_index()
+
+
+@pytest.mark.parametrize('with_time', [True, False], ids=['with time', 'dates only'])
+def test_every_pyramid_level_equals_a_direct_groupby(with_time):
+    merged_data = _merged_data(120, with_time)
+    cube = OEECube(merged_data)
+    pyramid = TimePyramid(cube.by_date(), cube.sketch_by_date())
+    assert pyramid.grains == (TIME_GRAINS if with_time else TIME_GRAINS[1:])
+    for grain in pyramid.grains:
+        pd.testing.assert_frame_equal(pyramid.levels[grain], _direct_periods(merged_data, grain), check_dtype=False,
+                                      check_index_type=False, rtol=1e-12, obj=grain)
+
+
+def test_trend_queries_stay_within_the_point_budget():
+    merged_data = _merged_data(3 * 365, with_time=True)
+    cube = OEECube(merged_data)
+    pyramid = TimePyramid(cube.by_date(), cube.sketch_by_date())
+    start, _ = pyramid.span()
+    # The whole history only fits in weeks; a quarter fits in shifts, a fortnight at a budget of 20 in days
+    for window, max_points, expected_grain in [((None, None), TREND_POINTS, 'Week'),
+                                               ((start, start + pd.Timedelta(days=90)), TREND_POINTS, 'Shift'),
+                                               ((start, start + pd.Timedelta(days=13)), 20, 'Day')]:
+        grain, trend, summary = pyramid.query(*window, max_points=max_points)
+        assert grain == expected_grain
+        assert 0 < len(trend) <= max_points
+        # The summary is exact over the records of the shifts from the one holding start to the last one
+        # starting by end, whatever grain the trend is shown at
+        lo, hi = window
+        shifts = _periods(merged_data['Date'], 'Shift')
+        records = merged_data if lo is None else merged_data[(shifts >= _periods(pd.Series([lo]), 'Shift')[0]) &
+                                                             (shifts <= hi)]
+        assert summary['Records'] == len(records)
+        assert summary['Average Performance'] == pytest.approx(records['Performance'].mean(), rel=1e-12)
+    # A grain asked for explicitly is returned whatever its size
+    assert len(pyramid.query(grain='Shift')[1]) > TREND_POINTS
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.oee_store import OEEStore
+
+DAYS = pd.date_range('2024-05-01', periods=6)
+
+
+def _logs(seed=0):
+    # Several records per machine and day, logged at different times of the day
+    rng = np.random.default_rng(seed)
+    rows = 60
+    times = DAYS[np.arange(rows) % len(DAYS)] + pd.to_timedelta(rng.choice([0, 6, 14, 22], rows), unit='h')
+    equipment = 11 + np.arange(rows) // len(DAYS) % 3
+    production = pd.DataFrame({
+        'Date': times,
+        'EquipmentId': equipment,
+        'ProductionHrs': rng.integers(8, 24, rows).astype(float),
+        'ProducedGoods': rng.integers(100, 900, rows).astype(float),
+        'DefectGoods': rng.integers(0, 40, rows).astype(float),
+        'IdealCycle': rng.uniform(0.2, 1.0, rows).round(2),
+    })
+    downtime = pd.DataFrame({
+        'Date': DAYS[np.arange(18) % len(DAYS)] + pd.Timedelta(hours=9),
+        'EquipmentId': 11 + np.arange(18) // len(DAYS),
+        'DownTimeHrs': rng.uniform(0, 4, 18).round(1),
+    })
+    return production, downtime
+
+
+def _rollups(store):
+    return {
+        'by_date': store.by_date(),
+        'by_equipment': store.by_equipment(),
+        'by_date_one_machine': store.by_date(12),
+        'sketch_by_date': store.sketch_by_date().sort_index(),
+        'results': store.results().sort_values(['Date', 'EquipmentId', 'OEE'], ignore_index=True),
+    }
+
+
+@pytest.fixture
+def stores(tmp_path):
+    opened = []
+
+    def open_store(name):
+        opened.append(OEEStore(str(tmp_path / f'{name}.sqlite')))
+        return opened[-1]
+    yield open_store
+    for store in opened:
+        store.close()
+
+
+def _batches(frame, days):
+    return frame[frame['Date'].dt.normalize().isin(days)]
+
+
+def test_incremental_upserts_equal_a_full_recompute(stores):
+    production, downtime = _logs()
+    full = stores('full')
+    full.upsert(production, downtime)
+
+    incremental = stores('incremental')
+    for days in (DAYS[:2], DAYS[2:5], DAYS[5:]):
+        incremental.upsert(_batches(production, days), _batches(downtime, days))
+    # Uploading a day again replaces it, here with the same rows as text dates
+    incremental.upsert(*(_batches(frame, DAYS[2:3]).assign(Date=lambda f: f['Date'].dt.strftime('%d/%m/%Y %H:%M:%S'))
+                         for frame in (production, downtime)))
+
+    expected, actual = _rollups(full), _rollups(incremental)
+    for name in expected:
+        # Rollups of incremental loads add deltas in another order
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_exact=False, rtol=1e-12, obj=name)
+    assert expected['by_date'].index.tolist() == [day.strftime('%Y-%m-%d') for day in DAYS]
+
+
+def test_one_day_is_one_key_with_or_without_a_time(stores):
+    production, downtime = _logs()
+    store = stores('store')
+    day = DAYS[:1]
+    assert store.upsert(_batches(production, day), _batches(downtime, day)) == 3
+    # Midnight timestamps, as read from a date-only Excel column, hit the same three keys
+    midnight = [frame.assign(Date=frame['Date'].dt.normalize())
+                for frame in (_batches(production, day), _batches(downtime, day))]
+    assert store.upsert(*midnight) == 3
+    assert store.by_date().index.tolist() == ['2024-05-01']
+    assert store.by_equipment()['Records'].sum() == len(midnight[0])
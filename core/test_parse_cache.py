@@ -0,0 +1,144 @@
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.parse_cache import ParseCache, _frame_bytes, read_with_sidecar, sidecar_path
+from core.readers import read_table
+
+
+class _Reader:
+    # Stands in for read_table: a frame of the same size for every file, counting the parses that reach it
+
+    def __init__(self, rows=1000):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, source, **options):
+        data = source.getvalue()
+        self.calls.append((data, options))
+        return pd.DataFrame({'File': np.full(self.rows, data[0]), 'Value': np.arange(self.rows, dtype=np.float64)})
+
+
+@pytest.fixture
+def reader():
+    return _Reader()
+
+
+def _frame_size(reader):
+    return _frame_bytes(_Reader(reader.rows)(BytesIO(b'size')))
+
+
+def test_least_recently_used_file_is_evicted_first(reader):
+    size = _frame_size(reader)
+    cache = ParseCache(max_bytes=int(2.5 * size))
+    for data in (b'a', b'b', b'a'):
+        cache.get_or_parse(data, 'csv', reader)
+    # 'a' was used after 'b', so 'c' pushes 'b' out
+    cache.get_or_parse(b'c', 'csv', reader)
+    assert cache.stats()['evictions'] == 1
+    assert cache.current_bytes == 2 * size <= cache.max_bytes
+
+    reader.calls.clear()
+    for data in (b'a', b'c', b'b'):
+        cache.get_or_parse(data, 'csv', reader)
+    assert [data for data, _ in reader.calls] == [b'b']
+
+
+def test_frame_larger_than_the_budget_is_not_cached(reader):
+    cache = ParseCache(max_bytes=_frame_size(reader) - 1)
+    cache.get_or_parse(b'a', 'csv', reader)
+    cache.get_or_parse(b'a', 'csv', reader)
+    assert len(reader.calls) == 2
+    assert cache.stats()['entries'] == 0 and cache.current_bytes == 0
+
+
+def test_key_covers_the_content_and_the_read_options(reader):
+    cache = ParseCache()
+    first = cache.get_or_parse(b'a', 'csv', reader, columns=['Value'], filters=None)
+    # Same options in another order: a hit
+    cache.get_or_parse(b'a', 'csv', reader, filters=None, columns=['Value'])
+    # Other options, another kind or other bytes: parsed again
+    cache.get_or_parse(b'a', 'csv', reader, columns=['File'], filters=None)
+    cache.get_or_parse(b'a', 'xlsx', reader, columns=['Value'], filters=None)
+    cache.get_or_parse(b'b', 'csv', reader, columns=['Value'], filters=None)
+    assert [(data, options['columns']) for data, options in reader.calls] == [
+        (b'a', ['Value']), (b'a', ['File']), (b'a', ['Value']), (b'b', ['Value'])]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 4
+
+    # Callers get copies, so changing one does not change the cached frame
+    first.loc[0, 'Value'] = -1.0
+    again = cache.get_or_parse(b'a', 'csv', reader, columns=['Value'], filters=None)
+    assert again.loc[0, 'Value'] == 0.0
+    again.loc[1, 'Value'] = -1.0
+    assert cache.get_or_parse(b'a', 'csv', reader, columns=['Value'], filters=None).loc[1, 'Value'] == 1.0
+
+
+def _csv(rows=50, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=rows).strftime('%Y-%m-%d'),
+                          'EquipmentId': rng.integers(1, 5, rows), 'DownTimeHrs': rng.uniform(0, 4, rows)})
+    return BytesIO(frame.to_csv(index=False).encode())
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    # Kinds read_with_sidecar hands to read_table: 'csv' is a text parse, 'arrow' a sidecar scan
+    kinds = []
+
+    def counting_read_table(source, kind=None, **options):
+        kinds.append(kind)
+        return read_table(source, kind=kind, **options)
+    monkeypatch.setattr('core.parse_cache.read_table', counting_read_table)
+    return kinds
+
+
+def test_sidecar_is_written_once_and_reused(tmp_path, reads):
+    source = _csv()
+    expected = read_table(BytesIO(source.getvalue()), kind='csv')
+    first = read_with_sidecar(source, 'csv', sidecar_dir=str(tmp_path))
+    assert os.path.exists(sidecar_path(source.getvalue(), str(tmp_path)))
+    pd.testing.assert_frame_equal(first, expected)
+
+    options = {'columns': ['EquipmentId', 'DownTimeHrs'], 'filters': [('EquipmentId', 'in', [1, 2])]}
+    again = read_with_sidecar(source, 'csv', sidecar_dir=str(tmp_path), **options)
+    assert reads == ['csv', 'arrow']
+    pd.testing.assert_frame_equal(again.reset_index(drop=True),
+                                  read_table(BytesIO(source.getvalue()), kind='csv', **options).reset_index(drop=True))
+
+
+def test_changed_content_gets_its_own_sidecar(tmp_path, reads):
+    old, new = _csv(seed=0), _csv(seed=1)
+    read_with_sidecar(old, 'csv', sidecar_dir=str(tmp_path))
+    result = read_with_sidecar(new, 'csv', sidecar_dir=str(tmp_path))
+    # Sidecars are keyed by content, so the edited file is parsed, never served the old copy
+    assert reads == ['csv', 'csv']
+    pd.testing.assert_frame_equal(result, read_table(BytesIO(new.getvalue()), kind='csv'))
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(sidecar_path(source.getvalue(), str(tmp_path)))
+                                                  for source in (old, new))
+
+
+def test_unreadable_sidecar_is_replaced(tmp_path, reads):
+    source = _csv()
+    path = sidecar_path(source.getvalue(), str(tmp_path))
+    read_with_sidecar(source, 'csv', sidecar_dir=str(tmp_path))
+    with open(path, 'r+b') as sidecar:
+        sidecar.truncate(16)
+    result = read_with_sidecar(source, 'csv', sidecar_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(result, read_table(BytesIO(source.getvalue()), kind='csv'))
+    read_with_sidecar(source, 'csv', sidecar_dir=str(tmp_path))
+    assert reads == ['csv', 'arrow', 'csv', 'arrow']
+
+
+def test_least_recently_used_sidecars_are_pruned(tmp_path):
+    sources = [_csv(seed=seed) for seed in range(3)]
+    paths = [sidecar_path(source.getvalue(), str(tmp_path)) for source in sources]
+    read_with_sidecar(sources[0], 'csv', sidecar_dir=str(tmp_path))
+    size = os.path.getsize(paths[0])
+    for age, source in enumerate(sources[1:], start=1):
+        # Sidecars of the same shape are the same size; spread their times out, as reads would
+        os.utime(paths[age - 1], (age, age))
+        read_with_sidecar(source, 'csv', sidecar_dir=str(tmp_path), max_bytes=int(2.5 * size))
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
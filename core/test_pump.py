@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.pump import (TBF_QUANTILES, WEIBULL_MIN_FAILURES, WINDOW_CHUNK, fit_weibull, reliability, vibration_features,
+                       weibull_fits, weibull_rul)
+
+# (shape, scale) per group: wear-out, random and infant-mortality failures
+WEIBULL_PARAMETERS = [(2.5, 1200.0), (1.0, 300.0), (0.7, 5000.0)]
+SAMPLES = 4000
+
+
+def _weibull_sample(seed, censor=False):
+    # Lifetimes of every group, right-censored at a uniform inspection time when `censor`
+    rng = np.random.default_rng(seed)
+    lifetimes = np.concatenate([scale * rng.weibull(shape, SAMPLES) for shape, scale in WEIBULL_PARAMETERS])
+    groups = np.repeat(np.arange(len(WEIBULL_PARAMETERS)), SAMPLES)
+    if not censor:
+        return lifetimes, np.ones(len(lifetimes), dtype=bool), groups
+    scales = np.array([scale for _, scale in WEIBULL_PARAMETERS])[groups]
+    inspections = rng.uniform(0, 3 * scales)
+    return np.minimum(lifetimes, inspections), lifetimes <= inspections, groups
+
+
+@pytest.mark.parametrize('censor', [False, True], ids=['complete', 'censored'])
+def test_fit_weibull_recovers_the_parameters(censor):
+    durations, failed, groups = _weibull_sample(7, censor)
+    fits = fit_weibull(durations, failed, groups, len(WEIBULL_PARAMETERS))
+    assert fits['Converged'].all()
+    assert (fits['Censored'] > 0).all() == censor
+    expected_shape, expected_scale = np.array(WEIBULL_PARAMETERS).T
+    np.testing.assert_allclose(fits['Shape'], expected_shape, rtol=0.06)
+    np.testing.assert_allclose(fits['Scale (Hours)'], expected_scale, rtol=0.06)
+
+
+def test_warm_start_converges_to_the_same_fit():
+    durations, failed, groups = _weibull_sample(11, censor=True)
+    n_groups = len(WEIBULL_PARAMETERS)
+    cold = fit_weibull(durations, failed, groups, n_groups)
+    # From shapes that are off either way, and from the answer itself
+    for initial_shape in (cold['Shape'] * 1.5, cold['Shape'] / 1.5, cold['Shape']):
+        warm = fit_weibull(durations, failed, groups, n_groups, initial_shape=initial_shape)
+        assert warm['Converged'].all()
+        np.testing.assert_allclose(warm['Shape'], cold['Shape'], rtol=1e-8)
+        np.testing.assert_allclose(warm['Scale (Hours)'], cold['Scale (Hours)'], rtol=1e-8)
+    assert (warm['Iterations'] < cold['Iterations']).all()
+
+
+def _reliability_output(failure_hours, censored_hours):
+    # reliability()-shaped inputs of weibull_fits: every pump's failure intervals and hours since its last failure
+    intervals = pd.DataFrame({
+        'PumpID': [pump for pump, hours in failure_hours.items() for _ in hours],
+        'Hours Since Previous': [value for hours in failure_hours.values() for value in hours],
+    })
+    pump_stats = pd.DataFrame({'PumpID': list(censored_hours), 'Hours Since Last Failure': list(censored_hours.values())})
+    return pump_stats, intervals
+
+
+def test_weibull_fits_warm_start_from_previous_fits():
+    durations, failed, groups = _weibull_sample(5)
+    pumps = np.array(['P1', 'P2', 'P3'])[groups]
+    pump_stats, intervals = _reliability_output(
+        {pump: durations[pumps == pump].tolist() for pump in ('P1', 'P2', 'P3')}, {'P1': 10.0, 'P2': 0.0, 'P3': 50.0})
+    cold = weibull_fits(pump_stats, intervals)
+    warm = weibull_fits(pump_stats, intervals, previous=cold)
+    pd.testing.assert_frame_equal(warm.drop(columns='Iterations'), cold.drop(columns='Iterations'), rtol=1e-8)
+    assert (warm['Iterations'] < cold['Iterations']).all()
+
+
+def test_pumps_with_too_few_failures_keep_the_age_model():
+    rng = np.random.default_rng(2)
+    failure_hours = {
+        'fitted': (800 * rng.weibull(2.0, 40)).tolist(),
+        'too few': [500.0, 900.0][:WEIBULL_MIN_FAILURES - 1],
+        # Identical lifetimes have no finite shape
+        'identical': [400.0] * 5,
+        'never failed': [],
+    }
+    pump_stats, intervals = _reliability_output(failure_hours, {pump: 100.0 for pump in failure_hours})
+    rul_data = pd.DataFrame({'PumpID': list(failure_hours), 'RUL (%)': [10.0, 20.0, 30.0, 40.0]})
+    equipment_data = pd.DataFrame({'PumpID': list(failure_hours)})
+
+    result, fits = weibull_rul(rul_data, equipment_data, pump_stats, intervals)
+    assert result['RUL Model'].tolist() == ['Weibull', 'Age', 'Age', 'Age']
+    assert result['RUL (%)'].tolist()[1:] == [20.0, 30.0, 40.0]
+    assert result['Median Residual Life (Hours)'].iloc[1:].isna().all()
+    assert fits.set_index('Group')['Converged'].to_dict() == {
+        'fitted': True, 'identical': False, 'never failed': False, 'too few': False}
+
+
+def test_pump_class_pools_failures_into_one_fit():
+    # Neither pump has enough failures alone, their class does
+    failure_hours = {'A': [300.0, 700.0], 'B': [500.0, 1100.0]}
+    pump_stats, intervals = _reliability_output(failure_hours, {'A': 100.0, 'B': 200.0})
+    rul_data = pd.DataFrame({'PumpID': ['A', 'B'], 'RUL (%)': [50.0, 50.0]})
+    alone, _ = weibull_rul(rul_data, pd.DataFrame({'PumpID': ['A', 'B']}), pump_stats, intervals)
+    pooled, fits = weibull_rul(rul_data, pd.DataFrame({'PumpID': ['A', 'B'], 'PumpClass': ['X', 'X']}),
+                               pump_stats, intervals)
+    assert alone['RUL Model'].tolist() == ['Age', 'Age']
+    assert pooled['RUL Model'].tolist() == ['Weibull', 'Weibull']
+    assert fits['Group'].tolist() == ['X']
+    assert fits['Failures'].tolist() == [4]
+
+
+def _reliability_loop(operating_data, maintenance_data):
+    # reliability() one pump at a time: an interval's hours are those logged up to and on its failure day
+    # since the pump's previous failure (since its first record for the first one)
+    pump_ids = sorted(set(operating_data['PumpID'].dropna()) | set(maintenance_data['PumpID'].dropna()))
+    stats, intervals = [], []
+    for pump in pump_ids:
+        operating = operating_data[operating_data['PumpID'] == pump]
+        hours = operating['Operating Hours'].fillna(0.0)
+        failures = maintenance_data[maintenance_data['PumpID'] == pump]
+        failure_dates = failures['Failure Date'].dropna().sort_values().tolist()
+        to_failure = [hours[operating['Date'] <= date].sum() for date in failure_dates]
+        interval_hours = np.diff(to_failure, prepend=0.0)
+        interval_days = [np.nan] + [(later - earlier).days for earlier, later in zip(failure_dates, failure_dates[1:])]
+        intervals += [{'PumpID': pump, 'Failure Date': date, 'Hours Since Previous': value, 'Days Since Previous': days}
+                      for date, value, days in zip(failure_dates, interval_hours, interval_days)]
+        operating_hours = hours.sum()
+        last = to_failure[-1] if to_failure else 0.0
+        stats.append({
+            'PumpID': pump,
+            'Operating Hours': operating_hours,
+            'Number of Failures': len(failures),
+            'MTBF (Hours)': last / len(to_failure) if to_failure else np.nan,
+            **{name: np.quantile(interval_hours, q) if to_failure else np.nan for name, q in TBF_QUANTILES.items()},
+            'Mean Days Between Failures': np.mean(interval_days[1:]) if len(to_failure) > 1 else np.nan,
+            'Failures per 1000 Hours': len(failures) / operating_hours * 1000 if operating_hours > 0 else np.nan,
+            'Hours Since Last Failure': operating_hours - last,
+        })
+    return pd.DataFrame(stats), pd.DataFrame(intervals, columns=['PumpID', 'Failure Date', 'Hours Since Previous',
+                                                                 'Days Since Previous'])
+
+
+def test_reliability_matches_a_per_pump_loop():
+    rng = np.random.default_rng(4)
+    days = pd.date_range('2024-01-01', periods=90)
+    operating_pumps = ['P1', 'P2', 'P3', 'P4', 'P5']
+    operating_data = pd.DataFrame({
+        'PumpID': rng.choice(operating_pumps, 300),
+        'Date': rng.choice(days, 300),
+        'Operating Hours': rng.uniform(0, 24, 300).round(1),
+    })
+    # Missing hours count as none, records of unknown pumps are left out
+    operating_data.loc[[3, 40, 41], 'Operating Hours'] = np.nan
+    operating_data.loc[7, 'PumpID'] = None
+    maintenance_data = pd.DataFrame({
+        # P4 and P5 never failed; P6 has failures but no operating records
+        'PumpID': ['P1', 'P1', 'P1', 'P2', 'P3', 'P3', 'P1', 'P6', 'P6', 'P2'],
+        'Failure Date': pd.to_datetime(['2024-02-10', '2024-01-05', '2024-03-01', '2024-01-20', '2024-02-02',
+                                        '2024-02-02', '2024-01-30', '2024-01-15', '2024-02-15', None]),
+    })
+
+    pump_stats, intervals = reliability(operating_data, maintenance_data)
+    expected_stats, expected_intervals = _reliability_loop(operating_data, maintenance_data)
+    assert pump_stats['PumpID'].tolist() == ['P1', 'P2', 'P3', 'P4', 'P5', 'P6']
+    pd.testing.assert_frame_equal(pump_stats, expected_stats, check_dtype=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(intervals, expected_intervals, check_dtype=False, rtol=1e-12)
+
+
+def _vibration_loop(vibration_data, window, halflife, step):
+    # vibration_features() one reading at a time over each pump's readings in (time - window, time]
+    readings = vibration_data.dropna().sort_values(['PumpID', 'Date'], kind='stable')
+    rows = []
+    for pump, pump_readings in readings.groupby('PumpID', sort=True):
+        times, values = pump_readings['Date'].reset_index(drop=True), pump_readings['Vibration Level (mm/s)'].to_numpy()
+        trend, previous = None, None
+        for i, time in enumerate(times):
+            if step is not None and i + 1 < len(times) and times[i + 1].floor(step) == time.floor(step):
+                continue
+            in_window = values[:i + 1][(times[:i + 1] > time - pd.Timedelta(window)).to_numpy()]
+            mean, rms = in_window.mean(), np.sqrt((in_window ** 2).mean())
+            variance = in_window.var()
+            decay = 0 if previous is None else 0.5 ** ((time - previous) / pd.Timedelta(halflife))
+            trend = rms if previous is None else decay * trend + (1 - decay) * rms
+            previous = time
+            rows.append({
+                'PumpID': pump, 'Window End': time, 'Readings': len(in_window), 'Mean': mean, 'RMS': rms,
+                'Peak': np.abs(in_window).max(), 'Crest Factor': np.abs(in_window).max() / rms,
+                'Kurtosis': ((in_window - mean) ** 4).mean() / variance ** 2 if variance > 0 else np.nan,
+                'RMS Trend': trend,
+            })
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize('chunk', [WINDOW_CHUNK, 7], ids=['one chunk', 'small chunks'])
+@pytest.mark.parametrize('window, step', [('1D', None), ('6h', None), ('1D', '1D'), ('7D', '1D')])
+def test_vibration_features_match_a_trailing_window_loop(window, step, chunk, monkeypatch):
+    monkeypatch.setattr('core.pump.WINDOW_CHUNK', chunk)
+    rng = np.random.default_rng(9)
+    rows = 400
+    vibration_data = pd.DataFrame({
+        'PumpID': rng.choice(['P1', 'P2', 'P3'], rows),
+        # Hourly readings over three weeks, some at the same time
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 21 * 24, rows), unit='h'),
+        'Vibration Level (mm/s)': rng.gamma(4, 1.5, rows).round(2),
+    })
+    vibration_data.loc[5, 'Vibration Level (mm/s)'] = np.nan
+    # A pump whose readings never change has no kurtosis
+    vibration_data.loc[vibration_data['PumpID'] == 'P3', 'Vibration Level (mm/s)'] = 2.5
+
+    features = vibration_features(vibration_data, window=window, step=step)
+    expected = _vibration_loop(vibration_data, window, '7D', step)
+    pd.testing.assert_frame_equal(features, expected, check_dtype=False, rtol=1e-9)
+    assert features.loc[features['PumpID'] == 'P3', 'Kurtosis'].isna().all()
+
+
+def test_vibration_features_match_pandas_rolling():
+    rng = np.random.default_rng(1)
+    vibration_data = pd.DataFrame({
+        'PumpID': np.repeat(['A', 'B'], 200),
+        'Date': pd.Timestamp('2024-03-01') + pd.to_timedelta(np.sort(rng.uniform(0, 10, 400)), unit='D'),
+        'Vibration Level (mm/s)': rng.normal(5, 1, 400),
+    })
+    features = vibration_features(vibration_data, window='12h')
+    rolling = vibration_data.groupby('PumpID').rolling('12h', on='Date')['Vibration Level (mm/s)']
+    np.testing.assert_allclose(features['Mean'], rolling.mean().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(features['Peak'], rolling.max().to_numpy(), rtol=0)
+    assert (features['Readings'] == rolling.count().to_numpy()).all()
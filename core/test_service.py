@@ -0,0 +1,142 @@
+import json
+import threading
+
+import pytest
+
+from core.service import ARROW_STREAM, CalculationService, run_batch
+
+JSON = 'application/json'
+
+
+def _production(day, equipment, goods=100):
+    return {'Date': f'2024-01-{day:02d}', 'EquipmentId': equipment, 'ProductionHrs': 8, 'ProducedGoods': goods,
+            'DefectGoods': 2, 'IdealCycle': 4}
+
+
+def _downtime(day, equipment, hours=1):
+    return {'Date': f'2024-01-{day:02d}', 'EquipmentId': equipment, 'DownTimeHrs': hours}
+
+
+def _oee_body(production, downtime):
+    return json.dumps({'production': production, 'downtime': downtime}).encode()
+
+
+def _pump_body(operating, maintenance, equipment):
+    return json.dumps({'operating': operating, 'maintenance': maintenance, 'equipment': equipment}).encode()
+
+
+# Requests share IDs with each other, mix ID types and carry missing IDs, which the batch has to keep apart
+# and hand back unchanged
+OEE_BODIES = [
+    _oee_body([_production(1, 1), _production(2, 1), _production(1, 'B', 90)], [_downtime(1, 1), _downtime(2, 'B')]),
+    _oee_body([_production(1, 1, 50), _production(1, None, 70)], [_downtime(1, None, 2), _downtime(1, 1, 3)]),
+    _oee_body([_production(3, None), _production(3, 2)], [_downtime(3, 2)]),
+]
+PUMP_BODIES = [
+    _pump_body([{'Date': '2024-01-01', 'PumpID': 1, 'Operating Hours': 10},
+                {'Date': '2024-01-02', 'PumpID': None, 'Operating Hours': 12}],
+               [{'PumpID': 1, 'Failure Date': '2024-01-02'}, {'PumpID': None, 'Failure Date': '2024-01-03'}],
+               [{'PumpID': 1, 'ManufactureDate': '2020-01-01', 'ExpireDate': '2030-01-01'},
+                {'PumpID': None, 'ManufactureDate': '2021-01-01', 'ExpireDate': '2031-01-01'}]),
+    _pump_body([{'Date': '2024-01-01', 'PumpID': 1, 'Operating Hours': 7},
+                {'Date': '2024-01-01', 'PumpID': 'P2', 'Operating Hours': 9}],
+               [{'PumpID': 1, 'Failure Date': '2024-01-05'}, {'PumpID': 'P2', 'Failure Date': '2024-01-04'}],
+               [{'PumpID': 1, 'ManufactureDate': '2019-06-01', 'ExpireDate': '2029-06-01'},
+                {'PumpID': 'P2', 'ManufactureDate': '2022-01-01', 'ExpireDate': '2032-01-01'}]),
+]
+CASES = [('oee', None, OEE_BODIES), ('mtbf', None, PUMP_BODIES), ('rul', '2024-06-01', PUMP_BODIES)]
+
+
+@pytest.mark.parametrize('accept', [JSON, ARROW_STREAM])
+@pytest.mark.parametrize('endpoint, as_of, bodies', CASES)
+def test_batched_answers_equal_single_answers(endpoint, as_of, bodies, accept):
+    items = [(body, JSON, accept) for body in bodies]
+    batched = run_batch(endpoint, 'A', as_of, items)
+    assert batched == [run_batch(endpoint, 'A', as_of, [item])[0] for item in items]
+    assert all(status == 200 for status, _, _ in batched if accept == JSON)
+
+
+def test_missing_ids_come_back_as_null():
+    status, _, data = run_batch('oee', 'A', None, [(OEE_BODIES[1], JSON, JSON)])[0]
+    rows = json.loads(data)['rows']
+    assert status == 200
+    assert {row['EquipmentId'] for row in rows} == {1, None}
+
+
+def test_unencodable_answer_does_not_fail_its_batch():
+    # The second pump request mixes integer and string IDs, which have no common Arrow type
+    answers = run_batch('mtbf', 'A', None, [(body, JSON, ARROW_STREAM) for body in PUMP_BODIES])
+    assert [status for status, _, _ in answers] == [200, 422]
+    assert b'ArrowInvalid' in answers[1][2]
+
+
+@pytest.mark.parametrize('bad', [
+    # Parses, but the calculation fails on it
+    _oee_body([_production(1, 1, 'many')], [_downtime(1, 1)]),
+    # Lacks columns its batch-mates have
+    _oee_body([{'Date': '2024-01-01', 'EquipmentId': 1}], [_downtime(1, 1)]),
+])
+def test_bad_request_does_not_fail_its_batch(bad):
+    items = [(body, JSON, JSON) for body in [OEE_BODIES[0], bad, OEE_BODIES[2]]]
+    answers = run_batch('oee', 'A', None, items)
+    assert [status for status, _, _ in answers] == [200, 422, 200]
+    assert answers[0] == run_batch('oee', 'A', None, items[:1])[0]
+    assert answers[2] == run_batch('oee', 'A', None, items[2:])[0]
+
+
+def test_unreadable_request_is_answered_400():
+    answers = run_batch('oee', 'A', None, [(b'{', JSON, JSON), (OEE_BODIES[0], JSON, JSON)])
+    assert [status for status, _, _ in answers] == [400, 200]
+
+
+def _answer_concurrently(service, bodies):
+    # One thread per body, released together so the requests fall into the same batch window
+    answers = [None] * len(bodies)
+    start = threading.Barrier(len(bodies))
+
+    def post(position):
+        start.wait()
+        answers[position] = service.answer('oee', 'A', None, bodies[position], JSON, JSON)
+
+    threads = [threading.Thread(target=post, args=(position,)) for position in range(len(bodies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return answers
+
+
+@pytest.fixture
+def service():
+    # In-process worker thread and a wide batch window, so concurrent requests reliably share a batch
+    service = CalculationService(workers=0, batch_ms=200)
+    yield service
+    service.close()
+
+
+def test_service_batches_concurrent_requests(service):
+    bad = _oee_body([_production(1, 1, 'many')], [_downtime(1, 1)])
+    bodies = OEE_BODIES + [bad]
+    answers = _answer_concurrently(service, bodies)
+    assert [status for status, _, _ in answers] == [200] * len(OEE_BODIES) + [422]
+    assert answers == [run_batch('oee', 'A', None, [(body, JSON, JSON)])[0] for body in bodies]
+    stats = service.stats()
+    assert stats['batches'] == 1
+    assert stats['mean_batch_size'] == len(bodies)
+
+
+def test_identical_concurrent_requests_share_one_computation(service):
+    answers = _answer_concurrently(service, [OEE_BODIES[0]] * 8)
+    assert all(answer == answers[0] for answer in answers)
+    assert answers[0][0] == 200
+    stats = service.stats()
+    assert stats['batches'] == 1
+    assert stats['mean_batch_size'] == 1
+    assert stats['requests'] == 8
+    assert stats['cache_hits'] == 7
+
+
+def test_repeated_request_is_answered_from_the_cache(service):
+    first = service.answer('oee', 'A', None, OEE_BODIES[0], JSON, JSON)
+    assert service.answer('oee', 'A', None, OEE_BODIES[0], JSON, JSON) is first
+    assert service.stats()['batches'] == 1
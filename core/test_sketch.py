@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.sketch import SKETCH_ACCURACY, merge_sketches, quantile_sketch, rollup_sketch, sketch_quantiles
+
+QUANTILES = {'P01': 0.01, 'P10': 0.1, 'P50': 0.5, 'P90': 0.9, 'P99': 0.99}
+
+
+def _values(seed, rows=20_000):
+    # Values over several orders of magnitude and of both signs, with exact zeros
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(mean=1.0, sigma=2.0, size=rows) * rng.choice([-1.0, 1.0], rows, p=[0.2, 0.8])
+    values[rng.random(rows) < 0.05] = 0.0
+    return values
+
+
+def _frame(values, groups=4, seed=0):
+    return pd.DataFrame({'Group': np.random.default_rng(seed).integers(0, groups, len(values)), 'Value': values})
+
+
+def _order_statistic(values, q):
+    # The record a sketch quantile reports: rank round(q * (n - 1)) of the sorted values
+    values = np.sort(values)
+    return values[int(np.floor(q * (len(values) - 1) + 0.5))]
+
+
+def _assert_relative(actual, expected):
+    np.testing.assert_array_less(np.abs(actual - expected), SKETCH_ACCURACY * np.abs(expected) + 1e-9)
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    values = _values(1)
+    result = sketch_quantiles(quantile_sketch(_frame(values, groups=1), ['Group'], 'Value'), QUANTILES)
+    for name, q in QUANTILES.items():
+        _assert_relative(result[name], _order_statistic(values, q))
+        # Dense data: the interpolated quantile is next to that record
+        _assert_relative(result[name], np.quantile(values, q))
+
+
+def test_grouped_quantiles_are_within_the_relative_accuracy():
+    frame = _frame(_values(2))
+    # NaN and infinite values are left out, like missing group keys
+    frame.loc[:9, 'Value'] = [np.nan, np.inf, -np.inf] + [np.nan] * 7
+    frame.loc[10:19, 'Group'] = np.nan
+    result = sketch_quantiles(quantile_sketch(frame, ['Group'], 'Value'), QUANTILES, level='Group')
+    kept = frame.iloc[20:]
+    assert sorted(result.index) == sorted(kept['Group'].unique())
+    for group, values in kept.groupby('Group')['Value']:
+        for name, q in QUANTILES.items():
+            _assert_relative(result.loc[group, name], _order_statistic(values.to_numpy(), q))
+
+
+def test_merged_sketches_equal_the_sketch_of_the_concatenated_data():
+    frame = _frame(_values(3))
+    shuffled = frame.sample(frac=1, random_state=0)
+    merged = None
+    for rows in np.array_split(np.arange(len(shuffled)), 5):
+        merged = merge_sketches(merged, quantile_sketch(shuffled.iloc[rows], ['Group'], 'Value'))
+    expected = quantile_sketch(frame, ['Group'], 'Value')
+    pd.testing.assert_frame_equal(merged.sort_index(), expected.sort_index())
+    # Rolling the groups up equals sketching every value as one group
+    pd.testing.assert_frame_equal(rollup_sketch(expected),
+                                  quantile_sketch(frame.assign(Group=0), ['Group'], 'Value').droplevel('Group'))
+
+
+@pytest.mark.parametrize('values', [np.array([]), np.array([np.nan])], ids=['empty', 'only nan'])
+def test_empty_sketch_gives_nan(values):
+    result = sketch_quantiles(quantile_sketch(_frame(values), ['Group'], 'Value'), QUANTILES)
+    assert all(np.isnan(value) for value in result.values())
@@ -0,0 +1,103 @@
+import functools
+
+import streamlit as st
+
+from core.instrument import RunMetrics
+from core.jobs import format_timings
+from core.stages import StageGraph
+from core.tables import PAGE_SIZE, PREVIEW_MODES, filter_rows, format_row_range, page_count, page_rows, preview_rows
+
+
+class CalculatorPage:
+    # One run of a calculator page: `metrics` holds the per-stage timings of the current full or partial rerun,
+    # shown in the sidebar and appended to the metrics log, and the dashboard stages are kept between reruns in
+    # the session's StageGraph under `stage_graph_key`
+
+    def __init__(self, name, stage_graph_key):
+        self.name = name
+        self.stage_graph_key = stage_graph_key
+        if stage_graph_key not in st.session_state:
+            st.session_state[stage_graph_key] = StageGraph()
+        self.metrics = RunMetrics(name, st.session_state.session_id)
+
+    def fragment(self, func):
+        # st.fragment: a widget inside reruns only `func`. Such partial reruns are timed with their own RunMetrics,
+        # logged like full runs and summarized under the section; inside a full run the page's metrics are used
+        @st.fragment
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            if not self.metrics.finished:
+                return func(*args, **kwargs)
+            self.metrics = RunMetrics(self.name, st.session_state.session_id)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.metrics.finish()
+                st.caption(f'Partial rerun: {self.metrics.summary()}')
+        return run
+
+    def run_stage(self, stage, name, func, params=(), after=()):
+        # A dashboard stage kept between reruns (core.stages.StageGraph), timed under `stage` or reported as skipped
+        return st.session_state[self.stage_graph_key].run(stage, name, func, params, after, self.metrics)
+
+
+@st.fragment(run_every=0.5)
+def job_progress(job):
+    # Polls the worker thread without rerunning the page; the page reruns once the job is finished
+    if job.finished:
+        st.rerun()
+    st.progress(job.fraction, text="Cancelling…" if job.cancelled else f"{job.stage}…")
+    if not job.cancelled and st.button("Cancel"):
+        job.cancel()
+        st.rerun()
+
+
+def job_result(job, state_key, metrics):
+    # Returns the result of a finished job, otherwise shows its progress (or that it was cancelled) and stops the script
+    if not job.finished:
+        job_progress(job)
+        st.stop()
+    if job.status == 'cancelled':
+        st.info("Calculation cancelled.")
+        if st.button("Restart calculation"):
+            del st.session_state[state_key]
+            st.rerun()
+        st.stop()
+    if job.status == 'failed':
+        raise job.error
+    st.sidebar.caption(f"Last calculation: {format_timings(job)}")
+    # Every rerun after the first one showing this result reuses it
+    if st.session_state.get(f'{state_key}_shown') is job:
+        metrics.skip('job', 'ingest, compute')
+    st.session_state[f'{state_key}_shown'] = job
+    return job.result
+
+
+@st.fragment
+def paged_table(frame, key, height='auto', column_config=None, preview=False):
+    # Only the visible page is sent to the browser; sorting, filtering and paging happen on the
+    # server and rerun just this table
+    mode = st.radio("Show", PREVIEW_MODES, horizontal=True, key=f'{key}_mode',
+                    label_visibility='collapsed') if preview else 'Browse all'
+    if mode != 'Browse all':
+        rows = preview_rows(frame, mode)
+        st.dataframe(rows, height=height, use_container_width=True, hide_index=True, column_config=column_config)
+        st.caption(format_row_range(0, len(rows), len(frame)))
+        return
+
+    columns = list(frame.columns)
+    with st.popover("Sort / filter"):
+        sort_by = st.selectbox("Sort by", [None] + columns, key=f'{key}_sort')
+        ascending = st.toggle("Ascending", value=True, key=f'{key}_ascending')
+        filter_column = st.selectbox("Filter column", columns, key=f'{key}_filter_column')
+        filter_text = st.text_input("Contains", key=f'{key}_filter_text')
+    rows = filter_rows(frame, filter_column, filter_text)
+
+    pages = page_count(len(rows))
+    # The page count shrinks when a filter is applied, keep the stored page in range
+    if st.session_state.get(f'{key}_page', 1) > pages:
+        st.session_state[f'{key}_page'] = pages
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, key=f'{key}_page') - 1
+    window = page_rows(rows, page, sort_by=sort_by, ascending=ascending)
+    st.dataframe(window, height=height, use_container_width=True, hide_index=True, column_config=column_config)
+    st.caption(format_row_range(page * PAGE_SIZE, len(window), len(rows), len(frame)))